@@ -1,100 +1,94 @@
-from flask import Flask, request, jsonify
-import json
+from flask import Flask, Response, request, jsonify, stream_with_context
+import hmac
+import logging
+import os
 from rasa_nlu import Load_Rasa_NLU
 from flask_cors import CORS
 
-from transliterate import translit
-from num2words import num2words
 from urllib.parse import unquote
 
 from fuzzywuzzy import process
 from jenkins import JenkinsException
 
+from jenkins_client import JOB_INFO_TREE, JOB_PARAMETERS_TREE, SERVER_INFO_TREE, JenkinsClient
+from jenkins_state import JenkinsState
+from console_reader import ConsoleReader
+from job_catalog import JobCatalog
+from metrics import REGISTRY, instrument, preview, stage
+from nlu_cache import ExactMatchTable, ParseCache
+from text_normalizer import limit_for_tts, transliterate_to_russian, transliterate_tokens
+
 from babel.dates import format_datetime
 from datetime import datetime, timedelta
 
 nlu_model_path = "models/"
-nlu_model = Load_Rasa_NLU(nlu_model_path)
+# NLU_LOOPS сообщений разбираются одновременно; дольше NLU_PARSE_TIMEOUT секунд запрос не ждёт (503)
+nlu_model = Load_Rasa_NLU(nlu_model_path, timeout=float(os.environ.get("NLU_PARSE_TIMEOUT", 30)),
+                          loops=int(os.environ.get("NLU_LOOPS", 4)))
+# Частые команды не проходят через весь конвейер NLU (и Duckling): точные совпадения
+# с примерами из data.yml и LRU-кэш уже разобранных фраз
+# NLU_EXACT_MATCH=0 отключает таблицу точных совпадений, NLU_CACHE_SIZE=0 - LRU-кэш
+nlu_cache = ParseCache(nlu_model.parse,
+                       exact_table=ExactMatchTable.from_file(os.environ.get("NLU_TRAINING_DATA", "data.yml"))
+                       if os.environ.get("NLU_EXACT_MATCH", "1") == "1" else None,
+                       maxsize=int(os.environ.get("NLU_CACHE_SIZE", 1024)),
+                       model_version=lambda: nlu_model.model_id)
 
 app = Flask(__name__)
 CORS(app)
+instrument(app, "nlu")
+logger = logging.getLogger("nlu")
+REGISTRY.register_stats("nlu_cache", nlu_cache.stats)
 
 import jenkins
-jenkins_url = "http://localhost:8080"
-username = "admin"
-api_key = "11ba626ea393e7982b6a9c139e63bc14e0"
-
-j_server = jenkins.Jenkins(jenkins_url, username=username, password=api_key)
-
-
-def number_to_russian_words(number):
-    if isinstance(number, float):
-        integer_part, fractional_part = str(number).split('.')
-        integer_part = int(integer_part)
-        fractional_part = int(fractional_part)
-
-        russian_integer = num2words(integer_part, lang='ru')
-        russian_fractional = num2words(fractional_part, lang='ru')
-
-        return f"{russian_integer} точка {russian_fractional}"
-    else:
-        return num2words(number, lang='ru')
-
-
-def transliterate_to_russian(text):
-    text = text.replace("'", "").replace('.', ' . ').replace(':', ' : ').replace(',', ' , ').replace('/', ' / ')
-    transliterated = []
-    words = text.split()
-
-    for word in words:
-        if '.' in word and all(part.isdigit() for part in word.split('.')):
-            # this is a version, handle separately
-            parts = word.split('.')
-            word = " точка ".join(number_to_russian_words(int(part)) for part in parts)
-        elif word.isdigit():
-            word = number_to_russian_words(int(word))
-        else:
-            word = translit(word, 'ru')
-        transliterated.append(word)
-
-    return " ".join(transliterated)
-
-def get_closest_job_name(input_job_name, job_names):
-    # First, try to find a closest match among the original job names
-    closest_match = process.extractOne(input_job_name, job_names, score_cutoff=70)
-    
-    # If no match was found, transliterate job names to Russian and try to find a match among them
-    if closest_match is None:
-        transliterated_job_names = [transliterate_to_russian(job_name) for job_name in job_names]
-        print(transliterated_job_names)
-        closest_match = process.extractOne(input_job_name, transliterated_job_names, score_cutoff=60)
-        if closest_match is not None:
-            # If a match was found among transliterated job names, return the original job name
-            closest_job_name_index = transliterated_job_names.index(closest_match[0])
-            return job_names[closest_job_name_index]
-    
-    # If a match was found among the original job names, return it
-    elif closest_match:
-        return closest_match[0]
-    
-    return None
+jenkins_url = os.environ.get("JENKINS_URL", "http://localhost:8080")
+username = os.environ.get("JENKINS_USER", "admin")
+api_key = os.environ.get("JENKINS_API_KEY", "11ba626ea393e7982b6a9c139e63bc14e0")
+
+# Пул keep-alive соединений, таймауты и повторы - в JenkinsClient
+j_server = JenkinsClient(jenkins_url, username=username, password=api_key,
+                         timeout=(float(os.environ.get("JENKINS_CONNECT_TIMEOUT", 3.05)),
+                                  float(os.environ.get("JENKINS_READ_TIMEOUT", 10))),
+                         retries=int(os.environ.get("JENKINS_RETRIES", 2)),
+                         pool_size=int(os.environ.get("JENKINS_POOL_SIZE", 16)),
+                         workers=int(os.environ.get("JENKINS_FETCH_WORKERS", 8)),
+                         # Одинаковые одновременные запросы идут в Jenkins один раз, ответ живёт ещё столько секунд
+                         coalesce_ttl=float(os.environ.get("JENKINS_COALESCE_TTL", 1.0)))
+REGISTRY.register_stats("jenkins_singleflight", j_server.flight.stats)
+
+# Сколько последних сборок перечислять
+BUILDS_LIMIT = int(os.environ.get("BUILDS_LIMIT", 20))
+# Сколько символов вывода консоли озвучивать и как сокращать (head, tail, summary)
+TTS_CONSOLE_MAX_CHARS = int(os.environ.get("TTS_CONSOLE_MAX_CHARS", 2000))
+TTS_CONSOLE_MODE = os.environ.get("TTS_CONSOLE_MODE", "summary")
+# Интент вывода консоли отдаёт последние CONSOLE_TAIL_LINES строк; полный лог - потоком через /console
+CONSOLE_TAIL_LINES = int(os.environ.get("CONSOLE_TAIL_LINES", 200))
+console_reader = ConsoleReader(j_server, max_lines=max(CONSOLE_TAIL_LINES, 500))
+
+# Задачи, их последние сборки и ответы Jenkins хранятся в памяти и сбрасываются по уведомлениям
+# Jenkins (POST /jenkins/notify) или по разнице снимков, запрашиваемых раз в JENKINS_POLL_INTERVAL секунд
+jenkins_state = JenkinsState(j_server, poll_interval=float(os.environ.get("JENKINS_POLL_INTERVAL", 30)),
+                             max_age=float(os.environ.get("JENKINS_STATE_MAX_AGE", 60)))
+REGISTRY.register_stats("jenkins_state", jenkins_state.stats)
+# Уведомления принимаются только с ?token=JENKINS_WEBHOOK_TOKEN; без токена вебхук выключен
+JENKINS_WEBHOOK_TOKEN = os.environ.get("JENKINS_WEBHOOK_TOKEN")
+if not JENKINS_WEBHOOK_TOKEN:
+    logger.warning("JENKINS_WEBHOOK_TOKEN is not set: /jenkins/notify is disabled, changes are found by polling")
+
+# Индекс по именам задач (включая транслитерацию) перестраивается, когда меняется список задач
+# Транслитерация имён задач - часть перестройки индекса (этап job_catalog_rebuild), а не этап transliteration
+job_catalog = JobCatalog(jenkins_state.job_names, transliterate_tokens,
+                         ttl=float(os.environ.get("JOB_CATALOG_TTL", 30)))
+jenkins_state.listeners.append(job_catalog.invalidate)
 
 def get_closest_existing_job_name(input_job_name):
-    server_info = j_server.get_info()
-    jobs = server_info.get("jobs")
-    job_names = [job["name"] for job in jobs]
-
-    closest_job_name = get_closest_job_name(input_job_name, job_names)
-    if closest_job_name is None:
-        return None
-
-    return closest_job_name
+    return job_catalog.closest(input_job_name)
 
 def get_closest_parameter_name(input_parameter_name, parameter_names):
     closest_match = process.extractOne(input_parameter_name, parameter_names, score_cutoff=70)
 
     if closest_match is None:
-        transliterated_parameter_names = [transliterate_to_russian(parameter_name) for parameter_name in parameter_names]
+        transliterated_parameter_names = [transliterate_tokens(parameter_name) for parameter_name in parameter_names]
         closest_match = process.extractOne(input_parameter_name, transliterated_parameter_names, score_cutoff=60)
         if closest_match is not None:
             closest_parameter_name_index = transliterated_parameter_names.index(closest_match[0])
@@ -108,9 +102,9 @@ def get_closest_parameter_name(input_parameter_name, parameter_names):
 
 # Определяем функции, соответствующие интентам
 def get_server_info(**kwargs):
-    server_info = j_server.get_info()
-    user_info = j_server.get_whoami()
-    version = j_server.get_version()
+    # Информация о сервере (версия - из её же заголовков) и о пользователе запрашиваются параллельно
+    (server_info, version), user_info = j_server.gather(lambda: j_server.get_info_and_version(tree=SERVER_INFO_TREE),
+                                                        j_server.get_whoami)
 
     mode = server_info.get("mode")
     num_executors = server_info.get("numExecutors")
@@ -129,6 +123,13 @@ def get_server_info(**kwargs):
         response += "Сервер работает в обычном режиме. "
     
     response += f"Сейчас на сервере есть следующие задачи: {', '.join(job_names)}. "
+
+    # Выполняющиеся сборки известны из зеркала состояния, отдельный запрос не нужен
+    running = jenkins_state.running_builds()
+    if running:
+        response += "Сейчас выполняются сборки: " + ", ".join(f"{job} номер {number}" for job, number in running) + ". "
+    else:
+        response += "Сейчас нет выполняющихся сборок. "
     
     # if isinstance(permissions, (list, tuple, set)):
     #     response += f"Вы вошли как {full_name} с правами: {', '.join(permissions)}."
@@ -140,9 +141,7 @@ def get_server_info(**kwargs):
 
 
 def get_all_jobs(**kwargs):
-    server_info = j_server.get_info()
-    jobs = server_info.get("jobs")
-    job_names = [job["name"] for job in jobs]
+    job_names = job_catalog.job_names()
 
 
     response = "Представляю вам список задач на сервере Jenkins: " + ', '.join(job_names)
@@ -156,9 +155,9 @@ def get_job_info(job_name, **kwargs):
         response = f"Задача с именем {job_name} не существует."
         return {"message": response, "for_tts": transliterate_to_russian(response)}
     
-    print(job_name, closest_job_name)
+    logger.debug("job name %r -> %r", job_name, closest_job_name)
     try:
-        job_info = j_server.get_job_info(closest_job_name)
+        job_info = jenkins_state.get_job_info(closest_job_name, tree=JOB_INFO_TREE)
     except jenkins.JenkinsException:
         response = f"Задача с именем {closest_job_name} не существует."
         return {"message": response, "for_tts": transliterate_to_russian(response)}
@@ -190,6 +189,10 @@ def get_job_info(job_name, **kwargs):
     response += f"Статус: {color}.\n"
     response += f"Первая сборка: {first_build}.\n"
     response += f"Последняя сборка: {last_build}.\n"
+    mirrored_last_build = jenkins_state.last_build(closest_job_name)
+    if mirrored_last_build:
+        last_build_state = 'выполняется' if mirrored_last_build['building'] else mirrored_last_build['result'] or 'Неизвестно'
+        response += f"Состояние последней сборки: {last_build_state}.\n"
     response += f"Последняя завершенная сборка: {last_completed_build}.\n"
     response += f"Последняя неудачная сборка: {last_failed_build}.\n"
     response += f"Последняя стабильная сборка: {last_stable_build}.\n"
@@ -228,6 +231,7 @@ def stop_job_build(job_name, build_number, **kwargs):
             return {"message": response, "for_tts": transliterate_to_russian(response)}
         
         j_server.stop_build(closest_job_name, build_number)
+        jenkins_state.invalidate(closest_job_name)
         response = f"Сборка {build_number} задачи {closest_job_name} была остановлена."
     except JenkinsException as e:
         response = f"Произошла ошибка при остановке сборки {build_number} задачи {job_name}: {str(e)}"
@@ -240,13 +244,11 @@ def get_builds_list(job_name, **kwargs):
         return {"message": response, "for_tts": transliterate_to_russian(response)}
     else:
         try:
-            job_info = j_server.get_job_info(job_name)
-            builds = job_info.get('builds', [])
+            builds = jenkins_state.get_builds(job_name, BUILDS_LIMIT)
             builds_list = []
             for build in builds:
-                build_info = j_server.get_build_info(job_name, build['number'])
-                build_url = unquote(build_info['url'])
-                build_result = build_info.get('result', 'В процессе')
+                build_url = unquote(build['url'])
+                build_result = build.get('result') or 'В процессе'
                 builds_list.append(f"Сборка номер {build['number']}, состояние: {build_result}, URL: {build_url}")
             response = "Список сборок: \n" + "\n".join(builds_list)
         except JenkinsException as e:
@@ -261,7 +263,7 @@ def get_build_info(job_name, build_number, **kwargs):
         return {"message": response, "for_tts": transliterate_to_russian(response)}
     else:
         try:
-            build_info = j_server.get_build_info(job_name, int(build_number))
+            build_info = jenkins_state.get_build_info(job_name, int(build_number))
             response = "Информация о сборке:\n"
             response += f"Номер сборки: {build_info.get('number')}\n"
             response += f"Результат сборки: {build_info.get('result')}\n"
@@ -291,12 +293,16 @@ def get_job_build_console_output(job_name, build_number, **kwargs):
         return {"message": response, "for_tts": transliterate_to_russian(response)}
     else:
         try:
-            console_output = j_server.get_build_console_output(job_name, int(build_number))
-            response = f"Вывод консоли сборки {build_number} задачи {job_name}:\n"
+            console_output = "\n".join(console_reader.tail(job_name, int(build_number), CONSOLE_TAIL_LINES))
+            response = f"Вывод консоли сборки {build_number} задачи {job_name} (последние строки):\n"
+            # В TTS уходит только ограниченная часть вывода, полный текст - в message
+            for_tts = transliterate_to_russian(response + limit_for_tts(console_output, TTS_CONSOLE_MAX_CHARS,
+                                                                        TTS_CONSOLE_MODE))
             response += console_output
         except JenkinsException as e:
             response = f"Ошибка: {str(e)}"
-        return {"message": response, "for_tts": transliterate_to_russian(response)}
+            for_tts = transliterate_to_russian(response)
+        return {"message": response, "for_tts": for_tts}
 
 def get_job_parameters(job_name, **kwargs):
     job_name = get_closest_existing_job_name(job_name)
@@ -306,7 +312,7 @@ def get_job_parameters(job_name, **kwargs):
     else:
         parameters = []
         try:
-            job_info = j_server.get_job_info(job_name)
+            job_info = jenkins_state.get_job_info(job_name, tree=JOB_PARAMETERS_TREE)
             if 'property' in job_info:
                 for prop in job_info['property']:
                     if 'parameterDefinitions' in prop:
@@ -333,7 +339,7 @@ def get_job_parameter_value(job_name, parameter_name, **kwargs):
         return {"message": response, "for_tts": transliterate_to_russian(response)}
     else:
         try:
-            job_info = j_server.get_job_info(job_name)
+            job_info = jenkins_state.get_job_info(job_name, tree=JOB_PARAMETERS_TREE)
             parameters = []
             if 'property' in job_info:
                 for prop in job_info['property']:
@@ -375,15 +381,8 @@ intent_to_function = {
     "get_job_parameter_value": get_job_parameter_value
 }
 
-@app.route("/parse", methods=["POST"])
-def parse():
-    text = request.json.get("text")
-    if not text:
-        return jsonify({"error": "Text not provided"}), 400
-
-    result = nlu_model.nlu_processing(text)
-    print(result)
-    result = json.loads(result)
+def handle_parse_result(result):
+    """Вызывает функцию распознанного интента; None, если интент не поддерживается."""
     intent_name = result["intent"]["name"]
     confidence = result["intent"]["confidence"]
 
@@ -401,15 +400,74 @@ def parse():
             most_probable_entity = max(entities, key=lambda x: x["confidence"])
             slots = {most_probable_entity["entity"]: most_probable_entity["value"]}
 
-        response = function(**slots)
-        return jsonify(response)
-    else:
-        return jsonify({"error": "Intent not supported"}), 400
-
-
-
+        return function(**slots)
+    return None
 
+@app.route("/parse", methods=["POST"])
+def parse():
+    text = request.json.get("text")
+    if not text:
+        return jsonify({"error": "Text not provided"}), 400
 
+    try:
+        with stage("nlu_parse"):
+            result = nlu_cache.parse(text)
+    except TimeoutError:
+        logger.warning("NLU parse timed out: %s", preview(text))
+        return jsonify({"error": "NLU is busy, try again later"}), 503
+    logger.debug("parse result: %s", preview(result))
+
+    with stage("dispatch"):
+        response = handle_parse_result(result)
+    if response is None:
+        return jsonify({"error": "Intent not supported"}), 400
+    return jsonify(response)
+
+
+@app.route("/console/<path:job_name>/<int:build_number>", methods=["GET"])
+def console(job_name, build_number):
+    """
+    Вывод консоли сборки: ?tail=N - последние N строк, ?start=&end= - диапазон
+    байт, без параметров - весь лог потоком.
+    """
+    tail = request.args.get("tail", type=int)
+    if "tail" in request.args and tail is None:
+        return jsonify({"error": "tail must be a number of lines"}), 400
+    try:
+        if tail is not None:
+            lines = console_reader.tail(job_name, build_number, max(0, tail))
+            return Response("\n".join(lines), mimetype="text/plain")
+        end = request.args.get("end", type=int)
+        text = console_reader.iter_text(job_name, build_number, request.args.get("start", 0, type=int), end)
+    except JenkinsException as e:
+        return jsonify({"error": str(e)}), 404
+    return Response(stream_with_context(text), mimetype="text/plain")
+
+
+@app.route("/jenkins/notify", methods=["POST"])
+def jenkins_notify():
+    """Приёмник уведомлений Jenkins (плагин Notification, формат JSON, протокол HTTP)."""
+    if not JENKINS_WEBHOOK_TOKEN:
+        return jsonify({"error": "Webhook is disabled: JENKINS_WEBHOOK_TOKEN is not set"}), 403
+    if not hmac.compare_digest(request.args.get("token", ""), JENKINS_WEBHOOK_TOKEN):
+        return jsonify({"error": "Invalid token"}), 403
+    event = request.get_json(silent=True)
+    if not isinstance(event, dict) or "name" not in event:
+        return jsonify({"error": "Event not provided"}), 400
+    jenkins_state.apply_event(event)
+    return "", 204
+
+
+def after_fork():
+    # Вызывается в каждом воркере serve.py после fork
+    nlu_model.after_fork()
+    j_server.after_fork()
+    jenkins_state.after_fork()
+
+
+@app.route("/nlu_stats", methods=["GET"])
+def nlu_stats():
+    return jsonify(nlu_cache.stats())
 
 
 if __name__ == "__main__":
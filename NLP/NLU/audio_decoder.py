@@ -0,0 +1,76 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import ffmpeg
+import numpy as np
+import soundfile as sf
+import torch
+
+from audio_preprocessing import prepare_waveform
+from metrics import in_context
+
+TARGET_SAMPLE_RATE = 16000
+
+
+class UnsupportedAudioFormat(ValueError):
+    """Ни libsndfile, ни ffmpeg не смогли декодировать запись."""
+
+
+class AudioDecoder:
+    """
+    Декодирует загруженное аудио (ogg/opus, wav, ...) в 16 кГц моно float PCM
+    без временных файлов.
+
+    Декодирование выполняется пулом долгоживущих воркеров: сначала пробуем
+    libsndfile прямо в процессе (без запуска внешних программ), а если формат
+    ему не по силам - гоним байты через ffmpeg по пайпам stdin/stdout.
+    Каждый запрос работает только со своими буферами, поэтому параллельные
+    запросы не мешают друг другу.
+    """
+
+    def __init__(self, workers=None, sample_rate=TARGET_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        if workers is None:
+            workers = int(os.environ.get("STT_DECODER_WORKERS", os.cpu_count() or 2))
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="audio-decoder")
+
+    def after_fork(self):
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="audio-decoder")
+
+    def decode(self, audio_bytes):
+        """Синхронно декодирует байты, возвращает (waveform [1, N], sample_rate)."""
+        return self.pool.submit(in_context(self._decode), audio_bytes).result()
+
+    def _decode(self, audio_bytes):
+        try:
+            samples, sample_rate = self._decode_in_process(audio_bytes)
+        except RuntimeError:
+            # libsndfile не знает этот контейнер/кодек
+            try:
+                samples, sample_rate = self._decode_with_ffmpeg(audio_bytes), self.sample_rate
+            except ffmpeg.Error as e:
+                message = (e.stderr or b"").decode("utf-8", errors="replace").strip()
+                raise UnsupportedAudioFormat(message or "unsupported audio format") from e
+
+        waveform = prepare_waveform(torch.from_numpy(samples), sample_rate, self.sample_rate, normalize=False)
+        return waveform, self.sample_rate
+
+    def _decode_in_process(self, audio_bytes):
+        samples, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+        # Сводим каналы в моно
+        return np.ascontiguousarray(samples.mean(axis=1)), sample_rate
+
+    def _decode_with_ffmpeg(self, audio_bytes):
+        out, _ = (
+            ffmpeg
+            .input("pipe:0")
+            .output("pipe:1", format="f32le", acodec="pcm_f32le", ac=1, ar=self.sample_rate)
+            .global_args("-loglevel", "error")
+            .run(input=audio_bytes, capture_stdout=True, capture_stderr=True)
+        )
+        return np.frombuffer(out, dtype=np.float32).copy()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
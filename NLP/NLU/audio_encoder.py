@@ -0,0 +1,60 @@
+import io
+
+import numpy as np
+import soundfile as sf
+import torch
+
+from audio_preprocessing import prepare_waveform
+
+SUBTYPES = {"opus": "OPUS", "vorbis": "VORBIS"}
+# Opus кодирует только на этих частотах
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+class AudioEncoder:
+    """
+    Кодирует PCM в Ogg/Opus или Ogg/Vorbis прямо в процессе через libsndfile,
+    без запуска ffmpeg.
+
+    output_sample_rate позволяет понизить частоту (например, 48 кГц -> 24 кГц)
+    перед кодированием. compression_level (0..1) - настройка качества/битрейта
+    libsndfile: чем больше, тем меньше битрейт и размер ответа.
+    """
+
+    def __init__(self, codec="opus", output_sample_rate=None, compression_level=None):
+        if codec not in SUBTYPES:
+            raise ValueError(f"Unknown codec {codec!r}, expected one of: {', '.join(SUBTYPES)}")
+        if codec == "opus" and output_sample_rate and output_sample_rate not in OPUS_SAMPLE_RATES:
+            raise ValueError(f"Opus does not support {output_sample_rate} Hz")
+        self.codec = codec
+        self.output_sample_rate = output_sample_rate
+        self.compression_level = compression_level
+
+    @property
+    def content_type(self):
+        return f"audio/ogg; codecs={self.codec}"
+
+    @property
+    def name(self):
+        # Входит в ключ кэша: разные настройки кодирования - разные файлы
+        return f"ogg/{self.codec}@{self.output_sample_rate or 'native'}/{self.compression_level}"
+
+    def encode(self, audio, sample_rate):
+        sample_rate = int(sample_rate)
+        if self.output_sample_rate and self.output_sample_rate != sample_rate:
+            audio = prepare_waveform(audio, sample_rate, self.output_sample_rate, normalize=False)
+            sample_rate = self.output_sample_rate
+
+        if isinstance(audio, torch.Tensor):
+            audio = audio.detach().cpu().numpy()
+        samples = np.clip(np.asarray(audio, dtype=np.float32).reshape(-1), -1.0, 1.0)
+
+        options = {}
+        if self.compression_level is not None:
+            options["compression_level"] = self.compression_level
+
+        buffer = io.BytesIO()
+        with sf.SoundFile(buffer, mode="w", samplerate=sample_rate, channels=1,
+                          format="OGG", subtype=SUBTYPES[self.codec], **options) as f:
+            f.write(samples)
+        return buffer.getvalue()
@@ -0,0 +1,63 @@
+import threading
+
+import torch
+import torchaudio
+
+TARGET_SAMPLE_RATE = 16000
+
+_resamplers = {}
+_resamplers_lock = threading.Lock()
+
+
+def get_resampler(input_sample_rate, output_sample_rate, device="cpu"):
+    """
+    Возвращает Resample для пары частот. Ядро sinc-фильтра считается один раз
+    при создании, поэтому экземпляры кэшируются по (исходная, целевая, устройство).
+    """
+    key = (int(input_sample_rate), int(output_sample_rate), str(device))
+    resampler = _resamplers.get(key)
+    if resampler is None:
+        with _resamplers_lock:
+            resampler = _resamplers.get(key)
+            if resampler is None:
+                resampler = torchaudio.transforms.Resample(key[0], key[1]).to(device)
+                _resamplers[key] = resampler
+    return resampler
+
+
+def normalize_(waveform, eps=1e-7):
+    """Нормализация к нулевому среднему и единичной дисперсии на месте (как у Wav2Vec2FeatureExtractor)."""
+    var, mean = torch.var_mean(waveform, dim=-1, unbiased=False, keepdim=True)
+    return waveform.sub_(mean).div_(torch.sqrt(var + eps))
+
+
+@torch.inference_mode()
+def prepare_waveform(waveform, sample_rate, target_sample_rate=TARGET_SAMPLE_RATE, normalize=True, device="cpu"):
+    """
+    Приводит запись к виду, который ждёт модель: моно, target_sample_rate,
+    (опционально) нормализованная. Принимает [N], [1, N] или [каналы, N],
+    возвращает [1, N'].
+
+    Всё делается одной цепочкой: сведение каналов - редукция, ресемплинг -
+    свёртка кэшированным ядром, нормализация - на месте, без промежуточных копий.
+    """
+    converted = waveform.to(device=device, dtype=torch.float32)
+    owned = converted is not waveform
+    waveform = converted
+    if waveform.ndim == 1:
+        waveform = waveform.unsqueeze(0)
+    elif waveform.shape[0] > 1:
+        waveform = waveform.mean(dim=0, keepdim=True)
+        owned = True
+
+    if sample_rate != target_sample_rate:
+        waveform = get_resampler(sample_rate, target_sample_rate, device)(waveform)
+        owned = True
+
+    if normalize and not owned:
+        # Нормализация на месте не должна портить тензор вызывающего
+        waveform = waveform.clone()
+
+    if normalize:
+        normalize_(waveform)
+    return waveform
@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    """
+    Собирает входящие запросы в микробатчи и прогоняет их одним вызовом
+    batch_fn(items) -> results.
+
+    Батч отправляется, как только набралось max_batch_size элементов или
+    с момента прихода первого элемента прошло max_wait_ms миллисекунд.
+    Каждый вызывающий получает свой результат через Future.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=20, history_size=1000):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self.history = deque(maxlen=history_size)
+        self.stats_lock = threading.Lock()
+        self.total_batches = 0
+        self.total_items = 0
+        self._start_worker()
+
+    def _start_worker(self):
+        self.worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self.worker.start()
+
+    def after_fork(self):
+        # Потоки не переживают fork: в дочернем процессе нужны новые очередь и воркер
+        self.queue = queue.Queue()
+        self.stats_lock = threading.Lock()
+        self._start_worker()
+
+    def submit(self, item):
+        future = Future()
+        self.queue.put((item, time.perf_counter(), future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = batch[0][1] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
+
+            waits = [started - enqueued for _, enqueued, _ in batch]
+            self._record(len(batch), max(waits), sum(waits) / len(waits), finished - started)
+
+    def _record(self, batch_size, max_wait, mean_wait, inference_time):
+        with self.stats_lock:
+            self.total_batches += 1
+            self.total_items += batch_size
+            self.history.append({
+                "batch_size": batch_size,
+                "queue_wait_max_ms": max_wait * 1000,
+                "queue_wait_mean_ms": mean_wait * 1000,
+                "inference_ms": inference_time * 1000,
+            })
+
+    def stats(self):
+        with self.stats_lock:
+            history = list(self.history)
+            stats = {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "total_batches": self.total_batches,
+                "total_items": self.total_items,
+                "queued": self.queue.qsize(),
+                "recent": history[-20:],
+            }
+        if history:
+            stats["mean_batch_size"] = sum(b["batch_size"] for b in history) / len(history)
+            stats["mean_queue_wait_ms"] = sum(b["queue_wait_mean_ms"] for b in history) / len(history)
+            stats["mean_inference_ms"] = sum(b["inference_ms"] for b in history) / len(history)
+        return stats
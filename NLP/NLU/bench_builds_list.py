@@ -0,0 +1,58 @@
+"""
+Получение списка сборок для get_builds_list на заглушке Jenkins:
+прежний путь (get_job_info + get_build_info по очереди для каждой сборки),
+параллельный запасной путь и один tree-запрос.
+
+    python bench_builds_list.py --builds 100 --latency 0.02 --limit 20
+"""
+import argparse
+import time
+
+import jenkins
+
+from jenkins_client import JenkinsClient, fetch_builds, fetch_builds_concurrently
+from stub_jenkins import StubJenkins
+
+
+def legacy_builds(server, job_name):
+    job_info = server.get_job_info(job_name)
+    return [server.get_build_info(job_name, build['number']) for build in job_info.get('builds', [])]
+
+
+def measure(name, fn, stub, repeats):
+    stub.stats.clear()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        builds = fn()
+    elapsed = (time.perf_counter() - started) / repeats * 1000
+    requests_made = sum(stub.stats.values()) / repeats
+    print(f"{name:<34} {elapsed:>9.1f} ms {requests_made:>7.1f} req  {len(builds):>4} builds")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--builds", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    stub = StubJenkins(jobs=1, builds=args.builds, latency=args.latency).serve()
+    server = jenkins.Jenkins(stub.url, username="admin", password="admin")
+    server.get_whoami()  # аутентификация и crumb - не в счёт
+    client = JenkinsClient(stub.url, username="admin", password="admin", workers=args.workers)
+    job = "job_0"
+
+    measure("legacy sequential (all builds)", lambda: legacy_builds(server, job), stub, args.repeats)
+    measure(f"concurrent x{args.workers} (top {args.limit})",
+            lambda: fetch_builds_concurrently(client, job, args.limit), stub, args.repeats)
+    measure(f"concurrent x{args.workers} (all builds)",
+            lambda: fetch_builds_concurrently(client, job, args.builds), stub, args.repeats)
+    measure(f"tree query (top {args.limit})", lambda: fetch_builds(client, job, args.limit), stub, args.repeats)
+    measure("tree query (all builds)", lambda: fetch_builds(client, job, args.builds), stub, args.repeats)
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Сквозной бенчмарк голосового стека на записях из test_data: декодирование ->
+VAD + SpeechToText -> replace_numbers_with_digits -> разбор NLU -> обработчик
+интента (против заглушки Jenkins) -> SileroTTS, через маршрут /voice.
+
+Записывает в JSON задержки этапов (p50/p95 по заголовку Server-Timing),
+пропускную способность при разной параллельности, пиковый RSS и
+распознанный текст каждой записи. Кэши (аудио TTS, разборы NLU, зеркало
+Jenkins и объединение запросов к нему) отключены: прогрев заполнил бы их, и
+замеры показывали бы попадания в кэш вместо работы конвейера. С --baseline
+сравнивает результат с прошлым прогоном и завершается с кодом 1 при
+регрессии:
+
+    python bench_e2e.py --output bench_e2e.json
+    python bench_e2e.py --output new.json --baseline bench_e2e.json --tolerance 0.2
+    python bench_e2e.py --compare bench_e2e.json new.json
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from stub_jenkins import StubJenkins
+
+
+def parse_server_timing(header):
+    stages = {}
+    for item in filter(None, (part.strip() for part in (header or "").split(","))):
+        name, _, duration = item.partition(";dur=")
+        stages[name] = float(duration)
+    return stages
+
+
+def summarize(values):
+    values = sorted(values)
+    return {"p50": values[len(values) // 2], "p95": values[min(len(values) - 1, int(0.95 * len(values)))],
+            "mean": statistics.fmean(values)}
+
+
+def peak_rss_mb():
+    # ru_maxrss - в КБ на Linux и в байтах на macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_stub(data_path):
+    from nlu_cache import load_training_examples
+
+    stub = StubJenkins(jobs=0, builds=0)
+    job_names = {entity["value"] for _, _, entities in load_training_examples(data_path)
+                 for entity in entities if entity["entity"] == "job_name"}
+    for name in sorted(job_names):
+        stub.add_job(name, builds=30)
+    return stub.serve()
+
+
+def run_clip(client, audio):
+    response = client.post("/voice?format=raw", data=audio, content_type="audio/ogg")
+    return {"status": response.status_code,
+            "transcription": unquote(response.headers.get("X-Transcription", "")),
+            "stages": parse_server_timing(response.headers.get("Server-Timing"))}
+
+
+CACHES_OFF = {
+    "TTS_CACHE_MAX_BYTES": "0",
+    "TTS_SENTENCE_CACHE_MAX_BYTES": "0",
+    "TTS_CACHE_DIR": "",
+    "NLU_CACHE_SIZE": "0",
+    "NLU_EXACT_MATCH": "0",
+    "JENKINS_POLL_INTERVAL": "0",
+    "JENKINS_STATE_MAX_AGE": "0",
+    "JENKINS_COALESCE_TTL": "0",
+    "JOB_CATALOG_TTL": "0",
+}
+
+
+def run_benchmark(args):
+    stub = start_stub(args.data)
+    os.environ["JENKINS_URL"] = stub.url
+    os.environ["STT_LOAD_IN_BACKGROUND"] = "0"
+    os.environ["TTS_LOAD_IN_BACKGROUND"] = "0"
+    os.environ.update(CACHES_OFF)
+    import voice_pipeline
+
+    clips = {}
+    for path in sorted(glob.glob(os.path.join(args.clips, "*.ogg")) + glob.glob(os.path.join(args.clips, "*.wav"))):
+        with open(path, "rb") as f:
+            clips[os.path.basename(path)] = f.read()
+
+    client = voice_pipeline.app.test_client()
+    for audio in clips.values():
+        run_clip(client, audio)  # прогрев: ресемплеры, JIT и т.п. (кэши ответов отключены)
+
+    per_clip, stage_values = {}, {}
+    for name, audio in clips.items():
+        runs = [run_clip(client, audio) for _ in range(args.repeats)]
+        per_clip[name] = {"status": runs[-1]["status"], "transcription": runs[-1]["transcription"],
+                          "total_ms": summarize([run["stages"].get("total", 0.0) for run in runs])}
+        for run in runs:
+            for stage, duration in run["stages"].items():
+                stage_values.setdefault(stage, []).append(duration)
+
+    throughput = []
+    jobs = list(clips.values()) * args.throughput_rounds
+    for concurrency in map(int, args.concurrency.split(",")):
+        clients = [voice_pipeline.app.test_client() for _ in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(lambda item: run_clip(clients[item[0] % concurrency], item[1]), enumerate(jobs)))
+        elapsed = time.perf_counter() - started
+        throughput.append({"concurrency": concurrency, "clips_per_s": len(jobs) / elapsed})
+
+    stub.shutdown()
+    return {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "clips": per_clip,
+        "stages": {stage: summarize(values) for stage, values in stage_values.items()},
+        "throughput": throughput,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(baseline, current, tolerance):
+    """Список регрессий current относительно baseline (пустой - всё в порядке)."""
+    problems = []
+    for stage, stats in baseline["stages"].items():
+        if stage in current["stages"] and current["stages"][stage]["p50"] > stats["p50"] * (1 + tolerance):
+            problems.append(f"stage {stage}: p50 {stats['p50']:.1f} -> {current['stages'][stage]['p50']:.1f} ms")
+    current_throughput = {item["concurrency"]: item["clips_per_s"] for item in current["throughput"]}
+    for item in baseline["throughput"]:
+        value = current_throughput.get(item["concurrency"])
+        if value is not None and value < item["clips_per_s"] * (1 - tolerance):
+            problems.append(f"throughput x{item['concurrency']}: {item['clips_per_s']:.2f} -> {value:.2f} clips/s")
+    if current["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        problems.append(f"peak RSS: {baseline['peak_rss_mb']:.0f} -> {current['peak_rss_mb']:.0f} MB")
+    for clip, result in baseline["clips"].items():
+        if clip in current["clips"] and current["clips"][clip]["transcription"] != result["transcription"]:
+            problems.append(f"{clip}: transcription {result['transcription']!r} -> "
+                            f"{current['clips'][clip]['transcription']!r}")
+    return problems
+
+
+def report(results):
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<10} p50 {stats['p50']:>8.1f} ms  p95 {stats['p95']:>8.1f} ms")
+    for item in results["throughput"]:
+        print(f"concurrency {item['concurrency']:>2}: {item['clips_per_s']:.2f} clips/s")
+    print(f"peak RSS: {results['peak_rss_mb']:.0f} MB")
+    for clip, result in results["clips"].items():
+        print(f"{clip:<12} [{result['status']}] {result['transcription']}")
+
+
+def check(baseline_path, results, tolerance):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    problems = compare(baseline, results, tolerance)
+    for problem in problems:
+        print("REGRESSION:", problem)
+    return 1 if problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clips", default="test_data")
+    parser.add_argument("--data", default="data.yml")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--concurrency", default="1,2,4")
+    parser.add_argument("--throughput-rounds", type=int, default=3)
+    parser.add_argument("--output", default="bench_e2e.json")
+    parser.add_argument("--baseline", help="previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="only compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[1], encoding="utf-8") as f:
+            sys.exit(check(args.compare[0], json.load(f), args.tolerance))
+
+    results = run_benchmark(args)
+    report(results)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        sys.exit(check(args.baseline, results, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Запросы обработчиков интентов к Jenkins на заглушке: прежние вызовы
+python-jenkins против JenkinsClient (keep-alive пул, tree-проекции,
+параллельные независимые запросы). Для каждого интента выводятся задержка,
+число HTTP-запросов и объём ответов.
+
+    python bench_jenkins_client.py --builds 100 --latency 0.02
+"""
+import argparse
+import time
+
+import jenkins
+
+from jenkins_client import (BUILD_INFO_TREE, JOB_INFO_TREE, JOB_NAMES_TREE, JOB_PARAMETERS_TREE, SERVER_INFO_TREE,
+                            JenkinsClient, fetch_builds)
+from stub_jenkins import StubJenkins
+
+JOB = "job_0"
+BUILD = 10
+
+
+def legacy_intents(server):
+    return {
+        "get_server_info": lambda: (server.get_info(), server.get_whoami(), server.get_version()),
+        "get_job_names": lambda: [job['name'] for job in server.get_info()['jobs']],
+        "get_job_info": lambda: server.get_job_info(JOB),
+        "get_builds_list": lambda: [server.get_build_info(JOB, build['number'])
+                                    for build in server.get_job_info(JOB)['builds'][:20]],
+        "get_build_info": lambda: server.get_build_info(JOB, BUILD),
+        "get_job_parameters": lambda: server.get_job_info(JOB),
+        "get_console_output": lambda: server.get_build_console_output(JOB, BUILD),
+    }
+
+
+def client_intents(client):
+    return {
+        "get_server_info": lambda: client.gather(lambda: client.get_info_and_version(tree=SERVER_INFO_TREE),
+                                                 client.get_whoami),
+        "get_job_names": lambda: [job['name'] for job in client.get_info(tree=JOB_NAMES_TREE)['jobs']],
+        "get_job_info": lambda: client.get_job_info(JOB, tree=JOB_INFO_TREE),
+        "get_builds_list": lambda: fetch_builds(client, JOB, 20),
+        "get_build_info": lambda: client.get_build_info(JOB, BUILD, tree=BUILD_INFO_TREE),
+        "get_job_parameters": lambda: client.get_job_info(JOB, tree=JOB_PARAMETERS_TREE),
+        "get_console_output": lambda: client.get_build_console_output(JOB, BUILD),
+    }
+
+
+def measure(fn, stub, repeats):
+    fn()  # прогрев: соединение, аутентификация
+    stub.reset_stats()
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    elapsed = (time.perf_counter() - started) / repeats * 1000
+    return elapsed, sum(stub.stats.values()) / repeats, stub.bytes_sent / repeats / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--builds", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    stub = StubJenkins(jobs=args.jobs, builds=args.builds, latency=args.latency).serve()
+    legacy = legacy_intents(jenkins.Jenkins(stub.url, username="admin", password="admin"))
+    current = client_intents(JenkinsClient(stub.url, username="admin", password="admin"))
+
+    print(f"{'intent':<20} {'python-jenkins':>30}   {'JenkinsClient':>30}")
+    for intent in legacy:
+        old_ms, old_req, old_kb = measure(legacy[intent], stub, args.repeats)
+        new_ms, new_req, new_kb = measure(current[intent], stub, args.repeats)
+        print(f"{intent:<20} {old_ms:>8.1f} ms {old_req:>5.1f} req {old_kb:>7.1f} KB"
+              f"   {new_ms:>8.1f} ms {new_req:>5.1f} req {new_kb:>7.1f} KB")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Поиск ближайшего имени задачи: прежний путь (extractOne по всем именам, при
+промахе - транслитерация всех имён и второй extractOne) против JobCatalog.
+
+    python bench_job_catalog.py --jobs 10000 --queries 200
+"""
+import argparse
+import random
+import time
+
+from fuzzywuzzy import process
+from transliterate import translit
+
+from job_catalog import JobCatalog
+
+WORDS = ["deploy", "build", "test", "api", "ui", "prod", "stage", "backend", "frontend", "nightly",
+         "release", "migrate", "data", "cleanup", "docs", "perf", "lint", "mobile", "payments", "search"]
+
+
+def transliterate(name):
+    return translit(name.replace("_", " "), "ru")
+
+
+def legacy_closest(input_job_name, job_names):
+    closest_match = process.extractOne(input_job_name, job_names, score_cutoff=70)
+    if closest_match is None:
+        transliterated = [transliterate(job_name) for job_name in job_names]
+        closest_match = process.extractOne(input_job_name, transliterated, score_cutoff=60)
+        if closest_match is not None:
+            return job_names[transliterated.index(closest_match[0])]
+        return None
+    return closest_match[0]
+
+
+def make_jobs(count, rng):
+    jobs = set()
+    while len(jobs) < count:
+        jobs.add("_".join(rng.sample(WORDS, rng.randint(2, 3))) + f"_{rng.randint(1, 999)}")
+    return sorted(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--legacy-queries", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    jobs = make_jobs(args.jobs, rng)
+    queries = [transliterate(rng.choice(jobs)) if i % 2 else rng.choice(jobs).replace("_", " ")
+               for i in range(args.queries)]
+
+    started = time.perf_counter()
+    catalog = JobCatalog(lambda: jobs, transliterate, ttl=3600)
+    catalog.refresh()
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for query in queries:
+        catalog.closest(query)
+    catalog_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+    legacy_queries = queries[:args.legacy_queries]
+    started = time.perf_counter()
+    for query in legacy_queries:
+        legacy_closest(query, jobs)
+    legacy_ms = (time.perf_counter() - started) / len(legacy_queries) * 1000
+
+    print(f"jobs: {len(jobs)}")
+    print(f"catalog build (incl. transliteration): {build * 1000:.0f} ms, once per refresh")
+    print(f"catalog lookup: {catalog_ms:.3f} ms/query")
+    print(f"legacy lookup:  {legacy_ms:.1f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
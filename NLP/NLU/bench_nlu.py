@@ -0,0 +1,75 @@
+"""
+Пропускная способность разбора сообщений Rasa NLU: прежний путь
+(asyncio.run на каждое сообщение + JSON туда и обратно) против постоянного
+циклов событий Load_Rasa_NLU.parse и пакетного parse_batch. Разбор
+синхронный, поэтому выигрыш от пула циклов виден только при --threads > 1.
+
+Сообщения берутся из примеров data.yml (без разметки сущностей); последней
+строкой - тот же поток через ParseCache (таблица точных совпадений и LRU).
+
+    python bench_nlu.py --model models/ --messages 200 --threads 4 --batch 8 --loops 4
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rasa.shared.utils.io import json_to_string
+
+from nlu_cache import ExactMatchTable, ParseCache, load_training_examples
+from rasa_nlu import Load_Rasa_NLU
+
+
+def legacy_parse(nlu, message):
+    results = asyncio.run(nlu.agent.parse_message(message.strip()))
+    return json.loads(json_to_string(results))
+
+
+def measure(name, fn, messages, threads):
+    started = time.perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(fn, messages))
+    else:
+        for message in messages:
+            fn(message)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<32} {len(messages) / elapsed:>8.1f} msg/s  {elapsed / len(messages) * 1000:>7.2f} ms/msg")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="models/")
+    parser.add_argument("--data", default="data.yml")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--loops", type=int, default=4, help="event loops in Load_Rasa_NLU")
+    args = parser.parse_args()
+
+    examples = [text for text, _, _ in load_training_examples(args.data)]
+    messages = (examples * (args.messages // len(examples) + 1))[:args.messages]
+    nlu = Load_Rasa_NLU(args.model, loops=args.loops)
+    nlu.parse(messages[0])  # прогрев
+
+    measure("legacy asyncio.run + json", lambda m: legacy_parse(nlu, m), messages, args.threads)
+    measure(f"loop pool (x{args.loops})", nlu.parse, messages, args.threads)
+
+    batches = [messages[i:i + args.batch] for i in range(0, len(messages), args.batch)]
+    started = time.perf_counter()
+    for batch in batches:
+        nlu.parse_batch(batch)
+    elapsed = time.perf_counter() - started
+    print(f"{f'parse_batch (x{args.batch})':<32} {len(messages) / elapsed:>8.1f} msg/s  "
+          f"{elapsed / len(messages) * 1000:>7.2f} ms/msg")
+
+    # Примеры из data.yml попадают в таблицу точных совпадений, остальные - в LRU-кэш после первого разбора
+    cache = ParseCache(nlu.parse, exact_table=ExactMatchTable.from_file(args.data), model_version=lambda: nlu.model_id)
+    measure("parse cache", cache.parse, messages, args.threads)
+    print(cache.stats())
+    nlu.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Сравнение нормализации числительных: прежний перебор difflib по всему словарю
+против number_normalizer (BK-дерево + мемоизация).
+
+Корпус - примеры из data.yml, где цифры заменены словами, плюс те же фразы
+с опечатками, как их выдаёт распознавание.
+
+    python bench_numbers.py --repeats 5
+"""
+import argparse
+import difflib
+import random
+import re
+import time
+
+import number_normalizer
+from number_normalizer import HUNDREDS, RUSSIAN_NUMBERS, TENS, TEENS, UNITS
+
+
+def legacy_replace_numbers_with_digits(text):
+    # Прежняя реализация из speech_to_text.py
+    def post_process_numbers(text):
+        words = text.split()
+        result = []
+        i = 0
+        while i < len(words):
+            word = words[i]
+            if word.isdigit():
+                number = int(word)
+                i += 1
+                while i < len(words) and words[i].isdigit():
+                    number += int(words[i])
+                    i += 1
+                result.append(str(number))
+            else:
+                result.append(word)
+                i += 1
+        return " ".join(result)
+
+    words = text.split()
+    result = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        matches = difflib.get_close_matches(word, RUSSIAN_NUMBERS.keys(), n=1, cutoff=0.75)
+        if matches and matches[0] in RUSSIAN_NUMBERS:
+            num_word = matches[0]
+            if set(num_word.split()).issubset(set(words[i:i + num_word.count(" ") + 1])):
+                result.append(str(RUSSIAN_NUMBERS[num_word]))
+                i += num_word.count(" ") + 1
+            else:
+                result.append(word)
+                i += 1
+        else:
+            result.append(word)
+            i += 1
+    return post_process_numbers(" ".join(result))
+
+
+def number_to_words(number):
+    words = []
+    if number >= 100:
+        words.append(HUNDREDS[number // 100])
+        number %= 100
+    if 10 <= number < 20:
+        words.append(TEENS[number - 10])
+    else:
+        if number >= 20:
+            words.append(TENS[number // 10])
+        if number % 10 or not words:
+            words.append(UNITS[number % 10])
+    return " ".join(words)
+
+
+def typo(word, rng):
+    if len(word) < 4 or rng.random() < 0.6:
+        return word
+    i = rng.randrange(len(word))
+    return word[:i] + word[i + 1:]
+
+
+def build_corpus(size, seed=0):
+    rng = random.Random(seed)
+    with open("data.yml", encoding="utf-8") as f:
+        examples = [line.strip()[2:] for line in f if line.startswith("    - ")]
+    corpus = []
+    for _ in range(size):
+        text = rng.choice(examples)
+        text = re.sub(r"\[([^\]]+)\]\([^)]+\)", r"\1", text)
+        text = re.sub(r"\d+", lambda m: number_to_words(int(m.group()) % 1000), text).lower()
+        corpus.append(" ".join(typo(word, rng) for word in re.findall(r"\w+", text)))
+    return corpus
+
+
+def measure(fn, corpus, repeats):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for text in corpus:
+            fn(text)
+    return (time.perf_counter() - started) / (repeats * len(corpus)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.size)
+    legacy = measure(legacy_replace_numbers_with_digits, corpus, args.repeats)
+    number_normalizer.match_number_word.cache_clear()
+    cold = measure(number_normalizer.replace_numbers_with_digits, corpus, 1)
+    warm = measure(number_normalizer.replace_numbers_with_digits, corpus, args.repeats)
+    differs = sum(legacy_replace_numbers_with_digits(t) != number_normalizer.replace_numbers_with_digits(t) for t in corpus)
+
+    print(f"corpus: {len(corpus)} transcriptions")
+    print(f"legacy difflib:       {legacy:10.1f} us/text")
+    print(f"normalizer (cold):    {cold:10.1f} us/text")
+    print(f"normalizer (memoized):{warm:10.1f} us/text")
+    print(f"outputs differing from legacy (see test_replace_numbers_changed_behaviour): {differs}")
+
+
+if __name__ == "__main__":
+    main()
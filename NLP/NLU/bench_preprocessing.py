@@ -0,0 +1,54 @@
+"""
+Микробенчмарк подготовки аудио для STT: прежний путь (новый Resample на
+каждый вызов, отдельные операции сведения каналов и нормализация в
+Wav2Vec2FeatureExtractor) против audio_preprocessing.prepare_waveform.
+
+    python bench_preprocessing.py --seconds 5 --repeats 50
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+import torchaudio
+
+from audio_preprocessing import prepare_waveform
+
+
+def legacy_prepare(waveform, sample_rate):
+    if waveform.ndim == 2:
+        waveform = waveform.mean(axis=0, keepdim=True)
+    else:
+        waveform = torch.unsqueeze(waveform, 0)
+    if sample_rate != 16000:
+        waveform = torchaudio.transforms.Resample(sample_rate, 16000)(waveform)
+    # То, что делал Wav2Vec2FeatureExtractor при do_normalize=True
+    values = waveform.numpy()
+    values = (values - values.mean()) / np.sqrt(values.var() + 1e-7)
+    return torch.from_numpy(values)
+
+
+def measure(fn, waveform, sample_rate, repeats):
+    fn(waveform, sample_rate)  # прогрев (и заполнение кэша для нового пути)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn(waveform, sample_rate)
+    return (time.perf_counter() - started) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'rate':>7} {'legacy ms':>10} {'cached ms':>10} {'saved ms':>9}")
+    for sample_rate in (8000, 44100, 48000):
+        waveform = torch.randn(2, int(sample_rate * args.seconds)) * 0.1
+        legacy = measure(legacy_prepare, waveform, sample_rate, args.repeats)
+        cached = measure(prepare_waveform, waveform, sample_rate, args.repeats)
+        print(f"{sample_rate:>7} {legacy:>10.2f} {cached:>10.2f} {legacy - cached:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Сравнение бэкендов SpeechToText на записях из test_data.
+
+Для каждого бэкенда запускается отдельный процесс (чтобы RSS не смешивался),
+в котором сервис поднимается так же, как при обычном старте: через
+STT_BACKEND. Выводятся real-time factor, p50/p99 задержки, RSS после
+загрузки и прогонов, пиковый RSS и WER. Пиковый RSS у всех бэкендов включает
+загрузку исходной fp32-модели, поэтому память бэкендов сравнивается по RSS.
+
+WER считается по test_data/references.tsv ("файл<TAB>текст"), если он есть,
+иначе - относительно вывода eager-бэкенда.
+
+    python bench_stt_backends.py --backends eager int8 torchscript onnx --repeats 5
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data")
+
+
+def word_error_rate(reference, hypothesis):
+    ref, hyp = reference.split(), hypothesis.split()
+    distances = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, distances[0] = distances[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            previous, distances[j] = distances[j], min(distances[j] + 1,
+                                                       distances[j - 1] + 1,
+                                                       previous + (ref_word != hyp_word))
+    return distances[-1] / max(len(ref), 1)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def current_rss_mb():
+    # Текущий (а не пиковый) RSS; /proc есть только на Linux
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return None
+
+
+def run_backend(repeats):
+    # Выполняется в дочернем процессе с уже выставленным STT_BACKEND
+    sys.argv = sys.argv[:1]
+    os.environ["STT_LOAD_IN_BACKGROUND"] = "0"
+    import speech_to_text
+    stt = speech_to_text.stt_loader.get()
+
+    clips = {}
+    for path in sorted(glob.glob(os.path.join(TEST_DATA, "*.ogg")) + glob.glob(os.path.join(TEST_DATA, "*.wav"))):
+        with open(path, "rb") as f:
+            clips[os.path.basename(path)] = speech_to_text.audio_decoder.decode(f.read())
+
+    latencies, audio_seconds, busy_seconds, transcriptions = [], 0.0, 0.0, {}
+    for name, (waveform, sample_rate) in clips.items():
+        stt.transcribe(waveform, sample_rate)  # прогрев
+        for _ in range(repeats):
+            started = time.perf_counter()
+            transcriptions[name] = stt.transcribe(waveform, sample_rate)
+            elapsed = time.perf_counter() - started
+            latencies.append(elapsed)
+            busy_seconds += elapsed
+            audio_seconds += waveform.shape[-1] / sample_rate
+
+    return {
+        "rtf": busy_seconds / audio_seconds,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rss_mb": current_rss_mb(),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "transcriptions": transcriptions,
+    }
+
+
+def load_references():
+    path = os.path.join(TEST_DATA, "references.tsv")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return dict(line.rstrip("\n").split("\t", 1) for line in f if "\t" in line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["eager", "int8", "torchscript", "onnx"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.repeats), ensure_ascii=False))
+        return
+
+    results = {}
+    for backend in args.backends:
+        env = dict(os.environ, STT_BACKEND=backend)
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--repeats", str(args.repeats)],
+                             env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"{backend}: failed\n{out.stderr[-2000:]}")
+            continue
+        results[backend] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    references = load_references()
+    if references is None and "eager" in results:
+        references = results["eager"]["transcriptions"]
+
+    print(f"{'backend':<12} {'RTF':>7} {'p50 ms':>9} {'p99 ms':>9} {'RSS MB':>9} {'peak MB':>9} {'WER':>7}")
+    for backend, r in results.items():
+        wer = "n/a"
+        if references:
+            names = [name for name in r["transcriptions"] if name in references]
+            if names:
+                wer = f"{sum(word_error_rate(references[n], r['transcriptions'][n]) for n in names) / len(names):.3f}"
+        rss = f"{r['rss_mb']:.0f}" if r["rss_mb"] is not None else "n/a"
+        print(f"{backend:<12} {r['rtf']:>7.3f} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {rss:>9} {r['max_rss_mb']:>9.0f} "
+              f"{wer:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Подготовка текста для TTS на выводе консоли сборки (~1 МБ, похож на лог
+Maven/Gradle): прежний transliterate_to_russian из app.py против
+text_normalizer (регулярное выражение + кэш токенов), потоковой обработки
+и режима summary с ограничением длины.
+
+    python bench_text_normalizer.py --size-mb 1
+"""
+import argparse
+import random
+import time
+
+from num2words import num2words
+from transliterate import translit
+
+import text_normalizer
+from text_normalizer import iter_transliterated, limit_for_tts, transliterate_to_russian
+
+LINE_TEMPLATES = [
+    "[INFO] Downloading from central: https://repo.maven.apache.org/maven2/org/{lib}/{lib}-core/{v}/{lib}-core-{v}.pom",
+    "[INFO] Downloaded from central: https://repo.maven.apache.org/maven2/org/{lib}/{lib}/{v}/{lib}-{v}.jar ({n} kB at {m} kB/s)",
+    "[INFO] Compiling {n} source files to /var/jenkins_home/workspace/{job}/target/classes",
+    "[INFO] Tests run: {n}, Failures: 0, Errors: 0, Skipped: {m}, Time elapsed: {t} s - in com.example.{lib}.ServiceTest",
+    "[WARNING] /var/jenkins_home/workspace/{job}/src/main/java/com/example/{lib}/Service.java:[{n},{m}] deprecated API",
+    "{ts} + docker build -t registry.local:5000/{job}:{n} .",
+    "{ts} Step {m}/{n} : RUN pip install {lib}=={v}",
+    "[ERROR] Failed to execute goal on project {job}: Could not resolve dependencies for {lib}:{v}",
+]
+LIBS = ["spring", "hibernate", "jackson", "netty", "guava", "slf4j", "junit", "mockito", "commons", "kafka"]
+
+
+def legacy_number_to_russian_words(number):
+    if isinstance(number, float):
+        integer_part, fractional_part = str(number).split('.')
+        return f"{num2words(int(integer_part), lang='ru')} точка {num2words(int(fractional_part), lang='ru')}"
+    return num2words(number, lang='ru')
+
+
+def legacy_transliterate_to_russian(text):
+    text = text.replace("'", "").replace('.', ' . ').replace(':', ' : ').replace(',', ' , ').replace('/', ' / ')
+    transliterated = []
+    for word in text.split():
+        if '.' in word and all(part.isdigit() for part in word.split('.')):
+            word = " точка ".join(legacy_number_to_russian_words(int(part)) for part in word.split('.'))
+        elif word.isdigit():
+            word = legacy_number_to_russian_words(int(word))
+        else:
+            word = translit(word, 'ru')
+        transliterated.append(word)
+    return " ".join(transliterated)
+
+
+def make_console_log(size, seed=0):
+    rng = random.Random(seed)
+    lines, total = [], 0
+    while total < size:
+        line = rng.choice(LINE_TEMPLATES).format(
+            lib=rng.choice(LIBS), job=f"service-{rng.randint(1, 5)}", n=rng.randint(1, 2000), m=rng.randint(0, 60),
+            v=f"{rng.randint(1, 5)}.{rng.randint(0, 20)}.{rng.randint(0, 9)}", t=f"{rng.random() * 10:.3f}",
+            ts=f"12:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}")
+        lines.append(line)
+        total += len(line) + 1
+    lines.append("Finished: SUCCESS")
+    return "\n".join(lines)
+
+
+def measure(name, fn, repeats=1):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    elapsed = (time.perf_counter() - started) / repeats
+    print(f"{name:<40} {elapsed * 1000:>9.1f} ms  {len(result):>9} chars out")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=1.0)
+    parser.add_argument("--max-chars", type=int, default=2000)
+    args = parser.parse_args()
+
+    log = make_console_log(int(args.size_mb * 1024 * 1024))
+    print(f"console log: {len(log) / 1024:.0f} KB, {log.count(chr(10)) + 1} lines")
+
+    expected = measure("legacy transliterate_to_russian", lambda: legacy_transliterate_to_russian(log))
+    text_normalizer.convert_token.cache_clear()
+    result = measure("text_normalizer (cold cache)", lambda: transliterate_to_russian(log))
+    assert result == expected
+    measure("text_normalizer (warm cache)", lambda: transliterate_to_russian(log))
+    lines = log.splitlines(keepends=True)
+    assert " ".join(measure("iter_transliterated (by line)", lambda: list(iter_transliterated(lines)))) == expected
+    for mode in ("summary", "tail"):
+        measure(f"limit_for_tts({args.max_chars}, {mode}) + transliterate",
+                lambda: transliterate_to_russian(limit_for_tts(log, args.max_chars, mode)), repeats=10)
+    print(text_normalizer.convert_token.cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Сравнение кодирования ответа TTS: прежний путь (pydub -> ffmpeg -> ogg,
+затем base64 в JSON) против AudioEncoder (libsndfile в процессе).
+
+В качестве сигнала берётся 48 кГц синтетическая "речь" (сумма гармоник с
+огибающей), чтобы не поднимать модель Silero.
+
+    python bench_tts_encoder.py --seconds 10 --repeats 10
+"""
+import argparse
+import base64
+import io
+import json
+import time
+
+import numpy as np
+from pydub import AudioSegment
+
+from audio_encoder import AudioEncoder
+
+
+def legacy_encode(audio, sample_rate):
+    # То же, что SileroTTS.create_ogg_vorbis
+    audio_int16 = (audio * (2 ** 15 - 1)).astype(np.int16)
+    segment = AudioSegment(audio_int16.tobytes(), frame_rate=sample_rate,
+                           sample_width=audio_int16.dtype.itemsize, channels=1)
+    buffer = io.BytesIO()
+    segment.export(buffer, format="ogg")
+    return buffer.getvalue()
+
+
+def synthetic_speech(seconds, sample_rate=48000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 2.5 * t), 0, None)
+    return (0.3 * voice * envelope / 3).astype(np.float32)
+
+
+def measure(encode, audio, sample_rate, repeats):
+    data = encode(audio, sample_rate)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        encode(audio, sample_rate)
+    elapsed = (time.perf_counter() - started) / repeats * 1000
+    json_size = len(json.dumps({"audio_base64": base64.b64encode(data).decode()}))
+    return elapsed, len(data), json_size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    sample_rate = 48000
+    audio = synthetic_speech(args.seconds, sample_rate)
+    variants = {
+        "pydub/ffmpeg vorbis 48k": legacy_encode,
+        "libsndfile vorbis 48k": AudioEncoder("vorbis").encode,
+        "libsndfile opus 48k": AudioEncoder("opus").encode,
+        "libsndfile opus 24k": AudioEncoder("opus", output_sample_rate=24000).encode,
+        "libsndfile opus 24k cl=0.7": AudioEncoder("opus", output_sample_rate=24000, compression_level=0.7).encode,
+    }
+
+    print(f"{'encoder':<28} {'ms':>8} {'raw KB':>8} {'json KB':>8}")
+    for name, encode in variants.items():
+        try:
+            elapsed, raw_size, json_size = measure(encode, audio, sample_rate, args.repeats)
+        except Exception as e:
+            print(f"{name:<28} failed: {e}")
+            continue
+        print(f"{name:<28} {elapsed:>8.1f} {raw_size / 1024:>8.1f} {json_size / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Задержка синтеза встроенным и своим голосом Silero.
+
+Сравниваются: встроенный голос (eugene), свой голос из реестра SileroTTS
+(эмбеддинг загружен при старте), прежний путь со своим голосом
+(apply_tts(voice_path=файл) читает файл на каждом вызове) и чередование
+встроенного и своего голоса от запроса к запросу. Отдельно выводится, сколько
+стоит разбор эмбеддинга из памяти на каждом вызове.
+
+Ограничения SileroTTS, которые видны в цифрах: пакет Silero принимает свой
+голос только через voice_path, поэтому эмбеддинг разбирается при каждом
+синтезе (из памяти, а не с диска), а синтез разными своими голосами
+одновременно идёт по очереди (VoiceSwitch) - этот бенчмарк однопоточный и
+такое ожидание не измеряет.
+
+    python bench_tts_speakers.py --voice drunk_panda --repeats 10
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import time
+
+import torch
+
+PHRASES = [
+    "Сборка номер сорок два задачи деплой завершилась успешно.",
+    "Простите, не понял ваш запрос",
+    "Представляю вам список задач на сервере Дженкинс.",
+]
+
+
+def measure(synthesize, repeats, prepare_text):
+    timings = []
+    for i in range(repeats):
+        text = prepare_text(PHRASES[i % len(PHRASES)])
+        started = time.perf_counter()
+        synthesize(i, text)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"mean_ms": statistics.fmean(timings), "p50_ms": statistics.median(timings)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--builtin", default="eugene")
+    parser.add_argument("--voice", default="drunk_panda")
+    parser.add_argument("--voices-dir", default="voices")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    # Модель сервиса грузится синхронно при импорте (вместе с прогревом кэша), а не в фоне во время замеров
+    os.environ["TTS_LOAD_IN_BACKGROUND"] = "0"
+    os.environ["TTS_VOICES_DIR"] = args.voices_dir
+    started = time.perf_counter()
+    import text_to_speech
+    from text_to_speech import prepare_text
+
+    tts = text_to_speech.tts_loader.get()
+    print(f"model and {len(tts.voices)} voice(s) loaded in {time.perf_counter() - started:.1f} s")
+    voice_path = os.path.join(args.voices_dir, args.voice)
+
+    loads = 1000
+    started = time.perf_counter()
+    for _ in range(loads):
+        torch.load(io.BytesIO(tts.voices[args.voice]), map_location="cpu")
+    print(f"embedding deserialization per call: {(time.perf_counter() - started) * 1000 / loads:.3f} ms")
+
+    def legacy_custom(i, text):
+        return tts.model_tts.apply_tts(text=text, speaker="random", voice_path=voice_path,
+                                       sample_rate=tts.sample_rate, put_accent=True, put_yo=True)
+
+    cases = {
+        f"builtin {args.builtin}": lambda i, text: tts.synthesize(text, speaker=args.builtin),
+        f"registry {args.voice}": lambda i, text: tts.synthesize(text, speaker=args.voice),
+        f"voice_path {args.voice}": legacy_custom,
+        "alternating": lambda i, text: tts.synthesize(text, speaker=args.voice if i % 2 else args.builtin),
+    }
+    for synthesize in cases.values():
+        synthesize(0, prepare_text(PHRASES[0]))  # прогрев
+
+    results = {}
+    print(f"{'case':<28} {'mean ms':>9} {'p50 ms':>9}")
+    for name, synthesize in cases.items():
+        results[name] = measure(synthesize, args.repeats, prepare_text)
+        print(f"{name:<28} {results[name]['mean_ms']:>9.1f} {results[name]['p50_ms']:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Сколько аудио VAD отсекает до модели на записях из test_data: длительность
+записи, длительность частей с речью, число частей и сэкономленные секунды.
+Прогон wav2vec2 линеен по длине входа, поэтому сэкономленные секунды аудио -
+это сэкономленные вычисления модели.
+
+    python bench_vad.py --data test_data
+"""
+import argparse
+import glob
+import json
+import os
+
+import soundfile as sf
+
+from vad import VoiceActivityDetector
+
+
+def load_clip(path):
+    """Моно float32 и частота; то, что не читает libsndfile, декодируется как в сервисе."""
+    try:
+        samples, sample_rate = sf.read(path, dtype="float32", always_2d=True)
+        return samples.mean(axis=1), sample_rate
+    except RuntimeError:
+        from audio_decoder import AudioDecoder
+
+        with open(path, "rb") as f:
+            waveform, sample_rate = AudioDecoder(workers=1).decode(f.read())
+        return waveform.numpy().reshape(-1), sample_rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="test_data")
+    parser.add_argument("--json", help="write per-clip results to this file")
+    args = parser.parse_args()
+
+    vad = VoiceActivityDetector.from_env()
+    results = []
+    print(f"{'clip':<14} {'audio s':>8} {'speech s':>9} {'parts':>6} {'saved s':>8} {'saved':>7}")
+    for path in sorted(glob.glob(os.path.join(args.data, "*"))):
+        try:
+            samples, sample_rate = load_clip(path)
+        except Exception as e:
+            print(f"{os.path.basename(path):<14} cannot decode: {e}")
+            continue
+        segments = vad.segments(samples, sample_rate)
+        duration = len(samples) / sample_rate
+        speech = sum(end - start for start, end in segments) / sample_rate
+        results.append({"clip": os.path.basename(path), "audio_s": duration, "speech_s": speech,
+                        "parts": len(segments), "saved_s": duration - speech})
+        print(f"{os.path.basename(path):<14} {duration:>8.2f} {speech:>9.2f} {len(segments):>6} "
+              f"{duration - speech:>8.2f} {(duration - speech) / duration:>7.1%}")
+
+    total = sum(r["audio_s"] for r in results)
+    saved = sum(r["saved_s"] for r in results)
+    if total:
+        print(f"{'total':<14} {total:>8.2f} {total - saved:>9.2f} {'':>6} {saved:>8.2f} {saved / total:>7.1%}")
+    rejected = [r["clip"] for r in results if not r["parts"]]
+    if rejected:
+        print("rejected (no speech):", ", ".join(rejected))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"clips": results, "audio_s": total, "saved_s": saved}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,71 +18,41 @@ const initRecorder = async () => {
 
     recorder.addEventListener('stop', async () => {
         const audioBlob = new Blob(audioChunks, { type: 'audio/ogg' });
-        const base64Audio = await blobToBase64(audioBlob);
-        const text = await sendAudioToSTT(base64Audio);
-        console.log(text)
-        const nlu_response = await sendTextToNLU(text);
-        console.log(nlu_response.message.split('\\n').join('<br>').split('\n').join('<br>'))
-        nluResult.innerHTML = nlu_response.message.split('\\n').join('<br>').split('\n').join('<br>');
-        
-        
-        const audio_base64 = await sendTextToTTS(nlu_response.for_tts);
-        player.src = 'data:audio/ogg;base64,' + audio_base64;
-        player.play(); // Автоматическое воспроизведение аудио
-    });
-};
+        const result = await sendAudioToVoice(audioBlob);
+        if (!result) {
+            return;
+        }
+        console.log(result.transcription)
+        nluResult.innerHTML = result.message.split('\\n').join('<br>').split('\n').join('<br>');
 
-const blobToBase64 = (blob) => {
-    return new Promise((resolve, reject) => {
-        const reader = new FileReader();
-        reader.readAsDataURL(blob);
-        reader.onloadend = () => {
-            console.log(reader.result)
-            const base64data = reader.result.split(',')[1];
-            resolve(base64data);
-        };
-        reader.onerror = reject;
-    });
-};
-
-const sendAudioToSTT = async (base64Audio) => {
-    const response = await fetch('http://localhost:5002/transcribe', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({ audio: base64Audio })
+        player.src = URL.createObjectURL(result.audio);
+        player.play(); // Автоматическое воспроизведение аудио
     });
-
-    const data = await response.json();
-    return data.transcription;
 };
 
-
-const sendTextToNLU = async (text) => {
-    const response = await fetch('http://localhost:5000/parse', {
+// Запись уходит одним запросом в голосовой конвейер (STT -> NLU -> TTS в одном процессе)
+const sendAudioToVoice = async (audioBlob) => {
+    const response = await fetch('http://localhost:5003/voice', {
         method: 'POST',
         headers: {
-            'Content-Type': 'application/json'
+            'Content-Type': 'audio/ogg'
         },
-        body: JSON.stringify({ text: text })
+        body: audioBlob
     });
+    console.log(response.headers.get('Server-Timing'))
 
-    const data = await response.json();
-    return data;
-};
-
-const sendTextToTTS = async (text) => {
-    const response = await fetch('http://localhost:5001/tts', {
-        method: 'POST',
-        headers: { 
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({ text: text })
-    });
+    if (!response.ok) {
+        const error = await response.json();
+        nluResult.innerHTML = error.error || 'Сервис недоступен';
+        return null;
+    }
 
-    const data = await response.json();
-    return data.audio_base64;
+    const data = await response.formData();
+    return {
+        transcription: data.get('transcription'),
+        message: data.get('message'),
+        audio: data.get('audio')
+    };
 };
 
 recordBtn.addEventListener('click', () => {
@@ -0,0 +1,139 @@
+import codecs
+import threading
+from collections import OrderedDict, deque
+
+
+class ConsoleState:
+    """Прочитанная часть лога одной сборки: смещение, последние строки и незавершённая строка."""
+
+    def __init__(self, max_lines):
+        self.lock = threading.Lock()
+        self.lines = deque(maxlen=max_lines)
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.lines.clear()
+        self.partial = ""
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.complete = False
+
+    def feed(self, chunk, final=False):
+        text = self.partial + self.decoder.decode(chunk, final=final)
+        lines = text.split("\n")
+        self.partial = lines.pop()
+        self.lines.extend(lines)
+
+    def tail(self, count):
+        lines = list(self.lines)
+        if self.partial:
+            lines.append(self.partial)
+        return lines[-count:] if count else []
+
+
+class ConsoleReader:
+    """
+    Чтение вывода консоли сборки через logText/progressiveText без загрузки
+    всего лога в память.
+
+    - iter_text(job, build, start, end) - поток текста для диапазона байт;
+    - read_range(job, build, start, end) - тот же диапазон одной строкой;
+    - tail(job, build, lines) - последние строки лога.
+
+    Для tail() по каждой сборке запоминается, до какого байта лог уже
+    прочитан, и последние max_lines строк. Повторный запрос по идущей сборке
+    скачивает только новые байты, по завершённой - не делает запросов вовсе.
+    """
+
+    def __init__(self, client, max_lines=500, max_builds=64, chunk_size=64 * 1024):
+        self.client = client
+        self.max_lines = max_lines
+        self.max_builds = max_builds
+        self.chunk_size = chunk_size
+        self.states = OrderedDict()
+        self.lock = threading.Lock()
+
+    def iter_chunks(self, job_name, build_number, start=0, end=None):
+        """Сырые байты лога от start до end (не включая). Запрос выполняется сразу, чтение - лениво."""
+        response = self.client.get_progressive_text(job_name, build_number, start)
+
+        def chunks():
+            remaining = None if end is None else end - start
+            try:
+                for chunk in response.iter_content(self.chunk_size):
+                    if remaining is not None:
+                        chunk = chunk[:remaining]
+                        remaining -= len(chunk)
+                    if chunk:
+                        yield chunk
+                    if remaining is not None and remaining <= 0:
+                        break
+            finally:
+                response.close()
+
+        return chunks()
+
+    def iter_text(self, job_name, build_number, start=0, end=None):
+        chunks = self.iter_chunks(job_name, build_number, start, end)
+
+        def text():
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for chunk in chunks:
+                decoded = decoder.decode(chunk)
+                if decoded:
+                    yield decoded
+            decoded = decoder.decode(b"", final=True)
+            if decoded:
+                yield decoded
+
+        return text()
+
+    def read_range(self, job_name, build_number, start=0, end=None):
+        return "".join(self.iter_text(job_name, build_number, start, end))
+
+    def _state(self, job_name, build_number):
+        key = (job_name, int(build_number))
+        with self.lock:
+            state = self.states.get(key)
+            if state is None:
+                state = self.states[key] = ConsoleState(self.max_lines)
+                while len(self.states) > self.max_builds:
+                    self.states.popitem(last=False)
+            self.states.move_to_end(key)
+            return state
+
+    def _update(self, state, job_name, build_number):
+        response = self.client.get_progressive_text(job_name, build_number, state.offset)
+        try:
+            read = 0
+            for chunk in response.iter_content(self.chunk_size):
+                state.feed(chunk)
+                read += len(chunk)
+            complete = response.headers.get("X-More-Data") != "true"
+            state.offset = int(response.headers.get("X-Text-Size") or state.offset + read)
+        except Exception:
+            # Часть ответа уже в state, а смещение не сдвинуто - в следующий раз читаем заново
+            state.reset()
+            raise
+        finally:
+            response.close()
+        if complete:
+            state.feed(b"", final=True)
+            state.complete = True
+
+    def tail(self, job_name, build_number, lines=50):
+        """Последние lines строк лога (не больше max_lines - иначе лог читается целиком без кэша)."""
+        if lines > self.max_lines:
+            state = ConsoleState(lines)
+            self._update(state, job_name, build_number)
+            return state.tail(lines)
+
+        state = self._state(job_name, build_number)
+        with state.lock:
+            if not state.complete:
+                self._update(state, job_name, build_number)
+            return state.tail(lines)
+
+    def invalidate(self, job_name, build_number):
+        with self.lock:
+            self.states.pop((job_name, int(build_number)), None)
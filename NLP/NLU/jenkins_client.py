@@ -0,0 +1,209 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+from jenkins import BadHTTPException, JenkinsException, NotFoundException, TimeoutException
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import ERRORS, JENKINS_SECONDS, REQUEST_ID_HEADER, current_request_id, in_context
+from singleflight import SingleFlight
+
+BUILDS_TREE = "builds[number,result,url]{0,%d}"
+
+# Поля, которые реально читают обработчики интентов
+SERVER_INFO_TREE = "mode,numExecutors,quietingDown,jobs[name]"
+JOB_NAMES_TREE = "jobs[name]"
+JOB_INFO_TREE = ("name,description,url,buildable,color,concurrentBuild,nextBuildNumber,"
+                 "firstBuild[number],lastBuild[number],lastCompletedBuild[number],lastFailedBuild[number],"
+                 "lastStableBuild[number],lastSuccessfulBuild[number],lastUnstableBuild[number],"
+                 "lastUnsuccessfulBuild[number]")
+BUILD_INFO_TREE = "number,result,url,timestamp,duration,building"
+JOB_PARAMETERS_TREE = "property[parameterDefinitions[name,description,defaultParameterValue[value]]]"
+
+JOB_SEGMENT = re.compile(r"job/[^/]+/")
+NUMBER_SEGMENT = re.compile(r"(?<=/)\d+(?=/)")
+
+
+class ForbiddenException(JenkinsException):
+    """Jenkins ответил 403: нет прав или crumb (защита от CSRF) устарел."""
+
+
+def endpoint_name(path):
+    """Путь запроса без имён задач и номеров сборок - метка для метрик."""
+    return "/" + NUMBER_SEGMENT.sub("<number>", JOB_SEGMENT.sub("job/<name>/", path))
+
+
+class JenkinsClient:
+    """
+    Доступ к REST API Jenkins для NLU-сервиса.
+
+    Все запросы идут через один requests.Session с пулом keep-alive
+    соединений, таймаутами и повторами идемпотентных запросов. Независимые
+    запросы можно выполнить параллельно через gather(). Методы принимают
+    tree=..., чтобы Jenkins отдавал только нужные поля.
+
+    Одинаковые одновременные GET-запросы JSON выполняются один раз
+    (SingleFlight), результат отдаётся повторно ещё coalesce_ttl секунд.
+
+    Ошибки поднимаются теми же исключениями python-jenkins
+    (JenkinsException, NotFoundException, ...), что и раньше.
+    """
+
+    def __init__(self, url, username=None, password=None, timeout=(3.05, 10), retries=2,
+                 pool_size=16, workers=8, coalesce_ttl=0.0):
+        self.url = url.rstrip("/") + "/"
+        self.timeout = timeout
+        self.session = requests.Session()
+        if username:
+            self.session.auth = (username, password)
+        self.retries = retries
+        self.pool_size = pool_size
+        self.workers = workers
+        self._mount_adapter()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jenkins-client")
+        self.flight = SingleFlight(ttl=coalesce_ttl)
+        self.crumb = None
+
+    def _mount_adapter(self):
+        retry = Retry(total=self.retries, connect=self.retries, read=self.retries, backoff_factor=0.2,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset(["GET"]))
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def after_fork(self):
+        # Соединения пула и потоки родителя в дочернем процессе использовать нельзя
+        self._mount_adapter()
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="jenkins-client")
+        self.flight.after_fork()
+
+    @staticmethod
+    def job_path(name):
+        # Задачи в папках: "folder/job" -> job/folder/job/job/
+        return "".join(f"job/{quote(part, safe='')}/" for part in name.split("/"))
+
+    def request(self, method, path, params=None, headers=None, **kwargs):
+        headers = dict(headers or {}, **{REQUEST_ID_HEADER: current_request_id()})
+        try:
+            with JENKINS_SECONDS.time(method=method, endpoint=endpoint_name(path)):
+                response = self.session.request(method, self.url + path, params=params, headers=headers,
+                                                timeout=self.timeout, **kwargs)
+        except requests.Timeout as e:
+            ERRORS.inc(component="jenkins")
+            raise TimeoutException(f"Timed out requesting {path}: {e}")
+        except requests.RequestException as e:
+            ERRORS.inc(component="jenkins")
+            raise BadHTTPException(f"Error communicating with server[{self.url}]: {e}")
+        if response.status_code >= 400:
+            ERRORS.inc(component="jenkins")
+        if response.status_code == 404:
+            raise NotFoundException(f"Requested item could not be found: {path}")
+        if response.status_code == 403:
+            raise ForbiddenException(f"Error in request [403]: {path}")
+        if response.status_code >= 400:
+            raise JenkinsException(f"Error in request [{response.status_code}]: {path}")
+        return response
+
+    def get_json(self, path, tree=None, depth=None):
+        params = {}
+        if tree:
+            params["tree"] = tree
+        if depth is not None:
+            params["depth"] = depth
+
+        def fetch():
+            response = self.request("GET", path + "api/json", params=params or None)
+            return response.json(), response
+
+        return self.flight.do((path, tree, depth), fetch)
+
+    def forget_job(self, name):
+        """Сбрасывает повторно отдаваемые ответы по задаче (после изменения её состояния)."""
+        path = self.job_path(name)
+        self.flight.forget(lambda key: key[0].startswith(path))
+
+    def gather(self, *calls):
+        """Выполняет независимые вызовы (функции без аргументов) параллельно, результаты - в том же порядке."""
+        futures = [self.pool.submit(in_context(call)) for call in calls]
+        return [future.result() for future in futures]
+
+    def get_info(self, tree=None):
+        return self.get_json("", tree=tree)[0]
+
+    def get_info_and_version(self, tree=None):
+        # Версия приходит в заголовке X-Jenkins любого ответа, отдельный запрос не нужен
+        data, response = self.get_json("", tree=tree)
+        return data, response.headers.get("X-Jenkins")
+
+    def get_version(self):
+        return self.request("GET", "").headers.get("X-Jenkins")
+
+    def get_whoami(self, tree=None):
+        return self.get_json("me/", tree=tree)[0]
+
+    def get_job_info(self, name, tree=None):
+        return self.get_json(self.job_path(name), tree=tree)[0]
+
+    def get_build_info(self, name, number, tree=None):
+        return self.get_json(f"{self.job_path(name)}{int(number)}/", tree=tree)[0]
+
+    def get_build_console_output(self, name, number):
+        return self.request("GET", f"{self.job_path(name)}{int(number)}/consoleText").text
+
+    def get_progressive_text(self, name, number, start=0):
+        """
+        Потоковый ответ logText/progressiveText начиная с байта start. Тело
+        читается через iter_content; X-Text-Size - смещение для следующего
+        запроса, X-More-Data: true - сборка ещё пишет лог.
+        """
+        return self.request("GET", f"{self.job_path(name)}{int(number)}/logText/progressiveText",
+                            params={"start": int(start)}, stream=True)
+
+    def _crumb_headers(self):
+        if self.crumb is None:
+            try:
+                data = self.get_json("crumbIssuer/")[0]
+                self.crumb = {data["crumbRequestField"]: data["crumb"]}
+            except NotFoundException:
+                # CSRF-защита выключена или используется API-токен
+                self.crumb = {}
+        return self.crumb
+
+    def post(self, path):
+        """
+        POST с crumb. Crumb привязан к сессии Jenkins и устаревает после его
+        перезапуска: на 403 crumb запрашивается заново и запрос повторяется один раз.
+        """
+        headers = self._crumb_headers()
+        try:
+            return self.request("POST", path, headers=headers)
+        except ForbiddenException:
+            if not headers:
+                raise
+        self.crumb = None
+        self.flight.forget(lambda key: key[0] == "crumbIssuer/")
+        return self.request("POST", path, headers=self._crumb_headers())
+
+    def stop_build(self, name, number):
+        self.post(f"{self.job_path(name)}{int(number)}/stop")
+        self.forget_job(name)
+
+
+def fetch_builds(client, job_name, limit):
+    """
+    Номер, результат и URL последних limit сборок задачи одним запросом
+    с проекцией tree=builds[number,result,url]{0,limit}.
+    """
+    return client.get_job_info(job_name, tree=BUILDS_TREE % limit).get('builds', [])
+
+
+def fetch_builds_concurrently(client, job_name, limit):
+    """
+    Запасной путь, если tree-запрос не сработал: список сборок из get_job_info,
+    затем get_build_info для каждой параллельно на пуле клиента.
+    """
+    builds = client.get_job_info(job_name).get('builds', [])[:limit]
+    return client.gather(*[lambda number=build['number']: client.get_build_info(job_name, number)
+                           for build in builds])
@@ -0,0 +1,239 @@
+"""
+Зеркало состояния Jenkins в памяти сервиса NLU.
+
+Раньше каждый обработчик интента заново запрашивал Jenkins, потому что
+сервис не знал, изменилось ли что-нибудь. Теперь ответы Jenkins (информация
+о задаче, параметры, списки и информация о сборках) хранятся здесь и
+сбрасываются по событиям:
+
+- уведомлениям Jenkins (плагин Notification, JSON на POST /jenkins/notify);
+- разнице между снимками "задачи и их последние сборки", которые
+  запрашиваются одним запросом раз в poll_interval секунд, - запасной путь,
+  если вебхук не настроен или уведомление потерялось.
+
+Вебхук попадает только в один воркер serve.py; остальные воркеры узнают об
+изменении из следующего снимка.
+"""
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from jenkins import JenkinsException
+from requests import RequestException
+
+from jenkins_client import BUILD_INFO_TREE, fetch_builds, fetch_builds_concurrently
+
+# Задачи с последней сборкой - всё, что нужно для сравнения снимков
+STATE_TREE = "jobs[name,lastBuild[number,building,result]]"
+
+logger = logging.getLogger("jenkins_state")
+
+
+def build_summary(build):
+    if not build:
+        return None
+    return {"number": build["number"], "building": bool(build.get("building")), "result": build.get("result")}
+
+
+class JenkinsState:
+    """
+    jobs - имя задачи -> последняя сборка ({number, building, result} или
+    None), running - множество (задача, номер) выполняющихся сборок.
+
+    Ответы Jenkins хранятся не дольше max_age секунд (изменения конфигурации
+    задач не приходят ни в уведомлениях, ни в снимках) и сбрасываются при
+    любом событии по задаче. Информация о завершённой сборке больше не
+    меняется и события её не сбрасывают.
+
+    max_age <= 0 отключает зеркало: каждый вызов идёт в Jenkins, снимок
+    задач запрашивается заново (так бенчмарк меряет холодный путь).
+    """
+
+    def __init__(self, client, poll_interval=30.0, max_age=60.0, maxsize=4096):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        # Запуск опроса и первый снимок - один раз, сколько бы запросов ни пришло одновременно
+        self.start_lock = threading.Lock()
+        self.entries = OrderedDict()  # ключ -> (значение, время, неизменяемое ли)
+        self.generations = Counter()
+        self.jobs = {}
+        self.running = set()
+        self.synced_at = None
+        self.listeners = []
+        self.counters = Counter()
+        self.poller = None
+
+    def after_fork(self):
+        # Поток опроса не переживает fork: в воркере он запустится заново при первом запросе
+        self.lock = threading.Lock()
+        self.start_lock = threading.Lock()
+        self.poller = None
+
+    # Снимки и события
+
+    def _start_poller(self):
+        self.poller = threading.Thread(target=self._poll, name="jenkins-state-poller", daemon=True)
+        self.poller.start()
+
+    def stop(self):
+        """Останавливает опрос (поток завершится после текущего ожидания)."""
+        self.poller = None
+
+    def _poll(self):
+        while self.poller is threading.current_thread():
+            time.sleep(self.poll_interval)
+            if self.poller is not threading.current_thread():
+                break
+            try:
+                self.sync()
+            except (JenkinsException, RequestException) as e:
+                logger.warning("Jenkins state poll failed: %s", e)
+            except Exception:
+                # Поток опроса не должен умирать: без него изменения видны только по уведомлениям
+                logger.exception("Jenkins state poll failed")
+
+    def _ensure_synced(self):
+        if self.max_age <= 0:
+            self.sync()
+            return
+        if self.synced_at is not None and (self.poller is not None or self.poll_interval <= 0):
+            return
+        with self.start_lock:
+            if self.poll_interval > 0 and self.poller is None:
+                self._start_poller()
+            if self.synced_at is None:
+                self.sync()
+
+    def sync(self):
+        """Снимок задач с последними сборками; задачи, у которых что-то изменилось, сбрасываются."""
+        jobs = self.client.get_info(tree=STATE_TREE).get("jobs", [])
+        snapshot = {job["name"]: build_summary(job.get("lastBuild")) for job in jobs}
+        with self.lock:
+            changed = [name for name in snapshot.keys() | self.jobs.keys()
+                       if snapshot.get(name) != self.jobs.get(name)]
+            # Первый снимок делается по запросу самих подписчиков (JobCatalog), им сообщать не нужно
+            jobs_changed = self.synced_at is not None and snapshot.keys() != self.jobs.keys()
+            for name in changed:
+                self._invalidate(name)
+            self.jobs = snapshot
+            self.running = {(name, build["number"]) for name, build in snapshot.items() if build and build["building"]}
+            self.synced_at = time.monotonic()
+            self.counters["polls"] += 1
+        if jobs_changed:
+            self._notify_listeners()
+
+    def apply_event(self, event):
+        """
+        Уведомление плагина Notification: {"name": задача, "build": {"number",
+        "phase": QUEUED|STARTED|COMPLETED|FINALIZED, "status"}}.
+        """
+        name, build = event["name"], event.get("build") or {}
+        phase = build.get("phase")
+        with self.lock:
+            self.counters["events"] += 1
+            new_job = self.synced_at is not None and name not in self.jobs
+            self._invalidate(name)
+            if "number" in build and phase in ("STARTED", "COMPLETED", "FINALIZED"):
+                number = int(build["number"])
+                last = self.jobs.get(name)
+                if phase == "STARTED":
+                    self.running.add((name, number))
+                else:
+                    self.running.discard((name, number))
+                if last is None or last["number"] <= number:
+                    self.jobs[name] = {"number": number, "building": phase == "STARTED",
+                                       "result": build.get("status") if phase != "STARTED" else None}
+            elif new_job:
+                self.jobs[name] = None
+        if new_job:
+            self._notify_listeners()
+
+    def _notify_listeners(self):
+        for listener in self.listeners:
+            listener()
+
+    def _invalidate(self, job):
+        self.generations[job] += 1
+        # Ответы, которые клиент отдаёт повторно (SingleFlight), тоже могли устареть
+        self.client.forget_job(job)
+        stale = [key for key, (_, _, permanent) in self.entries.items() if key[1] == job and not permanent]
+        for key in stale:
+            del self.entries[key]
+        self.counters["invalidations"] += 1
+
+    def invalidate(self, job):
+        with self.lock:
+            self._invalidate(job)
+
+    # Чтение
+
+    def _cached(self, key, fetch, permanent=lambda value: False):
+        job = key[1]
+        if self.max_age <= 0:
+            with self.lock:
+                self.counters["misses"] += 1
+            return fetch()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry[2] or time.monotonic() - entry[1] < self.max_age):
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[0]
+            generation = self.generations[job]
+            self.counters["misses"] += 1
+        value = fetch()
+        with self.lock:
+            # Если во время запроса пришло событие по задаче, ответ мог устареть - не сохраняем его
+            if self.generations[job] == generation:
+                self.entries[key] = (value, time.monotonic(), permanent(value))
+                if len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+        return value
+
+    def job_names(self):
+        self._ensure_synced()
+        with self.lock:
+            return list(self.jobs)
+
+    def last_build(self, job):
+        self._ensure_synced()
+        with self.lock:
+            return self.jobs.get(job)
+
+    def running_builds(self):
+        self._ensure_synced()
+        with self.lock:
+            return sorted(self.running)
+
+    def get_job_info(self, job, tree=None):
+        return self._cached(("job_info", job, tree), lambda: self.client.get_job_info(job, tree=tree))
+
+    def get_builds(self, job, limit):
+        def fetch():
+            try:
+                return fetch_builds(self.client, job, limit)
+            except JenkinsException:
+                return fetch_builds_concurrently(self.client, job, limit)
+
+        return self._cached(("builds", job, limit), fetch)
+
+    def get_build_info(self, job, number):
+        return self._cached(("build_info", job, number),
+                            lambda: self.client.get_build_info(job, number, tree=BUILD_INFO_TREE),
+                            permanent=lambda info: not info.get("building"))
+
+    def stats(self):
+        with self.lock:
+            requests = self.counters["hits"] + self.counters["misses"]
+            return {
+                **{name: self.counters[name] for name in ("hits", "misses", "events", "polls", "invalidations")},
+                "hit_rate": self.counters["hits"] / requests if requests else 0.0,
+                "jobs": len(self.jobs),
+                "running": len(self.running),
+                "entries": len(self.entries),
+                "synced_ago_s": time.monotonic() - self.synced_at if self.synced_at is not None else None,
+            }
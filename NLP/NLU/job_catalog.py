@@ -0,0 +1,119 @@
+import threading
+import time
+
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+
+from metrics import stage
+
+
+def trigrams(text):
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class FuzzyNameIndex:
+    """
+    Индекс для нечёткого поиска имени среди большого списка.
+
+    Для каждого имени заранее хранится нормализованная строка и её триграммы.
+    При поиске кандидаты отбираются по числу общих триграмм, и только они
+    оцениваются WRatio из rapidfuzz. Небольшие списки (до full_scan_limit)
+    оцениваются целиком - так результат совпадает с process.extractOne.
+    """
+
+    def __init__(self, names, candidates=64, full_scan_limit=256):
+        self.names = list(names)
+        self.processed = [utils.default_process(name) for name in self.names]
+        self.candidates = candidates
+        self.full_scan_limit = full_scan_limit
+        postings = {}
+        for i, name in enumerate(self.processed):
+            for gram in trigrams(name):
+                postings.setdefault(gram, []).append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def _candidate_ids(self, query):
+        if len(self.names) <= self.full_scan_limit:
+            return range(len(self.names))
+        postings = [self.postings[gram] for gram in trigrams(query) if gram in self.postings]
+        if not postings:
+            return []
+        counts = np.bincount(np.concatenate(postings), minlength=len(self.names))
+        top = np.argpartition(counts, -self.candidates)[-self.candidates:] if len(counts) > self.candidates else np.arange(len(counts))
+        top = top[counts[top] > 0]
+        return top[np.argsort(-counts[top], kind="stable")].tolist()
+
+    def best(self, query, score_cutoff):
+        """Возвращает (индекс имени, оценка) или None."""
+        query = utils.default_process(query)
+        ids = list(self._candidate_ids(query))
+        if not ids:
+            return None
+        match = process.extractOne(query, [self.processed[i] for i in ids],
+                                   scorer=fuzz.WRatio, processor=None, score_cutoff=score_cutoff)
+        if match is None:
+            return None
+        return ids[match[2]], match[1]
+
+
+class JobCatalog:
+    """
+    Список задач Jenkins с периодическим обновлением (ttl секунд) и заранее
+    построенными индексами по исходным и транслитерированным именам.
+
+    fetch_jobs() возвращает список имён задач, transliterate(name) - имя
+    кириллицей (как его произносит пользователь).
+    """
+
+    def __init__(self, fetch_jobs, transliterate, ttl=30.0):
+        self.fetch_jobs = fetch_jobs
+        self.transliterate = transliterate
+        self.ttl = ttl
+        # fetch_jobs может сам вызвать invalidate() (JenkinsState сообщает об изменении списка задач)
+        self.lock = threading.RLock()
+        self.names = []
+        self.index = None
+        self.translit_index = None
+        self.loaded_at = None
+
+    def invalidate(self):
+        with self.lock:
+            self.loaded_at = None
+
+    def _fresh(self):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def refresh(self, force=False):
+        with self.lock:
+            if not force and self._fresh():
+                return
+            names = list(self.fetch_jobs())
+            if names != self.names or self.index is None:
+                with stage("job_catalog_rebuild"):
+                    self.index = FuzzyNameIndex(names)
+                    self.translit_index = FuzzyNameIndex([self.transliterate(name) for name in names])
+                self.names = names
+            self.loaded_at = time.monotonic()
+
+    def job_names(self):
+        if not self._fresh():
+            self.refresh()
+        return list(self.names)
+
+    def closest(self, input_job_name):
+        """
+        Ближайшее существующее имя задачи или None: сначала среди исходных
+        имён (порог 70), затем среди транслитерированных (порог 60).
+        """
+        if not self._fresh():
+            self.refresh()
+        with self.lock:
+            names, index, translit_index = self.names, self.index, self.translit_index
+
+        match = index.best(input_job_name, score_cutoff=70)
+        if match is None:
+            match = translit_index.best(input_job_name, score_cutoff=60)
+        if match is None:
+            return None
+        return names[match[0]]
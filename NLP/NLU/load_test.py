@@ -0,0 +1,115 @@
+"""
+Нагрузочный тест сервиса: для каждого уровня параллельности отправляет
+запросы из нескольких потоков и выводит req/s, перцентили задержки и ошибки.
+
+    python load_test.py nlu --url http://localhost:5000 --concurrency 1,2,4,8,16 --requests 200
+    python load_test.py stt --url http://localhost:5002 --audio test_data/a.ogg
+    python load_test.py voice --url http://localhost:5003 --audio test_data/a.ogg --json results.json
+
+Сравнить режимы запуска: python app.py против python serve.py nlu --workers 4.
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+
+import requests
+
+from nlu_cache import load_training_examples
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+def make_requests(args):
+    """Функция (session, i) -> response для выбранного сервиса."""
+    if args.service == "nlu":
+        # Разные фразы, чтобы не измерять только кэш разбора
+        texts = [text for text, _, _ in load_training_examples(args.data)]
+        return lambda session, i: session.post(f"{args.url}/parse", json={"text": f"{texts[i % len(texts)]} {i}"})
+    if args.service == "tts":
+        texts = [f"Сборка номер {i} задачи деплой завершилась успешно." for i in range(1000)]
+        return lambda session, i: session.post(f"{args.url}/tts?format=raw", json={"text": texts[i % len(texts)]})
+
+    with open(args.audio, "rb") as f:
+        audio = f.read()
+    if args.service == "stt":
+        payload = {"audio": base64.b64encode(audio).decode("utf-8")}
+        return lambda session, i: session.post(f"{args.url}/transcribe", json=payload)
+    return lambda session, i: session.post(f"{args.url}/voice", data=audio, headers={"Content-Type": "audio/ogg"})
+
+
+def run_level(send, concurrency, total):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        nonlocal errors
+        session = requests.Session()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                ok = send(session, i).status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                errors += not ok
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": total / duration,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("service", choices=["nlu", "tts", "stt", "voice"])
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--audio", default="test_data/a.ogg")
+    parser.add_argument("--data", default="data.yml")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    send = make_requests(args)
+    run_level(send, 1, args.warmup)
+
+    results = []
+    print(f"{'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for concurrency in map(int, args.concurrency.split(",")):
+        result = run_level(send, concurrency, args.requests)
+        results.append(result)
+        print(f"{concurrency:>5} {result['rps']:>9.1f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+              f"{result['p99_ms']:>9.1f} {result['errors']:>7}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"service": args.service, "url": args.url, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Общие метрики и логирование сервисов STT, TTS и NLU.
+
+- гистограммы длительности этапов (stage("decode") и т.п.) и HTTP-запросов,
+  счётчики; отдаются в текстовом формате Prometheus на /metrics;
+- статистика существующих компонентов (батчинг, кэши) подключается через
+  register_stats() и попадает в /metrics как gauge;
+- X-Request-ID: берётся из входящего запроса или создаётся, возвращается в
+  ответе, передаётся в запросы к Jenkins и попадает в каждую строку лога;
+- логирование с уровнем LOG_LEVEL; записи DEBUG (содержимое запросов)
+  пропускаются с вероятностью LOG_SAMPLE_RATE.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+REQUEST_ID_HEADER = "X-Request-ID"
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # labels (tuple пар) -> [счётчики по корзинам + "+Inf", сумма]
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.items())
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = [(dict(key), list(counts), total) for key, (counts, total) in self.series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(dict(labels, le=bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.items())
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            series = list(self.series.items())
+        lines += [f"{self.name}{format_labels(dict(key))} {value}" for key, value in series]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.stats = []
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help):
+        metric = Counter(name, help)
+        self.metrics.append(metric)
+        return metric
+
+    def register_stats(self, prefix, stats_fn):
+        """Числовые поля верхнего уровня stats_fn() отдаются как gauge <prefix>_<поле>."""
+        self.stats.append((prefix, stats_fn))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for prefix, stats_fn in self.stats:
+            try:
+                stats = stats_fn()
+            except Exception as e:
+                logging.getLogger(__name__).warning("stats %s failed: %s", prefix, e)
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("stage_duration_seconds", "Duration of a processing stage")
+HTTP_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "Duration of HTTP requests handled by the service")
+JENKINS_SECONDS = REGISTRY.histogram("jenkins_request_duration_seconds", "Duration of requests to Jenkins")
+ERRORS = REGISTRY.counter("errors_total", "Errors by component")
+
+
+def stage(name):
+    """Замер этапа: with stage("forward"): ..."""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def current_request_id():
+    return request_id_var.get()
+
+
+def in_context(fn):
+    """
+    fn, выполняемая в копии текущего контекста. Потоки пула не наследуют
+    contextvars, поэтому без этого работа, отправленная в пул, теряет
+    request id. Копия делается на каждую отправку: один контекст нельзя
+    войти из двух потоков сразу.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает записи уровня max_level и ниже с вероятностью rate; остальные - всегда."""
+
+    def __init__(self, rate, max_level=logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.max_level = max_level
+
+    def filter(self, record):
+        return record.levelno > self.max_level or self.rate >= 1.0 or random.random() < self.rate
+
+
+def configure_logging(service):
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(f"%(asctime)s %(levelname)s {service} [%(request_id)s] %(name)s: %(message)s"))
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter(float(os.environ.get("LOG_SAMPLE_RATE", 1.0))))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+
+def preview(value, limit=200):
+    """Короткое представление для логов: у тензоров и массивов - форма, у строк - начало."""
+    shape = getattr(value, "shape", None)
+    if shape is not None:
+        return f"<{type(value).__name__} shape={tuple(shape)}>"
+    text = str(value)
+    return text if len(text) <= limit else f"{text[:limit]}... ({len(text)} chars)"
+
+
+def instrument(app, service):
+    """
+    Подключает к Flask-приложению X-Request-ID, замер запросов, /metrics и
+    настройку логирования.
+    """
+    configure_logging(service)
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+        g.request_id_token = request_id_var.set(request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex)
+
+    @app.after_request
+    def finish_request(response):
+        response.headers[REQUEST_ID_HEADER] = request_id_var.get()
+        if "request_started" in g:
+            HTTP_SECONDS.observe(time.perf_counter() - g.request_started,
+                                 route=request.url_rule.rule if request.url_rule else "unmatched",
+                                 method=request.method, status=response.status_code)
+        return response
+
+    @app.teardown_request
+    def reset_request_id(exc):
+        token = g.pop("request_id_token", None)
+        if token is not None:
+            try:
+                request_id_var.reset(token)
+            except ValueError:
+                # Токен создан в другом контексте - просто затираем значение
+                request_id_var.set("-")
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+    return app
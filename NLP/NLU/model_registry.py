@@ -0,0 +1,243 @@
+"""
+Локальный реестр моделей: сервисы STT/TTS берут модели из каталога на диске,
+без обращения к GitHub и HF hub, что нужно на изолированных узлах.
+
+Структура каталога (MODEL_REGISTRY_DIR, по умолчанию model_registry/):
+
+    <реестр>/<имя модели>/...файлы модели...
+    <реестр>/<имя модели>/manifest.json   {"files": {"путь": "sha256", ...}}
+
+Наполнить реестр можно на машине с доступом в сеть:
+
+    python model_registry.py export-stt jonatasgrosman/wav2vec2-large-xlsr-53-russian
+    python model_registry.py export-tts v3_1_ru
+
+после чего каталог копируется на целевые узлы.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", "model_registry")
+MANIFEST = "manifest.json"
+# Результат полной проверки. Только с MODEL_REGISTRY_TRUST_STAT=1: пока размер и время изменения файла
+# не менялись, sha256 не пересчитывается (порчу, не меняющую их, такая проверка не заметит)
+VERIFIED = ".verified.json"
+TRUST_STAT = os.environ.get("MODEL_REGISTRY_TRUST_STAT", "0") == "1"
+
+logger = logging.getLogger("model_registry")
+
+
+class ModelRegistryError(Exception):
+    pass
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stt_model_name(model_name):
+    return "stt/" + model_name.replace("/", "__")
+
+
+def tts_model_name(model_id):
+    return "tts/" + model_id
+
+
+class ModelRegistry:
+    def __init__(self, root=REGISTRY_DIR, trust_stat=TRUST_STAT):
+        self.root = root
+        self.trust_stat = trust_stat
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def has(self, name):
+        return os.path.exists(os.path.join(self.path(name), MANIFEST))
+
+    def resolve(self, name):
+        """Возвращает каталог модели, предварительно сверив контрольные суммы."""
+        if not self.has(name):
+            raise ModelRegistryError(f"Model {name} is not in the registry at {self.root}")
+        self.verify(name)
+        return self.path(name)
+
+    def checksum(self, name):
+        """Контрольная сумма всех файлов модели по манифесту - ревизия модели в реестре."""
+        with open(os.path.join(self.path(name), MANIFEST), encoding="utf-8") as f:
+            files = json.load(f)["files"]
+        return hashlib.sha256(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def verify(self, name):
+        directory = self.path(name)
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            files = json.load(f)["files"]
+
+        verified_path = os.path.join(directory, VERIFIED)
+        verified = {}
+        if self.trust_stat:
+            try:
+                with open(verified_path, encoding="utf-8") as f:
+                    verified = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        changed = False
+        for relative_path, expected in files.items():
+            path = os.path.join(directory, relative_path)
+            if not os.path.exists(path):
+                raise ModelRegistryError(f"{name}: missing file {relative_path}")
+            stat = os.stat(path)
+            signature = [stat.st_size, stat.st_mtime_ns, expected]
+            if verified.get(relative_path) == signature:
+                continue
+            actual = sha256_file(path)
+            if actual != expected:
+                raise ModelRegistryError(f"{name}: checksum mismatch for {relative_path}")
+            verified[relative_path] = signature
+            changed = True
+
+        if changed and self.trust_stat:
+            try:
+                with open(verified_path, "w", encoding="utf-8") as f:
+                    json.dump(verified, f)
+            except OSError as e:
+                # Реестр на изолированных узлах обычно смонтирован только для чтения - проверка от этого не хуже
+                logger.warning("cannot save verification state for %s: %s", name, e)
+
+    def write_manifest(self, name):
+        directory = self.path(name)
+        files = {}
+        for current, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename in (MANIFEST, VERIFIED):
+                    continue
+                path = os.path.join(current, filename)
+                files[os.path.relpath(path, directory).replace(os.sep, "/")] = sha256_file(path)
+        with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump({"name": name, "created": time.time(), "files": files}, f, indent=2)
+        return files
+
+
+class BackgroundLoader:
+    """
+    Загружает модель в фоновом потоке. load_fn(report) получает функцию
+    report(stage) для отметки этапов; состояние доступно через status()
+    и отдаётся эндпоинтом готовности.
+    """
+
+    def __init__(self, name, load_fn):
+        self.name = name
+        self.load_fn = load_fn
+        self.value = None
+        self.state = "pending"
+        self.stage = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self, background=True):
+        with self.lock:
+            if self.state != "pending":
+                return self
+            self.state = "loading"
+            self.started = time.time()
+        if background:
+            threading.Thread(target=self._load, name=f"{self.name}-loader", daemon=True).start()
+        else:
+            self._load()
+        return self
+
+    def _report(self, stage):
+        self.stage = stage
+
+    def _load(self):
+        try:
+            self.value = self.load_fn(self._report)
+            self.state = "ready"
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = "failed"
+        finally:
+            self.finished = time.time()
+            self.done.set()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def get(self, timeout=None):
+        """Ждёт окончания загрузки и возвращает модель."""
+        self.start()
+        if not self.done.wait(timeout):
+            raise TimeoutError(f"{self.name} is still loading ({self.stage})")
+        if self.state == "failed":
+            raise RuntimeError(f"{self.name} failed to load: {self.error}")
+        return self.value
+
+    def status(self):
+        elapsed = None
+        if self.started:
+            elapsed = (self.finished or time.time()) - self.started
+        return {"model": self.name, "state": self.state, "stage": self.stage,
+                "elapsed_s": elapsed, "error": self.error}
+
+
+def export_stt(model_name, registry):
+    """Сохраняет процессор и модель в safetensors (загрузка с отображением в память)."""
+    from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
+
+    name = stt_model_name(model_name)
+    directory = registry.path(name)
+    Wav2Vec2Processor.from_pretrained(model_name).save_pretrained(directory)
+    Wav2Vec2ForCTC.from_pretrained(model_name).save_pretrained(directory, safe_serialization=True)
+    registry.write_manifest(name)
+    return directory
+
+
+def export_tts(model_id, registry, language="ru", models_yml="latest_silero_models.yml"):
+    """Скачивает torch.package модели Silero, адрес берётся из models.yml."""
+    import torch
+    import yaml
+
+    with open(models_yml, encoding="utf-8") as f:
+        models = yaml.safe_load(f)
+    url = models["tts_models"][language][model_id]["latest"]["package"]
+
+    name = tts_model_name(model_id)
+    directory = registry.path(name)
+    os.makedirs(directory, exist_ok=True)
+    torch.hub.download_url_to_file(url, os.path.join(directory, "model.pt"), progress=True)
+    registry.write_manifest(name)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Populate the local model registry")
+    parser.add_argument("command", choices=["export-stt", "export-tts", "verify"])
+    parser.add_argument("model")
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == "export-stt":
+        print(export_stt(args.model, registry))
+    elif args.command == "export-tts":
+        print(export_tts(args.model, registry))
+    else:
+        registry.verify(args.model)
+        print(f"{args.model}: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Быстрые пути для /parse: таблица точных совпадений с обучающими примерами
+из data.yml и LRU-кэш результатов модели по нормализованной фразе.
+"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import yaml
+
+ENTITY_PATTERN = re.compile(r"\[(?P<text>[^\]]+)\](?:\((?P<entity>[^)]+)\)|(?P<json>\{[^}]*\}))")
+
+
+def normalize_utterance(text):
+    """Регистр, ё/е, пунктуация и лишние пробелы не меняют смысл команды."""
+    text = text.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def parse_example(example):
+    """
+    Разбирает пример с разметкой Rasa: "задача [my_job](job_name)" ->
+    ("задача my_job", [{"entity": "job_name", "value": "my_job", "start": 7, "end": 13}]).
+    """
+    text, entities, position = "", [], 0
+    for match in ENTITY_PATTERN.finditer(example):
+        text += example[position:match.start()]
+        value = match.group("text")
+        if match.group("json"):
+            annotation = json.loads(match.group("json"))
+            entity, value_override = annotation["entity"], annotation.get("value", value)
+        else:
+            entity, value_override = match.group("entity"), value
+        entities.append({"entity": entity, "value": value_override, "start": len(text), "end": len(text) + len(value)})
+        text += value
+        position = match.end()
+    return text + example[position:], entities
+
+
+def load_training_examples(path):
+    """Список (текст, интент, сущности) из раздела nlu файла data.yml."""
+    with open(path, encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    examples = []
+    for block in data.get("nlu", []):
+        if "intent" not in block:
+            continue
+        for line in block.get("examples", "").splitlines():
+            line = line.strip()
+            if line.startswith("- "):
+                text, entities = parse_example(line[2:].strip())
+                examples.append((text, block["intent"], entities))
+    return examples
+
+
+class ExactMatchTable:
+    """
+    Фразы, совпадающие с обучающим примером после normalize_utterance,
+    получают интент примера с уверенностью 1.0 без запуска модели.
+    Фразы, встречающиеся в примерах разных интентов, в таблицу не попадают.
+    """
+
+    def __init__(self, examples):
+        table, ambiguous = {}, set()
+        for text, intent, entities in examples:
+            key = normalize_utterance(text)
+            if key in table and table[key][1] != intent:
+                ambiguous.add(key)
+            table[key] = (text, intent, entities)
+        for key in ambiguous:
+            del table[key]
+        self.table = table
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_training_examples(path))
+
+    def __len__(self):
+        return len(self.table)
+
+    def lookup(self, text):
+        match = self.table.get(normalize_utterance(text))
+        if match is None:
+            return None
+        _, intent, entities = match
+        return {
+            "text": text,
+            "intent": {"name": intent, "confidence": 1.0},
+            "entities": [dict(entity, confidence_entity=1.0, extractor="ExactMatchTable") for entity in entities],
+            "intent_ranking": [{"name": intent, "confidence": 1.0}],
+        }
+
+
+class ParseCache:
+    """
+    Разбор фраз с быстрыми путями: сначала таблица точных совпадений, затем
+    LRU-кэш (maxsize результатов модели), и только потом parse_fn(text).
+
+    model_version() возвращает идентификатор текущей модели; при его смене
+    кэш сбрасывается. Результаты из кэша общие - их нельзя изменять.
+    """
+
+    def __init__(self, parse_fn, exact_table=None, maxsize=1024, model_version=None):
+        self.parse_fn = parse_fn
+        self.exact_table = exact_table
+        self.maxsize = maxsize
+        self.model_version = model_version
+        self.version = model_version() if model_version else None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.exact_hits = 0
+        self.cache_hits = 0
+        self.misses = 0
+        self.model_ms_total = 0.0
+        self.saved_ms = 0.0
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _check_version(self):
+        if self.model_version is None:
+            return
+        version = self.model_version()
+        if version != self.version:
+            with self.lock:
+                self.entries.clear()
+                self.version = version
+
+    def _record_hit(self, started):
+        # Экономия оценивается как средняя задержка модели минус время быстрого пути
+        elapsed = (time.perf_counter() - started) * 1000
+        if self.misses:
+            self.saved_ms += max(self.model_ms_total / self.misses - elapsed, 0.0)
+
+    def parse(self, text):
+        started = time.perf_counter()
+        if self.exact_table is not None:
+            result = self.exact_table.lookup(text)
+            if result is not None:
+                with self.lock:
+                    self.exact_hits += 1
+                    self._record_hit(started)
+                return result
+
+        self._check_version()
+        key = normalize_utterance(text)
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                self.cache_hits += 1
+                self._record_hit(started)
+                return result
+
+        result = self.parse_fn(text)
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.misses += 1
+            self.model_ms_total += elapsed
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self.lock:
+            requests = self.exact_hits + self.cache_hits + self.misses
+            return {
+                "requests": requests,
+                "exact_hits": self.exact_hits,
+                "cache_hits": self.cache_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.cache_hits) / requests if requests else 0.0,
+                "model_ms_mean": self.model_ms_total / self.misses if self.misses else None,
+                "saved_ms": round(self.saved_ms, 3),
+                "size": len(self.entries),
+                "exact_table_size": len(self.exact_table) if self.exact_table is not None else 0,
+                "model_version": self.version,
+            }
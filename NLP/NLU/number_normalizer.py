@@ -0,0 +1,141 @@
+import difflib
+from collections import Counter
+from functools import lru_cache
+
+UNITS = ["ноль", "один", "два", "три", "четыре", "пять", "шесть", "семь", "восемь", "девять"]
+TEENS = ["десять", "одиннадцать", "двенадцать", "тринадцать", "четырнадцать",
+         "пятнадцать", "шестнадцать", "семнадцать", "восемнадцать", "девятнадцать"]
+TENS = ["", "", "двадцать", "тридцать", "сорок", "пятьдесят", "шестьдесят", "семьдесят", "восемьдесят", "девяносто"]
+HUNDREDS = ["", "сто", "двести", "триста", "четыреста", "пятьсот", "шестьсот", "семьсот", "восемьсот", "девятьсот"]
+THOUSANDS = ["тысяча", "тысячи", "тысяч"]
+
+RUSSIAN_NUMBERS = {word: value for value, word in enumerate(UNITS)}
+RUSSIAN_NUMBERS.update({word: 10 + value for value, word in enumerate(TEENS)})
+# Добавляем числа от 20 до 99
+for i in range(20, 100):
+    tens_word, ones = TENS[i // 10], i % 10
+    RUSSIAN_NUMBERS[f"{tens_word} {UNITS[ones]}" if ones else tens_word] = i
+
+# Сотни, тысячи и женский род ("две тысячи") ищутся только точным совпадением
+EXACT_WORDS = {word: value * 100 for value, word in enumerate(HUNDREDS) if word}
+EXACT_WORDS.update({word: 1000 for word in THOUSANDS})
+EXACT_WORDS.update({"одна": 1, "две": 2})
+
+CUTOFF = 0.75
+
+
+class NumberWordIndex:
+    """
+    Нечёткий поиск числительного для одного слова с той же семантикой, что у
+    difflib.get_close_matches(word, words, n=1, cutoff=cutoff): побеждает
+    наибольшее отношение SequenceMatcher, при равенстве - "большее" слово.
+
+    Словарь заранее разложен по длинам слов вместе с мультимножествами букв.
+    Отношение не может превышать 2 * min(len) / (len(a) + len(b)) и долю общих
+    букв, поэтому полный SequenceMatcher считается только для немногих
+    кандидатов, прошедших оба фильтра.
+    """
+
+    def __init__(self, words, cutoff=CUTOFF):
+        self.cutoff = cutoff
+        self.by_length = {}
+        for word in words:
+            self.by_length.setdefault(len(word), []).append((word, Counter(word)))
+
+    def closest(self, word):
+        length = len(word)
+        letters = Counter(word)
+        best = None
+        for candidate_length, candidates in self.by_length.items():
+            total = length + candidate_length
+            if 2 * min(length, candidate_length) < self.cutoff * total:
+                continue
+            for candidate, candidate_letters in candidates:
+                common = sum((letters & candidate_letters).values())
+                if 2 * common < self.cutoff * total:
+                    continue
+                score = difflib.SequenceMatcher(None, candidate, word).ratio()
+                if score >= self.cutoff and (best is None or (score, candidate) > best):
+                    best = (score, candidate)
+        return best[1] if best else None
+
+
+number_index = NumberWordIndex(RUSSIAN_NUMBERS)
+
+
+@lru_cache(maxsize=4096)
+def match_number_word(word):
+    """Возвращает (ближайшее числительное, значение) для слова или None."""
+    if word in EXACT_WORDS:
+        return word, EXACT_WORDS[word]
+    match = number_index.closest(word)
+    if match is not None:
+        return match, RUSSIAN_NUMBERS[match]
+    return None
+
+
+def _fits(total, current, value):
+    """Можно ли продолжить текущее число значением value ("сто" + "сорок" + "два")."""
+    if value == 1000:
+        return total == 0
+    if value >= 100:
+        return current == 0
+    if value == 0:
+        return False
+    if value >= 10:
+        return current % 100 == 0
+    rest = current % 100
+    return rest == 0 or (rest >= 20 and rest % 10 == 0)
+
+
+def _combine(values):
+    """Склеивает подряд идущие числительные в числа по правилам русской грамматики."""
+    numbers = []
+    total = current = 0
+    started = False
+    for value in values:
+        if started and not _fits(total, current, value):
+            numbers.append(total + current)
+            total = current = 0
+            started = False
+        if value == 1000:
+            total, current = max(current, 1) * 1000, 0
+        else:
+            current += value
+        started = True
+        if value == 0:
+            numbers.append(0)
+            total = current = 0
+            started = False
+    if started:
+        numbers.append(total + current)
+    return numbers
+
+
+def replace_numbers_with_digits(text):
+    words = text.split()
+    result = []
+    values = []
+    i = 0
+
+    def flush():
+        result.extend(str(number) for number in _combine(values))
+        values.clear()
+
+    while i < len(words):
+        match = match_number_word(words[i])
+        if match is not None:
+            num_word, value = match
+            length = num_word.count(" ") + 1
+            # Как и раньше, совпадение засчитывается, только если все слова числительного
+            # действительно есть в тексте: иначе "давай", "есть", "сборок" стали бы числами
+            if set(num_word.split()).issubset(words[i:i + length]):
+                values.append(value)
+                i += length
+                continue
+        flush()
+        result.append(words[i])
+        i += 1
+
+    flush()
+    return " ".join(result)
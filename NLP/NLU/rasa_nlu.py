@@ -1,13 +1,104 @@
 import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
 from rasa.core.agent import Agent
 from rasa.shared.utils.io import json_to_string
 
+
 class Load_Rasa_NLU:
-    def __init__(self, model_path:str) -> None:
+    """
+    Rasa NLU с небольшим пулом долгоживущих циклов событий, каждый в своём
+    потоке.
+
+    Раньше каждое сообщение разбиралось через asyncio.run(), который создаёт
+    и закрывает цикл событий на каждый запрос. Теперь корутины агента
+    отправляются в постоянные циклы через run_coroutine_threadsafe, а
+    результат возвращается словарём, без сериализации в JSON и обратно.
+
+    Разбор внутри parse_message синхронный (граф Rasa и TF), поэтому один
+    цикл обрабатывал бы сообщения строго по очереди. Циклов loops штук, и
+    каждое сообщение занимает свободный цикл целиком. Если разбор не
+    уложился в timeout секунд, вызывающий получает TimeoutError (сам разбор
+    доходит до конца в своём цикле).
+    """
+
+    def __init__(self, model_path: str, timeout: float = 30.0, loops: int = 4) -> None:
+        self.timeout = timeout
+        self.loop_count = max(1, loops)
+        self._start_loops()
+        # Agent.load синхронный и может идти дольше timeout (холодная загрузка TF) - ждём его без ограничения;
+        # timeout относится только к разбору сообщений
         self.agent = Agent.load(model_path)
-        print("NLU model loaded")
+        logging.getLogger("nlu").info("NLU model loaded")
+
+    def _start_loops(self):
+        self.loops, self.threads = [], []
+        self.idle = queue.Queue()
+        for i in range(self.loop_count):
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name=f"rasa-nlu-loop-{i}", daemon=True)
+            thread.start()
+            self.loops.append(loop)
+            self.threads.append(thread)
+            self.idle.put(loop)
+
+    def after_fork(self):
+        # Потоки циклов событий остались в родительском процессе, а их селекторы общие с ним
+        self._start_loops()
+
+    @property
+    def model_id(self):
+        # Меняется при загрузке другой модели - по нему сбрасывается кэш разбора
+        return self.agent.model_id
+
+    def _submit(self, coroutine, deadline):
+        """Отправляет корутину в свободный цикл; цикл освобождается, когда она завершится."""
+        try:
+            loop = self.idle.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            coroutine.close()
+            raise TimeoutError(f"no free NLU loop within {self.timeout} s") from None
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        future.add_done_callback(lambda _: self.idle.put(loop))
+        return future
+
+    @staticmethod
+    def _result(future, deadline):
+        try:
+            return future.result(max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            raise TimeoutError("NLU parse timed out") from None
+
+    def run(self, coroutine):
+        """Выполняет корутину в свободном цикле NLU и ждёт результата из вызывающего потока."""
+        deadline = time.monotonic() + self.timeout
+        return self._result(self._submit(coroutine, deadline), deadline)
+
+    def parse(self, message: str) -> dict:
+        return self.run(self.agent.parse_message(message.strip()))
+
+    def parse_batch(self, messages) -> list:
+        """
+        Разбирает несколько сообщений параллельно в разных циклах (не больше
+        loops одновременно), результаты - в том же порядке. Повторяющиеся
+        сообщения разбираются один раз.
+        """
+        deadline = time.monotonic() + self.timeout
+        unique = list(dict.fromkeys(message.strip() for message in messages))
+        futures = {message: self._submit(self.agent.parse_message(message), deadline) for message in unique}
+        parsed = {message: self._result(future, deadline) for message, future in futures.items()}
+        return [parsed[message.strip()] for message in messages]
 
     def nlu_processing(self, message: str) -> str:
-        message = message.strip()
-        results = asyncio.run(self.agent.parse_message(message))
-        return json_to_string(results)
\ No newline at end of file
+        # Прежний интерфейс: результат в виде JSON-строки
+        return json_to_string(self.parse(message))
+
+    def close(self):
+        for loop in self.loops:
+            loop.call_soon_threadsafe(loop.stop)
+        for thread in self.threads:
+            thread.join()
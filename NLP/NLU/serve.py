@@ -0,0 +1,129 @@
+"""
+Запуск сервисов на gunicorn вместо отладочного сервера Flask.
+
+    python serve.py stt --workers 2 --threads 4
+    python serve.py nlu --workers 4 --threads 8 --port 5000
+
+Модели загружаются один раз в мастер-процессе до fork (preload_app), воркеры
+получают их через copy-on-write. Исключение - сервисы с Rasa (nlu и voice):
+TensorFlow после fork не работает (его пулы потоков остаются в мастере),
+поэтому там каждый воркер загружает модели сам, и --timeout должен быть
+больше времени загрузки. Чтобы воркеры не делили ядра между собой, каждый
+ставит torch.set_num_threads(ядра / воркеры) (или --torch-threads).
+Пул потоков torch общий на процесс: TTS синтезирует предложения одного
+ответа параллельно в TTS_WORKERS потоках (по умолчанию 2), и каждый из них
+использует все torch-потоки воркера. Поэтому TTS_WORKERS держится маленьким,
+а не равным числу ядер: иначе ядра воркера делили бы воркеры x ядра потоков.
+
+На Windows gunicorn не работает - там используется waitress (--server
+waitress), один процесс с пулом потоков.
+"""
+import argparse
+import importlib
+import os
+
+SERVICES = {
+    "nlu": ("app", 5000),
+    "tts": ("text_to_speech", 5001),
+    "stt": ("speech_to_text", 5002),
+    "voice": ("voice_pipeline", 5003),
+}
+
+# Сервисы, загружающие Rasa (TensorFlow), - без preload_app
+NO_PRELOAD = {"nlu", "voice"}
+
+
+def set_torch_threads(count):
+    try:
+        import torch
+    except ImportError:
+        # NLU-сервису (Rasa) torch не нужен
+        return
+    torch.set_num_threads(count)
+
+
+def load_service(name):
+    # Модели грузятся синхронно при импорте: потоки загрузки не должны пережить fork
+    os.environ["STT_LOAD_IN_BACKGROUND"] = "0"
+    os.environ["TTS_LOAD_IN_BACKGROUND"] = "0"
+    # Пока модели грузятся в мастере, пул потоков torch не создаётся: после fork он был бы неработоспособен
+    set_torch_threads(1)
+    return importlib.import_module(SERVICES[name][0])
+
+
+def load_service_in_worker(name):
+    # Уже после fork: размер пула потоков torch задан в post_fork, его не трогаем
+    os.environ["STT_LOAD_IN_BACKGROUND"] = "0"
+    os.environ["TTS_LOAD_IN_BACKGROUND"] = "0"
+    return importlib.import_module(SERVICES[name][0])
+
+
+def torch_threads_per_worker(workers, requested=None):
+    if requested:
+        return requested
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def run_gunicorn(module, args):
+    """module - уже загруженный сервис (preload_app) или None, если каждый воркер загружает его сам."""
+    from gunicorn.app.base import BaseApplication
+
+    torch_threads = torch_threads_per_worker(args.workers, args.torch_threads)
+
+    def post_fork(server, worker):
+        set_torch_threads(torch_threads)
+        if module is not None and hasattr(module, "after_fork"):
+            module.after_fork()
+        server.log.info("worker %s: torch threads %d", worker.pid, torch_threads)
+
+    class Application(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{args.host}:{args.port}",
+                "workers": args.workers,
+                "threads": args.threads,
+                "worker_class": "gthread",
+                "preload_app": module is not None,
+                "timeout": args.timeout,
+                "post_fork": post_fork,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            if module is None:
+                return load_service_in_worker(args.service).app
+            return module.app
+
+    Application().run()
+
+
+def run_waitress(module, args):
+    from waitress import serve
+
+    set_torch_threads(torch_threads_per_worker(1, args.torch_threads))
+    serve(module.app, host=args.host, port=args.port, threads=args.threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve one of the services with a production WSGI server")
+    parser.add_argument("service", choices=sorted(SERVICES))
+    parser.add_argument("--host", default=os.environ.get("SERVE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVE_WORKERS", 2)))
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("SERVE_THREADS", 4)))
+    parser.add_argument("--torch-threads", type=int, default=int(os.environ.get("TORCH_THREADS", 0)) or None)
+    parser.add_argument("--timeout", type=int, default=120)
+    parser.add_argument("--server", choices=["gunicorn", "waitress"], default="waitress" if os.name == "nt" else "gunicorn")
+    args = parser.parse_args()
+    if args.port is None:
+        args.port = SERVICES[args.service][1]
+
+    if args.server == "gunicorn":
+        run_gunicorn(None if args.service in NO_PRELOAD else load_service(args.service), args)
+    else:
+        run_waitress(load_service(args.service), args)
+
+
+if __name__ == "__main__":
+    main()
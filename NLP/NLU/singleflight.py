@@ -0,0 +1,98 @@
+"""
+Объединение одинаковых одновременных запросов (single flight).
+
+Когда несколько пользователей одновременно спрашивают об одной задаче, каждый
+запрос Flask делал к Jenkins свой одинаковый запрос. Здесь первый вызов с
+данным ключом выполняется, а остальные, пришедшие пока он идёт, ждут его и
+получают тот же результат (или то же исключение). Результат можно ещё ttl
+секунд отдавать без запроса.
+
+Результат общий для всех ожидающих - менять его нельзя.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self, ttl=0.0, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.results = OrderedDict()  # ключ -> (значение, когда устареет)
+        self.counters = Counter()
+
+    def after_fork(self):
+        # Запросы, шедшие в родителе во время fork, в дочернем процессе не завершатся
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn, ttl=None):
+        """Результат fn() для ключа key, общий с одновременными вызовами с тем же ключом."""
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            self.counters["calls"] += 1
+            entry = self.results.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self.counters["reused"] += 1
+                    return entry[0]
+                del self.results[key]
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+                self.counters["executed"] += 1
+            else:
+                self.counters["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            value = fn()
+        except BaseException as e:
+            with self.lock:
+                if self.calls.get(key) is future:
+                    del self.calls[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            # Если во время запроса был forget(), его результат мог устареть: он отдаётся
+            # только тем, кто уже ждал, и не сохраняется
+            current = self.calls.get(key) is future
+            if current:
+                del self.calls[key]
+            if current and ttl > 0:
+                self.results[key] = (value, time.monotonic() + ttl)
+                if len(self.results) > self.maxsize:
+                    self.results.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def forget(self, match):
+        """
+        Сбрасывает сохранённые результаты, для ключей которых match(key)
+        истинно. Идущие сейчас запросы с такими ключами отцепляются: новые
+        вызовы делают свой запрос, а результат отцепленного не сохраняется.
+        """
+        with self.lock:
+            for key in [key for key in self.results if match(key)]:
+                del self.results[key]
+            for key in [key for key in self.calls if match(key)]:
+                del self.calls[key]
+
+    def stats(self):
+        with self.lock:
+            calls = self.counters["calls"]
+            saved = self.counters["coalesced"] + self.counters["reused"]
+            return {
+                "calls": calls,
+                "executed": self.counters["executed"],
+                "coalesced": self.counters["coalesced"],
+                "reused": self.counters["reused"],
+                "saved_rate": saved / calls if calls else 0.0,
+                "in_flight": len(self.calls),
+                "results": len(self.results),
+            }
@@ -2,202 +2,162 @@ import torch
 from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
 import soundfile as sf
 import io, base64
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+import json
+import numpy as np
 import torchaudio
 from flask_cors import CORS
 
-import difflib
-
-RUSSIAN_NUMBERS = {
-    "ноль": 0,
-    "один": 1,
-    "два": 2,
-    "три": 3,
-    "четыре": 4,
-    "пять": 5,
-    "шесть": 6,
-    "семь": 7,
-    "восемь": 8,
-    "девять": 9,
-    "десять": 10,
-    "одиннадцать": 11,
-    "двенадцать": 12,
-    "тринадцать": 13,
-    "четырнадцать": 14,
-    "пятнадцать": 15,
-    "шестнадцать": 16,
-    "семнадцать": 17,
-    "восемнадцать": 18,
-    "девятнадцать": 19,
-    "двадцать": 20,
-}
-
-# Добавляем числа от 21 до 99
-for i in range(21, 100):
-    tens = i // 10
-    ones = i % 10
-    tens_word = ""
-    ones_word = ""
-
-    if tens == 2:
-        tens_word = "двадцать"
-    elif tens == 3:
-        tens_word = "тридцать"
-    elif tens == 4:
-        tens_word = "сорок"
-    elif tens == 5:
-        tens_word = "пятьдесят"
-    elif tens == 6:
-        tens_word = "шестьдесят"
-    elif tens == 7:
-        tens_word = "семьдесят"
-    elif tens == 8:
-        tens_word = "восемьдесят"
-    elif tens == 9:
-        tens_word = "девяносто"
-
-    if ones == 1:
-        ones_word = "один"
-    elif ones == 2:
-        ones_word = "два"
-    elif ones == 3:
-        ones_word = "три"
-    elif ones == 4:
-        ones_word = "четыре"
-    elif ones == 5:
-        ones_word = "пять"
-    elif ones == 6:
-        ones_word = "шесть"
-    elif ones == 7:
-        ones_word = "семь"
-    elif ones == 8:
-        ones_word = "восемь"
-    elif ones == 9:
-        ones_word = "девять"
-
-    word = f"{tens_word} {ones_word}"
-    RUSSIAN_NUMBERS[word.strip()] = i
+import logging
+import math
+import os
+
+from audio_preprocessing import get_resampler, prepare_waveform
+from model_registry import BackgroundLoader, ModelRegistry, stt_model_name
+from number_normalizer import replace_numbers_with_digits
+from metrics import REGISTRY, instrument, stage
+from stt_backends import create_backend
+from vad import VoiceActivityDetector
 
 app = Flask(__name__)
 CORS(app)
+instrument(app, "stt")
+logger = logging.getLogger("stt")
 
 def decode_base64_to_ogg_file(base64_data):
     return io.BytesIO(base64.b64decode(base64_data))
 
 def load_audio(wav_audio):
     waveform, sample_rate = torchaudio.load(wav_audio, format="wav")
-    if waveform.ndim == 2:  # Если волновая форма имеет две размерности, уберите размерность канала, если каналов больше одного
-        waveform = waveform.mean(axis=0, keepdim=True)
-    else:
-        waveform = torch.unsqueeze(waveform, 0)
-    return waveform, sample_rate
+    # Сводим каналы в моно, результат всегда [1, N]
+    return prepare_waveform(waveform, sample_rate, sample_rate, normalize=False), sample_rate
 
 class SpeechToText:
-    def __init__(self, model_name="jonatasgrosman/wav2vec2-large-xlsr-53-russian", device="cpu"):
+    def __init__(self, model_name="jonatasgrosman/wav2vec2-large-xlsr-53-russian", device="cpu", backend="eager",
+                 registry=None, report=lambda stage: None):
         self.device = torch.device(device)
-        self.processor = Wav2Vec2Processor.from_pretrained(model_name)
-        self.model = Wav2Vec2ForCTC.from_pretrained(model_name).to(self.device)
-
+        # Если модель есть в локальном реестре - грузим оттуда (safetensors, без сети)
+        source, revision = model_name, None
+        if registry is not None and registry.has(stt_model_name(model_name)):
+            report("verifying checksums")
+            source = registry.resolve(stt_model_name(model_name))
+            revision = registry.checksum(stt_model_name(model_name))
+        report("loading processor")
+        self.processor = Wav2Vec2Processor.from_pretrained(source)
+        report("loading model")
+        model = Wav2Vec2ForCTC.from_pretrained(source).to(self.device)
+        report(f"building {backend} backend")
+        # Ревизия нужна, чтобы кэш графов TorchScript/ONNX не пережил обновление модели
+        revision = revision or getattr(model.config, "_commit_hash", None)
+        # Ссылка на исходную fp32-модель не сохраняется: бэкенд держит только то, что ему нужно
+        # (onnx - лишь сессию), иначе в RSS каждого бэкенда сидела бы ещё и fp32-модель
+        self.backend = create_backend(backend, model, model_name, revision)
+        del model
+        self.normalize = self.processor.feature_extractor.do_normalize
+
+    def prepare(self, waveform, sample_rate=16000):
+        return prepare_waveform(waveform, sample_rate, normalize=self.normalize, device=self.device)
+
+    @torch.inference_mode()
     def transcribe(self, waveform, sample_rate):
-        if sample_rate != 16000:
-            waveform = self.resample_audio(waveform, sample_rate, 16000)
-            sample_rate = 16000
-
-        input_values = self.processor(waveform, sampling_rate=sample_rate, return_tensors="pt").input_values.squeeze(1).to(self.device)
-        logits = self.model(input_values).logits
-        predicted_ids = torch.argmax(logits, dim=-1)
-        transcription = self.processor.decode(predicted_ids[0])
+        with stage("resample"):
+            input_values = self.prepare(waveform, sample_rate)
+        with stage("forward"):
+            logits = self.backend(input_values)
+        with stage("ctc_decode"):
+            predicted_ids = torch.argmax(logits, dim=-1)
+            transcription = self.processor.decode(predicted_ids[0])
 
         return transcription
 
+    @torch.inference_mode()
+    def transcribe_batch(self, waveforms):
+        """
+        Распознаёт сразу несколько записей (каждая - [1, N] при 16 кГц) за один
+        прогон модели. Записи дополняются нулями до общей длины, маска внимания
+        не даёт паддингу влиять на результат.
+        """
+        with stage("resample"):
+            prepared = [self.prepare(waveform)[0] for waveform in waveforms]
+        max_length = max(waveform.numel() for waveform in prepared)
+        input_values = torch.zeros(len(prepared), max_length, device=self.device)
+        attention_mask = torch.zeros(len(prepared), max_length, dtype=torch.long, device=self.device)
+        for i, waveform in enumerate(prepared):
+            input_values[i, :waveform.numel()] = waveform
+            attention_mask[i, :waveform.numel()] = 1
+
+        with stage("forward"):
+            logits = self.backend(input_values, attention_mask=attention_mask)
+        with stage("ctc_decode"):
+            predicted_ids = torch.argmax(logits, dim=-1)
+            return self.processor.batch_decode(predicted_ids)
+
+    @torch.inference_mode()
+    def predict_ids(self, waveform):
+        """Возвращает CTC-метки по кадрам (без склейки) для записи [1, N] при 16 кГц."""
+        with stage("resample"):
+            input_values = self.prepare(waveform)
+        with stage("forward"):
+            logits = self.backend(input_values)
+        return torch.argmax(logits, dim=-1)[0]
+
     def resample_audio(self, waveform, input_sample_rate, output_sample_rate):
-        waveform = waveform.to(self.device)  # Преобразование в torch.Tensor
-        resampler = torchaudio.transforms.Resample(input_sample_rate, output_sample_rate)
-        return resampler(waveform)
-
-
-stt = SpeechToText()
-
-import ffmpeg
-
-def opus_to_wav(opus_audio):
-    with open("input_audio.opus", "wb") as input_file:
-        input_file.write(opus_audio)
-
-    process = (
-        ffmpeg
-        .input("input_audio.opus")
-        .output("output_audio.wav")
-        .overwrite_output()
-        .run()
-    )
-
-    with open("output_audio.wav", "rb") as output_file:
-        wav_audio = io.BytesIO(output_file.read())
-
-    return wav_audio
-
-def post_process_numbers(text):
-    words = text.split()
-    result = []
-    i = 0
-
-    while i < len(words):
-        word = words[i]
-
-        if word.isdigit():
-            number = int(word)
-            i += 1
-            while i < len(words) and words[i].isdigit():
-                number += int(words[i])
-                i += 1
-            result.append(str(number))
-        else:
-            result.append(word)
-            i += 1
-
-    return " ".join(result)
-
-def contains_all_words(phrase, match):
-    phrase_words = set(phrase.split())
-    match_words = set(match.split())
-    return match_words.issubset(phrase_words)
-
-def is_number_word(word):
-    return word in RUSSIAN_NUMBERS
-
-def replace_numbers_with_digits(text):
-    words = text.split()
-    result = []
-    i = 0
-
-    while i < len(words):
-        word = words[i]
-        matches = difflib.get_close_matches(word, RUSSIAN_NUMBERS.keys(), n=1, cutoff=0.75)
-        if matches and is_number_word(matches[0]):
-            num_word = matches[0]
-            if contains_all_words(" ".join(words[i:i+num_word.count(" ")+1]), num_word):
-                result.append(str(RUSSIAN_NUMBERS[num_word]))
-                i += num_word.count(" ") + 1
-            else:
-                result.append(word)
-                i += 1
-        else:
-            result.append(word)
-            i += 1
-
-    return post_process_numbers(" ".join(result))
-
-text = "остаромисборку задача задача номер сорок два"
-print(replace_numbers_with_digits(text))
-
-
-#text = "останови сбурку задачи задача номер срогдва"
-#result = replace_numbers_with_digits(text)
-#print(result)  # "останови сбурку задачи задача номер 42"
+        resampler = get_resampler(input_sample_rate, output_sample_rate, self.device)
+        return resampler(waveform.to(self.device))
+
+
+model_registry = ModelRegistry()
+# Модель грузится в фоне, сервис сразу отвечает на /ready
+stt_loader = BackgroundLoader("stt", lambda report: SpeechToText(backend=os.environ.get("STT_BACKEND", "eager"),
+                                                                 registry=model_registry,
+                                                                 report=report))
+stt_loader.start(background=os.environ.get("STT_LOAD_IN_BACKGROUND", "1") == "1")
+
+from batching import BatchScheduler
+from streaming_stt import StreamingTranscriber
+
+stt_batcher = BatchScheduler(lambda waveforms: stt_loader.get().transcribe_batch(waveforms),
+                             max_batch_size=int(os.environ.get("STT_MAX_BATCH_SIZE", 8)),
+                             max_wait_ms=float(os.environ.get("STT_MAX_WAIT_MS", 20)))
+REGISTRY.register_stats("stt_batch", stt_batcher.stats)
+
+from audio_decoder import AudioDecoder, UnsupportedAudioFormat
+
+audio_decoder = AudioDecoder()
+
+# Тишина по краям и длинные паузы не проходят через модель; STT_VAD=0 отключает
+vad = VoiceActivityDetector.from_env() if os.environ.get("STT_VAD", "1") == "1" else None
+AUDIO_SECONDS = REGISTRY.counter("stt_audio_seconds_total", "Seconds of audio received (input) and sent to the model (speech)")
+
+def transcribe_waveform(waveform):
+    """Распознаёт запись [1, N] 16 кГц по частям с речью; None, если речи нет."""
+    with stage("vad"):
+        parts = vad.split(waveform) if vad is not None else [waveform]
+    AUDIO_SECONDS.inc(waveform.shape[-1] / 16000, kind="input")
+    AUDIO_SECONDS.inc(sum(part.shape[-1] for part in parts) / 16000, kind="speech")
+    if not parts:
+        return None
+    # Части уходят в батчер вместе и распознаются за один прогон модели
+    futures = [stt_batcher.submit(part) for part in parts]
+    return " ".join(future.result().strip() for future in futures).strip()
+
+def after_fork():
+    # Вызывается в каждом воркере serve.py после fork
+    stt_batcher.after_fork()
+    audio_decoder.after_fork()
+
+def not_ready():
+    return jsonify(stt_loader.status()), 503
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    return jsonify(stt_loader.status()), 200 if stt_loader.ready else 503
 
 @app.route('/transcribe', methods=['POST'])
 def transcribe_audio():
+    if not stt_loader.ready:
+        return not_ready()
+
     data = request.get_json()
     base64_audio = data.get('audio')
 
@@ -205,15 +165,81 @@ def transcribe_audio():
         return jsonify({'error': 'No audio data provided'}), 400
 
     opus_audio = base64.b64decode(base64_audio)
-    wav_audio = opus_to_wav(opus_audio)
-
-    waveform, sample_rate = load_audio(wav_audio)
-
-    transcription = stt.transcribe(waveform, sample_rate)
-
-    print(transcription)
-
-    return jsonify({'transcription': replace_numbers_with_digits(transcription)}), 200
-
-
-app.run(port=5002)
+    try:
+        with stage("decode"):
+            waveform, sample_rate = audio_decoder.decode(opus_audio)
+    except UnsupportedAudioFormat as e:
+        return jsonify({'error': f'Unsupported audio: {e}'}), 415
+
+    transcription = transcribe_waveform(waveform)
+    if transcription is None:
+        return jsonify({'error': 'No speech detected', 'transcription': ''}), 422
+
+    logger.debug("transcription: %s", transcription)
+
+    with stage("number_normalization"):
+        transcription = replace_numbers_with_digits(transcription)
+    return jsonify({'transcription': transcription}), 200
+
+PCM_FORMATS = {"s16le": (np.int16, 1 / 32768.0), "f32le": (np.float32, 1.0)}
+# Границы окна потокового распознавания (секунды): меньше - теряется контекст, больше - растёт задержка и память
+STREAM_WINDOW_RANGE = (1.0, 30.0)
+
+@app.route('/transcribe_stream', methods=['POST'])
+def transcribe_stream():
+    """
+    Потоковое распознавание длинных записей.
+
+    Тело запроса - сырой PCM моно 16 кГц (?format=s16le|f32le), лучше всего
+    chunked-передачей. В ответ построчно (NDJSON) приходят распознанные слова
+    по мере готовности окон, последней строкой - {"final": true, ...}.
+    Окно (?window) приводится к 1-30 с, перекрытие (?overlap) - к 0 ... окно/2.
+    """
+    if not stt_loader.ready:
+        return not_ready()
+
+    pcm_format = request.args.get('format', 's16le')
+    if pcm_format not in PCM_FORMATS:
+        return jsonify({'error': f'Unsupported format {pcm_format}'}), 400
+    dtype, scale = PCM_FORMATS[pcm_format]
+    sample_size = np.dtype(dtype).itemsize
+    try:
+        window_s = float(request.args.get('window', 8.0))
+        overlap_s = float(request.args.get('overlap', 1.0))
+    except ValueError:
+        window_s = overlap_s = math.nan
+    if not (math.isfinite(window_s) and math.isfinite(overlap_s)):
+        return jsonify({'error': 'window and overlap must be numbers of seconds'}), 400
+    window_s = min(max(window_s, STREAM_WINDOW_RANGE[0]), STREAM_WINDOW_RANGE[1])
+    overlap_s = min(max(overlap_s, 0.0), window_s / 2)
+    # Сессия создаётся до ответа: ошибка в параметрах - это 400, а не оборванный поток
+    try:
+        session = StreamingTranscriber(stt_loader.get(), window_s=window_s, overlap_s=overlap_s)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        leftover = b""
+        while True:
+            chunk = request.stream.read(64 * 1024)
+            if not chunk:
+                break
+            chunk = leftover + chunk
+            usable = len(chunk) - len(chunk) % sample_size
+            leftover = chunk[usable:]
+            samples = torch.from_numpy(np.frombuffer(chunk[:usable], dtype=dtype).astype(np.float32) * scale)
+            text = session.feed(samples)
+            if text:
+                yield json.dumps({'transcription': replace_numbers_with_digits(text)}, ensure_ascii=False) + "\n"
+        text = session.finish()
+        yield json.dumps({'transcription': replace_numbers_with_digits(text), 'final': True}, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/batch_stats', methods=['GET'])
+def batch_stats():
+    return jsonify(stt_batcher.stats()), 200
+
+
+if __name__ == '__main__':
+    app.run(port=5002, threaded=True)
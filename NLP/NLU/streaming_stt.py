@@ -0,0 +1,85 @@
+import torch
+
+SAMPLE_RATE = 16000
+# Шаг кадра у wav2vec2: свёрточный энкодер уменьшает частоту в 320 раз (20 мс)
+SAMPLES_PER_FRAME = 320
+
+
+class StreamingTranscriber:
+    """
+    Потоковое распознавание одной сессии.
+
+    Аудио (16 кГц моно) поступает кусками через feed(). Как только накоплено
+    окно window_s секунд, оно прогоняется через модель, а следующее окно
+    начинается с перекрытием overlap_s. На стыке окон берётся первая половина
+    перекрытия из предыдущего окна и вторая половина из следующего, после чего
+    CTC-склейка повторов продолжается через границу окна.
+
+    Между вызовами хранится не больше одного окна аудио, последний CTC-символ
+    и недоговорённое слово, поэтому память не зависит от длины записи.
+    """
+
+    def __init__(self, stt, window_s=8.0, overlap_s=1.0):
+        self.stt = stt
+        self.window = int(window_s * SAMPLE_RATE)
+        self.overlap = int(overlap_s * SAMPLE_RATE)
+        if not 0 <= self.overlap < self.window:
+            raise ValueError("overlap must be shorter than the window")
+        self.buffer = torch.zeros(0)
+        self.first_window = True
+        self.last_id = None
+        self.pending_word = ""
+
+        tokenizer = stt.processor.tokenizer
+        self.blank_id = tokenizer.pad_token_id
+        self.special_ids = set(tokenizer.all_special_ids)
+        self.vocab = tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))
+        self.word_delimiter = tokenizer.word_delimiter_token
+
+    def feed(self, samples):
+        """Добавляет кусок аудио, возвращает распознанные целиком слова (или "")."""
+        self.buffer = torch.cat([self.buffer, samples.reshape(-1).float()])
+        text = ""
+        while self.buffer.numel() >= self.window:
+            text += self._process(self.buffer[:self.window], final=False)
+            self.buffer = self.buffer[self.window - self.overlap:].clone()
+        return self._complete_words(text)
+
+    def finish(self):
+        """Дораспознаёт остаток буфера и возвращает последние слова сессии."""
+        text = ""
+        if self.buffer.numel() >= 2 * SAMPLES_PER_FRAME:
+            text = self._process(self.buffer, final=True)
+        self.buffer = torch.zeros(0)
+        text = self.pending_word + text
+        self.pending_word = ""
+        return " ".join(text.split())
+
+    def _process(self, window, final):
+        ids = self.stt.predict_ids(window.unsqueeze(0))
+        frames = ids.numel()
+        half_overlap = self.overlap // 2 // SAMPLES_PER_FRAME
+
+        start = 0 if self.first_window else half_overlap
+        end = frames if final else max(start, frames - half_overlap)
+        self.first_window = False
+        return self._ctc_collapse(ids[start:end].tolist())
+
+    def _ctc_collapse(self, ids):
+        chars = []
+        for token_id in ids:
+            if token_id == self.last_id:
+                continue
+            self.last_id = token_id
+            if token_id == self.blank_id or token_id in self.special_ids:
+                continue
+            token = self.vocab[token_id]
+            chars.append(" " if token == self.word_delimiter else token)
+        return "".join(chars)
+
+    def _complete_words(self, text):
+        # Отдаём только законченные слова - хвост может продолжиться в следующем окне
+        text = self.pending_word + text
+        head, sep, tail = text.rpartition(" ")
+        self.pending_word = tail
+        return " ".join(head.split()) if sep else ""
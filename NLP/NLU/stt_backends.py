@@ -0,0 +1,143 @@
+import io
+import os
+
+import torch
+
+BACKEND_CACHE_DIR = os.environ.get("STT_BACKEND_CACHE", "stt_cache")
+
+
+class EagerBackend:
+    """Исходный вариант: fp32-модель в eager-режиме PyTorch."""
+
+    name = "eager"
+
+    def __init__(self, model):
+        self.model = model.eval()
+
+    def __call__(self, input_values, attention_mask=None):
+        with torch.inference_mode():
+            return self.model(input_values, attention_mask=attention_mask).logits
+
+
+class QuantizedBackend(EagerBackend):
+    """Линейные слои динамически квантованы в int8, остальное - fp32."""
+
+    name = "int8"
+
+    def __init__(self, model):
+        # inplace: fp32-веса линейных слоёв заменяются, а не остаются в памяти рядом с квантованными
+        quantized = torch.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8,
+                                                        inplace=True)
+        super().__init__(quantized)
+
+
+class _LogitsOnly(torch.nn.Module):
+    # Трассировке и экспорту нужен модуль, возвращающий тензор, а не ModelOutput
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_values, attention_mask):
+        return self.model(input_values, attention_mask=attention_mask).logits
+
+
+def _example_inputs(seconds=2):
+    input_values = torch.zeros(1, 16000 * seconds)
+    return input_values, torch.ones_like(input_values, dtype=torch.long)
+
+
+def _cache_path(cache_dir, model_name, revision, suffix):
+    """
+    Файл графа в кэше; в имени - ревизия модели (контрольная сумма из реестра
+    или commit hash HF), чтобы после обновления модели не взять старый граф.
+    Без известной ревизии граф на диске не кэшируется.
+    """
+    if not revision:
+        return None
+    return os.path.join(cache_dir, f"{model_name.replace('/', '__')}-{revision[:16]}{suffix}")
+
+
+def _full_mask(input_values, attention_mask):
+    if attention_mask is None:
+        attention_mask = torch.ones_like(input_values, dtype=torch.long)
+    return attention_mask
+
+
+class TorchScriptBackend:
+    """Модель, оттрассированная в TorchScript; граф кэшируется на диске."""
+
+    name = "torchscript"
+
+    def __init__(self, model, model_name, revision=None, cache_dir=BACKEND_CACHE_DIR):
+        path = _cache_path(cache_dir, model_name, revision, ".torchscript.pt")
+        if path and os.path.exists(path):
+            self.module = torch.jit.load(path)
+        else:
+            with torch.inference_mode():
+                self.module = torch.jit.trace(_LogitsOnly(model.eval()), _example_inputs(), check_trace=False)
+            if path:
+                os.makedirs(cache_dir, exist_ok=True)
+                self.module.save(path)
+        self.module = torch.jit.freeze(self.module.eval())
+
+    def __call__(self, input_values, attention_mask=None):
+        with torch.inference_mode():
+            return self.module(input_values, _full_mask(input_values, attention_mask))
+
+
+class OnnxBackend:
+    """Граф, экспортированный в ONNX и исполняемый через ONNX Runtime."""
+
+    name = "onnx"
+
+    def __init__(self, model, model_name, revision=None, cache_dir=BACKEND_CACHE_DIR):
+        import onnxruntime
+
+        path = _cache_path(cache_dir, model_name, revision, ".onnx")
+        graph = path
+        if path is None or not os.path.exists(path):
+            if path:
+                os.makedirs(cache_dir, exist_ok=True)
+            else:
+                graph = io.BytesIO()
+            # Экспорт трассирует модель и не работает с inference-тензорами - только no_grad
+            with torch.no_grad():
+                torch.onnx.export(_LogitsOnly(model.eval()),
+                                  _example_inputs(),
+                                  graph,
+                                  input_names=["input_values", "attention_mask"],
+                                  output_names=["logits"],
+                                  dynamic_axes={"input_values": {0: "batch", 1: "samples"},
+                                                "attention_mask": {0: "batch", 1: "samples"},
+                                                "logits": {0: "batch", 1: "frames"}},
+                                  opset_version=14)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = torch.get_num_threads()
+        if isinstance(graph, io.BytesIO):
+            graph = graph.getvalue()
+        self.session = onnxruntime.InferenceSession(graph, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, input_values, attention_mask=None):
+        attention_mask = _full_mask(input_values, attention_mask)
+        logits, = self.session.run(["logits"], {"input_values": input_values.cpu().numpy(),
+                                                "attention_mask": attention_mask.cpu().numpy()})
+        return torch.from_numpy(logits)
+
+
+BACKENDS = {
+    "eager": EagerBackend,
+    "int8": QuantizedBackend,
+    "torchscript": TorchScriptBackend,
+    "onnx": OnnxBackend,
+}
+
+
+def create_backend(name, model, model_name, revision=None):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT backend {name!r}, expected one of: {', '.join(BACKENDS)}")
+    backend_cls = BACKENDS[name]
+    if backend_cls in (TorchScriptBackend, OnnxBackend):
+        return backend_cls(model, model_name, revision)
+    return backend_cls(model)
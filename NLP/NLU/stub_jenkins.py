@@ -0,0 +1,327 @@
+"""
+Минимальный HTTP-сервер, отвечающий как Jenkins на запросы, которые делает
+NLU-сервис. Используется в бенчмарках и тестах вместо настоящего Jenkins.
+
+Каждый ответ задерживается на latency секунд, чтобы имитировать сеть и
+нагрузку на мастер; счётчик запросов по путям доступен в server.stats,
+объём тел ответов - в server.bytes_sent.
+
+О запуске, завершении и остановке сборок заглушка сообщает как плагин
+Notification: событие передаётся каждому обработчику из webhooks (для
+настоящего вебхука - notify_url(url)).
+
+    python stub_jenkins.py --jobs 50 --builds 100 --latency 0.02 --port 8080
+    python stub_jenkins.py --notify http://localhost:5000/jenkins/notify --build-every 5
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+VERSION = "2.401.1"
+
+
+def parse_tree(tree):
+    """Разбирает tree=a,b[c,d]{0,5} в {"a": None, "b": ({"c": None, "d": None}, (0, 5))}."""
+    fields, i = {}, 0
+
+    def parse(i):
+        result = {}
+        while i < len(tree):
+            match = re.match(r"[\w]+", tree[i:])
+            name = match.group()
+            i += len(name)
+            sub, rng = None, None
+            if i < len(tree) and tree[i] == "[":
+                sub, i = parse(i + 1)
+            if i < len(tree) and tree[i] == "{":
+                end = tree.index("}", i)
+                bounds = tree[i + 1:end].split(",")
+                rng = (int(bounds[0] or 0), int(bounds[1]) if len(bounds) > 1 and bounds[1] else None)
+                i = end + 1
+            result[name] = (sub, rng) if sub is not None or rng is not None else None
+            if i < len(tree) and tree[i] == ",":
+                i += 1
+            elif i < len(tree) and tree[i] == "]":
+                return result, i + 1
+        return result, i
+
+    fields, _ = parse(i)
+    return fields
+
+
+def apply_tree(data, fields):
+    if fields is None:
+        return data
+    if isinstance(data, list):
+        return [apply_tree(item, fields) for item in data]
+    result = {}
+    for name, spec in fields.items():
+        if name not in data:
+            continue
+        value = data[name]
+        if spec is not None:
+            sub, rng = spec
+            if rng is not None and isinstance(value, list):
+                value = value[rng[0]:rng[1]]
+            if sub is not None and value is not None:
+                value = apply_tree(value, sub)
+        result[name] = value
+    return result
+
+
+class StubJenkins:
+    def __init__(self, jobs=10, builds=20, latency=0.0, console_lines=200):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.bytes_sent = 0
+        self.url = None
+        self.jobs = {}
+        self.console_lines = console_lines
+        self.webhooks = []
+        # Если задан, crumbIssuer выдаёт его, а POST без него получает 403 (как Jenkins с защитой от CSRF)
+        self.crumb = None
+        for j in range(jobs):
+            self.add_job(f"job_{j}", builds)
+
+    def add_job(self, name, builds=0):
+        self.jobs[name] = {"name": name, "builds": {}, "description": f"Stub job {name}", "parameters": []}
+        for number in range(1, builds + 1):
+            self.add_build(name, number, result="SUCCESS" if number % 5 else "FAILURE", building=False)
+
+    def add_build(self, name, number, result=None, building=True, duration=1000):
+        self.jobs[name]["builds"][number] = {
+            "number": number,
+            "result": result,
+            "building": building,
+            "timestamp": int(time.time() * 1000),
+            "duration": duration,
+            "console": "".join(f"[{name} #{number}] step {i}: ok\n" for i in range(self.console_lines)),
+        }
+        self.emit(name, number, "STARTED" if building else "FINALIZED")
+
+    def finish_build(self, name, number, result="SUCCESS"):
+        build = self.jobs[name]["builds"][number]
+        build["building"] = False
+        build["result"] = result
+        self.emit(name, number, "COMPLETED")
+        self.emit(name, number, "FINALIZED")
+
+    def emit(self, name, number, phase):
+        if not self.webhooks:
+            return
+        build = self.jobs[name]["builds"][number]
+        event = {"name": name, "url": f"job/{name}/",
+                 "build": {"full_url": self.build_url(name, number), "number": number, "phase": phase,
+                           "url": f"job/{name}/{number}/"}}
+        if phase != "STARTED":
+            event["build"]["status"] = build["result"]
+        for webhook in self.webhooks:
+            webhook(event)
+
+    def job_url(self, name):
+        return f"{self.url}/job/{name}/"
+
+    def build_url(self, name, number):
+        return f"{self.url}/job/{name}/{number}/"
+
+    def server_info(self, last_builds=False):
+        # Как и Jenkins, последние сборки задач отдаются только по явному запросу в tree
+        jobs = [{"name": name, "url": self.job_url(name), "color": "blue"} for name in self.jobs]
+        if last_builds:
+            for job in jobs:
+                builds = self.jobs[job["name"]]["builds"]
+                job["lastBuild"] = self.build_info(job["name"], max(builds)) if builds else None
+        return {"mode": "NORMAL", "numExecutors": 2, "quietingDown": False, "jobs": jobs}
+
+    def build_info(self, name, number):
+        build = self.jobs[name]["builds"][number]
+        return {"number": number, "result": build["result"], "building": build["building"],
+                "timestamp": build["timestamp"], "duration": build["duration"],
+                "url": self.build_url(name, number)}
+
+    def job_info(self, name):
+        job = self.jobs[name]
+        numbers = sorted(job["builds"], reverse=True)
+        summary = lambda number: {"number": number, "url": self.build_url(name, number)} if number else None
+        completed = [n for n in numbers if not job["builds"][n]["building"]]
+        return {
+            "name": name,
+            "description": job["description"],
+            "url": self.job_url(name),
+            "buildable": True,
+            "color": "blue",
+            "concurrentBuild": False,
+            "builds": [dict(summary(n), result=job["builds"][n]["result"]) for n in numbers],
+            "firstBuild": summary(numbers[-1] if numbers else None),
+            "lastBuild": summary(numbers[0] if numbers else None),
+            "lastCompletedBuild": summary(completed[0] if completed else None),
+            "nextBuildNumber": (numbers[0] if numbers else 0) + 1,
+            "property": [{"parameterDefinitions": job["parameters"]}] if job["parameters"] else [],
+        }
+
+    def serve(self, host="127.0.0.1", port=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body=b"", content_type="application/json", headers=None):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body).encode()
+                elif isinstance(body, str):
+                    body = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-Jenkins", VERSION)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+                with stub.lock:
+                    stub.bytes_sent += len(body)
+
+            def handle_request(self, method):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                parsed = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                parts = [unquote(p) for p in parsed.path.strip("/").split("/") if p]
+                with stub.lock:
+                    stub.stats[f"{method} {stub.route_name(parts)}"] += 1
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                try:
+                    status, payload, content_type, headers = stub.route(method, parts, query, body, self.headers)
+                except KeyError:
+                    status, payload, content_type, headers = 404, {"error": "not found"}, "application/json", None
+                self.send(status, payload, content_type, headers)
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats.clear()
+            self.bytes_sent = 0
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def route_name(parts):
+        # Имена задач и номера сборок заменяются плейсхолдерами для статистики
+        name = []
+        i = 0
+        while i < len(parts):
+            if parts[i] == "job" and i + 1 < len(parts):
+                name.append("job/<name>")
+                i += 2
+            elif parts[i].isdigit():
+                name.append("<number>")
+                i += 1
+            else:
+                name.append(parts[i])
+                i += 1
+        return "/" + "/".join(name)
+
+    def route(self, method, parts, query, body, headers=None):
+        tree = parse_tree(query["tree"]) if "tree" in query else None
+        ok = lambda data: (200, apply_tree(data, tree), "application/json", None)
+
+        if method == "POST" and self.crumb is not None and (headers or {}).get("Jenkins-Crumb") != self.crumb:
+            return 403, {"error": "No valid crumb was included in the request"}, "application/json", None
+        if parts == []:
+            return 200, "<html>Dashboard</html>", "text/html; charset=utf-8", None
+        if parts == ["api", "json"]:
+            return ok(self.server_info(last_builds="lastBuild" in query.get("tree", "")))
+        if parts == ["me", "api", "json"]:
+            return ok({"fullName": "admin", "id": "admin"})
+        if parts[:1] == ["crumbIssuer"]:
+            if self.crumb is None:
+                raise KeyError(parts)
+            return ok({"crumbRequestField": "Jenkins-Crumb", "crumb": self.crumb})
+        if parts[:1] == ["job"]:
+            name = parts[1]
+            rest = parts[2:]
+            if rest == ["api", "json"]:
+                return ok(self.job_info(name))
+            number = int(rest[0])
+            build = self.jobs[name]["builds"][number]
+            action = rest[1:]
+            if action == ["api", "json"]:
+                return ok(self.build_info(name, number))
+            if action == ["consoleText"]:
+                return 200, build["console"], "text/plain; charset=utf-8", None
+            if action == ["logText", "progressiveText"]:
+                data = build["console"].encode()
+                start = int(query.get("start", 0))
+                headers = {"X-Text-Size": str(len(data))}
+                if build["building"]:
+                    headers["X-More-Data"] = "true"
+                return 200, data[start:], "text/plain; charset=utf-8", headers
+            if action == ["stop"] and method == "POST":
+                self.finish_build(name, number, "ABORTED")
+                return 200, b"", "text/plain", None
+        raise KeyError(parts)
+
+
+def notify_url(url):
+    """Обработчик для webhooks, отправляющий событие POST-запросом на url."""
+    import requests
+
+    return lambda event: requests.post(url, json=event, timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--builds", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--notify", action="append", default=[], help="webhook URL for build events")
+    parser.add_argument("--build-every", type=float, help="start a build every N seconds, finishing the previous one")
+    args = parser.parse_args()
+
+    stub = StubJenkins(jobs=args.jobs, builds=args.builds, latency=args.latency).serve(port=args.port)
+    stub.webhooks = [notify_url(url) for url in args.notify]
+    print(f"Stub Jenkins at {stub.url}")
+    try:
+        running = None
+        while True:
+            if not args.build_every:
+                time.sleep(3600)
+                continue
+            time.sleep(args.build_every)
+            if running:
+                stub.finish_build(*running, result=random.choice(["SUCCESS", "SUCCESS", "FAILURE"]))
+            name = random.choice(list(stub.jobs))
+            running = (name, max(stub.jobs[name]["builds"], default=0) + 1)
+            stub.add_build(*running)
+    except KeyboardInterrupt:
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
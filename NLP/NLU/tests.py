@@ -0,0 +1,731 @@
+import difflib
+import os
+import time
+
+import pytest
+
+from number_normalizer import RUSSIAN_NUMBERS, number_index, replace_numbers_with_digits
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("остаромисборку задача задача номер сорок два", "остаромисборку задача задача номер 42"),
+    ("останови сбурку задачи задача номер срогдва", "останови сбурку задачи задача номер срогдва"),
+    ("покажи сборку номер семнадцать", "покажи сборку номер 17"),
+    ("покажи сборку номер сорок", "покажи сборку номер 40"),
+])
+def test_replace_numbers_matches_previous_behaviour(text, expected):
+    assert replace_numbers_with_digits(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("сборка сто сорок два", "сборка 142"),
+    ("тысяча двести три", "1203"),
+    ("две тысячи двадцать три", "2023"),
+    ("стоп сборку", "стоп сборку"),
+    ("давай список сборок, если есть", "давай список сборок, если есть"),
+])
+def test_replace_numbers_grammar(text, expected):
+    assert replace_numbers_with_digits(text) == expected
+
+
+# Намеренные отличия от прежней реализации (она суммировала соседние числа и
+# не знала форм "две", "одна", "сто"); в скобках - прежний результат
+@pytest.mark.parametrize("text, expected", [
+    ("один два", "1 2"),  # "3"
+    ("сборка один два три", "сборка 1 2 3"),  # "сборка 6"
+    ("сорок два три", "42 3"),  # "45"
+    ("две сборки", "2 сборки"),  # "две сборки"
+    ("одна задача", "1 задача"),  # "одна задача"
+    ("сборка сто", "сборка 100"),  # "сборка сто"
+    ("номер сто пять", "номер 105"),  # "номер сто 5"
+    ("три тысячи", "3000"),  # "3 тысячи"
+])
+def test_replace_numbers_changed_behaviour(text, expected):
+    assert replace_numbers_with_digits(text) == expected
+
+
+@pytest.mark.parametrize("word", ["сорак", "двенацать", "пят", "восемдесят", "сборка", "задача", "срогдва"])
+def test_number_index_agrees_with_difflib(word):
+    expected = difflib.get_close_matches(word, RUSSIAN_NUMBERS.keys(), n=1, cutoff=0.75)
+    assert number_index.closest(word) == (expected[0] if expected else None)
+
+
+def test_job_catalog_matches_original_and_transliterated_names():
+    from job_catalog import JobCatalog
+
+    translit = {"deploy_prod": "деплой прод", "build_pipeline": "билд пайплайн"}
+    catalog = JobCatalog(lambda: list(translit), translit.get, ttl=60)
+    assert catalog.closest("deploy prod") == "deploy_prod"
+    assert catalog.closest("билд пайплайн") == "build_pipeline"
+    assert catalog.closest("совсем другое") is None
+
+
+def test_job_catalog_refreshes_after_ttl():
+    from job_catalog import JobCatalog
+
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return ["job_a"]
+
+    catalog = JobCatalog(fetch, str, ttl=60)
+    catalog.job_names()
+    catalog.job_names()
+    assert len(calls) == 1
+    catalog.invalidate()
+    catalog.job_names()
+    assert len(calls) == 2
+
+
+def test_job_catalog_rebuild_is_not_counted_as_transliteration():
+    from job_catalog import JobCatalog
+    from metrics import STAGE_SECONDS
+    from text_normalizer import transliterate_to_russian, transliterate_tokens
+
+    def observations(stage):
+        series = STAGE_SECONDS.series.get((("stage", stage),))
+        return sum(series[0]) if series else 0
+
+    before = observations("transliteration"), observations("job_catalog_rebuild")
+    catalog = JobCatalog(lambda: [f"deploy_{i}" for i in range(50)], transliterate_tokens, ttl=60)
+    assert catalog.closest("деплой 7") == "deploy_7"
+    assert (observations("transliteration"), observations("job_catalog_rebuild")) == (before[0], before[1] + 1)
+    assert transliterate_tokens("deploy 7") == transliterate_to_russian("deploy 7")
+    assert observations("transliteration") == before[0] + 1
+
+
+def test_jenkins_client_against_stub():
+    from jenkins import NotFoundException
+
+    from jenkins_client import JenkinsClient, fetch_builds, fetch_builds_concurrently
+    from stub_jenkins import StubJenkins
+
+    stub = StubJenkins(jobs=1, builds=30).serve()
+    try:
+        client = JenkinsClient(stub.url, username="admin", password="admin")
+        builds = fetch_builds(client, "job_0", 5)
+        assert [build["number"] for build in builds] == [30, 29, 28, 27, 26]
+        assert [build["number"] for build in fetch_builds_concurrently(client, "job_0", 5)] == [30, 29, 28, 27, 26]
+        _, version = client.get_info_and_version(tree="mode")
+        assert version == "2.401.1"
+        with pytest.raises(NotFoundException):
+            client.get_job_info("missing")
+        client.stop_build("job_0", 30)
+        assert client.get_build_info("job_0", 30)["result"] == "ABORTED"
+    finally:
+        stub.shutdown()
+
+
+def test_jenkins_client_refreshes_stale_crumb_once():
+    from jenkins_client import ForbiddenException, JenkinsClient
+    from stub_jenkins import StubJenkins
+
+    stub = StubJenkins(jobs=1, builds=5).serve()
+    stub.crumb = "first"
+    try:
+        client = JenkinsClient(stub.url, username="admin", password="admin", coalesce_ttl=60)
+        client.stop_build("job_0", 5)
+        # Jenkins перезапустился - прежний crumb больше не принимается
+        stub.crumb = "second"
+        stub.add_build("job_0", 6)
+        stub.reset_stats()
+        client.stop_build("job_0", 6)
+        assert client.get_build_info("job_0", 6)["result"] == "ABORTED"
+        assert stub.stats["GET /crumbIssuer/api/json"] == 1
+        assert stub.stats["POST /job/<name>/<number>/stop"] == 2
+
+        # Если и со свежим crumb 403, повтора больше нет
+        stub.crumb = "third"
+        client.crumb = {"Jenkins-Crumb": "stale"}
+        client.flight.forget(lambda key: True)
+        stub.add_build("job_0", 7)
+        stub.reset_stats()
+        original = stub.route
+        stub.route = lambda method, parts, query, body, headers=None: (
+            (403, {}, "application/json", None) if method == "POST" else original(method, parts, query, body, headers))
+        with pytest.raises(ForbiddenException):
+            client.stop_build("job_0", 7)
+        assert stub.stats["POST /job/<name>/<number>/stop"] == 2
+    finally:
+        stub.shutdown()
+
+
+def test_exact_match_table_uses_training_examples():
+    from nlu_cache import ExactMatchTable
+
+    table = ExactMatchTable([
+        ("Статус сервера Jenkins", "get_server_info", []),
+        ("Информация о задаче my_job", "get_job_info", [{"entity": "job_name", "value": "my_job", "start": 20, "end": 26}]),
+        ("Что там?", "get_server_info", []),
+        ("что там", "get_all_jobs", []),
+    ])
+    assert table.lookup("статус сервера jenkins!")["intent"]["name"] == "get_server_info"
+    assert table.lookup("информация о задаче my_job")["entities"][0]["value"] == "my_job"
+    assert table.lookup("что там") is None
+    assert table.lookup("статус сервера") is None
+
+
+def test_parse_cache_hits_and_invalidates_on_model_change():
+    from nlu_cache import ParseCache
+
+    calls = []
+    version = ["model-1"]
+
+    def parse(text):
+        calls.append(text)
+        return {"text": text, "intent": {"name": "get_all_jobs", "confidence": 0.9}, "entities": []}
+
+    cache = ParseCache(parse, maxsize=2, model_version=lambda: version[0])
+    cache.parse("Список задач")
+    cache.parse("список  задач.")
+    assert len(calls) == 1
+    version[0] = "model-2"
+    cache.parse("список задач")
+    assert len(calls) == 2
+    stats = cache.stats()
+    assert stats["cache_hits"] == 1 and stats["misses"] == 2
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Сервер Jenkins версии 2.401.1 работает в режиме NORMAL с 2 исполнителями.",
+     "Сервер Йенкинс версии два . четыреста один . один работает в режиме НОРМАЛ с два исполнителями ."),
+    ("Job 'deploy_prod': http://localhost:8080/job/x/42/",
+     "Йоб деплоы_прод : хттп : / / лоцалхост : восемь тысяч восемьдесят / йоб / x / сорок два /"),
+])
+def test_transliterate_to_russian_matches_previous_output(text, expected):
+    from text_normalizer import iter_transliterated, transliterate_to_russian
+
+    assert transliterate_to_russian(text) == expected
+    chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+    assert " ".join(iter_transliterated(chunks)) == expected
+
+
+def test_tts_cache_key_of_nlu_reply_matches_warmed_phrase():
+    from text_normalizer import transliterate_to_russian
+    from tts_cache import cache_key
+
+    # Ответ app.py на параметры задачи приходит в TTS как for_tts, в SSML-обёртке prepare_text
+    phrase = "Для этой задачи не определены параметры."
+    for_tts = transliterate_to_russian(phrase)
+    assert for_tts == "Для этой задачи не определены параметры ."
+
+    def key(text):
+        return cache_key(f"<speak><s>{text}</s></speak>", "eugene", 48000, "opus")
+
+    assert key(for_tts) == key(phrase)
+    assert key(transliterate_to_russian("Простите, не понял ваш запрос")) == key("Простите, не понял ваш запрос")
+    assert key(for_tts) != key("Параметр с таким именем не найден.")
+
+
+def test_audio_cache_memory_lru_is_bounded_by_bytes():
+    from tts_cache import AudioCache
+
+    cache = AudioCache(max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    # Вытесняется давно не читавшаяся запись, записи больше max_bytes не хранятся
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa" and cache.get("c") == b"cccc"
+    cache.put("d", b"d" * 11)
+    assert cache.get("d") is None
+    assert cache.stats()["bytes"] == 8 and cache.stats()["evictions"] == 1
+
+
+def test_audio_cache_disk_tier_survives_restart_and_is_capped(tmp_path):
+    from tts_cache import AudioCache
+
+    cache = AudioCache(max_bytes=100, disk_dir=str(tmp_path), disk_max_bytes=10)
+    cache.put("aa1", b"1111")
+    cache.put("bb2", b"2222")
+    os.utime(tmp_path / "aa" / "aa1", (1, 1))
+    os.utime(tmp_path / "bb" / "bb2", (2, 2))
+
+    restarted = AudioCache(max_bytes=100, disk_dir=str(tmp_path), disk_max_bytes=10)
+    assert restarted.stats()["disk_bytes"] == 8
+    assert restarted.get("aa1") == b"1111"
+    assert restarted.stats()["disk_hits"] == 1
+    # Чтение обновляет mtime, поэтому при переполнении удаляется bb2
+    restarted.put("cc3", b"3333")
+    assert not (tmp_path / "bb" / "bb2").exists()
+    assert (tmp_path / "aa" / "aa1").exists() and (tmp_path / "cc" / "cc3").exists()
+    assert restarted.stats()["disk_bytes"] == 8 and restarted.stats()["disk_evictions"] == 1
+
+
+def test_audio_cache_survives_disk_errors(tmp_path):
+    from tts_cache import AudioCache
+
+    cache = AudioCache(max_bytes=100, disk_dir=str(tmp_path))
+    (tmp_path / "dd").write_bytes(b"")  # вместо каталога записи - файл
+    assert cache.get_or_create("dd4", lambda: b"audio") == b"audio"
+    assert cache.get("dd4") == b"audio"
+    assert os.listdir(tmp_path) == ["dd"]
+
+
+def test_limit_for_tts_keeps_errors_and_tail():
+    from text_normalizer import TRUNCATED_NOTE, limit_for_tts
+
+    log = "\n".join([f"line {i}" for i in range(100)] + ["[ERROR] boom"] + [f"tail {i}" for i in range(100)])
+    assert limit_for_tts("short", 100) == "short"
+    summary = limit_for_tts(log, 200, tail_lines=3)
+    assert summary == f"{TRUNCATED_NOTE}\n[ERROR] boom\ntail 97\ntail 98\ntail 99"
+    assert len(limit_for_tts(log, 200, mode="tail")) <= 200 + len(TRUNCATED_NOTE) + 1
+
+
+def test_console_reader_tail_fetches_only_new_bytes():
+    from console_reader import ConsoleReader
+    from jenkins_client import JenkinsClient
+    from stub_jenkins import StubJenkins
+
+    stub = StubJenkins(jobs=1, builds=0, console_lines=0).serve()
+    try:
+        stub.add_build("job_0", 1, building=True)
+        build = stub.jobs["job_0"]["builds"][1]
+        build["console"] = "Started\nстрока 1\nстро"
+        reader = ConsoleReader(JenkinsClient(stub.url), max_lines=10)
+        assert reader.tail("job_0", 1, 2) == ["строка 1", "стро"]
+
+        stub.reset_stats()
+        build["console"] += "ка 2\nFinished: SUCCESS\n"
+        build["building"] = False
+        assert reader.tail("job_0", 1, 3) == ["строка 1", "строка 2", "Finished: SUCCESS"]
+        assert reader.tail("job_0", 1, 1) == ["Finished: SUCCESS"]
+        assert stub.stats["GET /job/<name>/<number>/logText/progressiveText"] == 1
+        assert stub.bytes_sent == len("ка 2\nFinished: SUCCESS\n".encode())
+
+        assert reader.read_range("job_0", 1, 8, 22) == "строка 1"
+    finally:
+        stub.shutdown()
+
+
+def test_metrics_endpoint_and_request_id():
+    from flask import Flask
+
+    import metrics
+
+    app = Flask(__name__)
+    metrics.instrument(app, "test")
+    metrics.REGISTRY.register_stats("test_cache", lambda: {"hits": 3, "recent": [1, 2], "ratio": 0.5})
+
+    @app.route("/work")
+    def work():
+        with metrics.stage("unit_test_stage"):
+            return metrics.current_request_id()
+
+    client = app.test_client()
+    response = client.get("/work", headers={"X-Request-ID": "abc123"})
+    assert response.get_data(as_text=True) == "abc123"
+    assert response.headers["X-Request-ID"] == "abc123"
+    assert client.get("/work").headers["X-Request-ID"] != "abc123"
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'stage_duration_seconds_count{stage="unit_test_stage"} 2' in text
+    assert 'http_request_duration_seconds_count{route="/work",method="GET",status="200"} 2' in text
+    assert "test_cache_hits 3" in text and "test_cache_ratio 0.5" in text and "test_cache_recent" not in text
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork is POSIX-only")
+def test_batch_scheduler_works_after_fork():
+    from batching import BatchScheduler
+
+    scheduler = BatchScheduler(lambda items: [item * 2 for item in items], max_wait_ms=1)
+    assert scheduler(1) == 2
+    pid = os.fork()
+    if pid == 0:
+        scheduler.after_fork()
+        os._exit(0 if scheduler(21) == 42 else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_streaming_transcriber_merges_overlapping_windows():
+    torch = pytest.importorskip("torch")
+    import numpy as np
+
+    from streaming_stt import SAMPLES_PER_FRAME, StreamingTranscriber
+
+    vocab = ["<pad>", "|", "п", "р", "и", "в", "е", "т", "м", "к", "а", "д", "л"]
+
+    class FakeTokenizer:
+        pad_token_id = 0
+        all_special_ids = [0]
+        word_delimiter_token = "|"
+
+        def __len__(self):
+            return len(vocab)
+
+        def convert_ids_to_tokens(self, ids):
+            return [vocab[i] for i in ids]
+
+    class FakeModel:
+        # Номер символа записан прямо в отсчётах: кадр модели - SAMPLES_PER_FRAME одинаковых значений
+        processor = type("Processor", (), {"tokenizer": FakeTokenizer()})()
+
+        def predict_ids(self, window):
+            return window[0, ::SAMPLES_PER_FRAME].round().long()
+
+    text = "привет мир как дела"
+    ids = []
+    for char in text:
+        ids += [vocab.index("|" if char == " " else char)] * 3 + [0]
+    audio = torch.from_numpy(np.repeat(np.array(ids + [0] * 10, dtype=np.float32), SAMPLES_PER_FRAME))
+
+    session = StreamingTranscriber(FakeModel(), window_s=1.0, overlap_s=0.2)
+    parts, position = [], 0
+    for size in [5000, 17000, 300, 12000, 40000, 9000] * 3:
+        parts.append(session.feed(audio[position:position + size]))
+        position += size
+    parts.append(session.feed(audio[position:]))
+    parts.append(session.finish())
+    assert audio.numel() > 16000  # несколько окон
+    assert " ".join(part for part in parts if part) == text
+
+    with pytest.raises(ValueError):
+        StreamingTranscriber(FakeModel(), window_s=1.0, overlap_s=1.0)
+
+
+@pytest.mark.parametrize("audio_format, subtype", [("WAV", "PCM_16"), ("OGG", "VORBIS")])
+def test_audio_decoder_decodes_to_16k_mono(audio_format, subtype):
+    pytest.importorskip("torch")
+    pytest.importorskip("ffmpeg")
+    import io
+
+    import numpy as np
+    import soundfile as sf
+
+    from audio_decoder import AudioDecoder
+
+    t = np.arange(48000) / 48000
+    stereo = np.stack([0.5 * np.sin(2 * np.pi * 440 * t), 0.5 * np.sin(2 * np.pi * 220 * t)], axis=1)
+    buffer = io.BytesIO()
+    sf.write(buffer, stereo, 48000, format=audio_format, subtype=subtype)
+
+    decoder = AudioDecoder(workers=1)
+    try:
+        waveform, sample_rate = decoder.decode(buffer.getvalue())
+    finally:
+        decoder.shutdown()
+    assert sample_rate == 16000
+    assert waveform.shape[0] == 1 and abs(waveform.shape[1] - 16000) <= 160
+    assert 0.1 < waveform.abs().max().item() <= 1.0
+
+
+def test_audio_decoder_reports_unsupported_format():
+    pytest.importorskip("torch")
+    ffmpeg = pytest.importorskip("ffmpeg")
+    from unittest import mock
+
+    from audio_decoder import AudioDecoder, UnsupportedAudioFormat
+
+    decoder = AudioDecoder(workers=1)
+    error = ffmpeg.Error("ffmpeg", b"", b"pipe:0: Invalid data found when processing input\n")
+    try:
+        # libsndfile не узнаёт байты, и ffmpeg тоже: наружу - UnsupportedAudioFormat с текстом ошибки ffmpeg
+        with mock.patch.object(decoder, "_decode_with_ffmpeg", side_effect=error) as ffmpeg_decode:
+            with pytest.raises(UnsupportedAudioFormat, match="Invalid data"):
+                decoder.decode(b"definitely not audio")
+        ffmpeg_decode.assert_called_once()
+    finally:
+        decoder.shutdown()
+
+
+@pytest.mark.parametrize("codec, output_sample_rate, expected_rate", [
+    ("vorbis", None, 48000),
+    ("opus", None, 48000),
+    ("opus", 24000, 24000),
+    ("vorbis", 16000, 16000),
+])
+def test_audio_encoder_codec_sample_rate_and_content_type(codec, output_sample_rate, expected_rate):
+    torch = pytest.importorskip("torch")
+    import io
+
+    import soundfile as sf
+
+    from audio_encoder import AudioEncoder
+
+    audio = 0.5 * torch.sin(2 * torch.pi * 440 * torch.arange(48000) / 48000)
+    encoder = AudioEncoder(codec, output_sample_rate=output_sample_rate)
+    info = sf.info(io.BytesIO(encoder.encode(audio, 48000)))
+    assert (info.format, info.subtype, info.channels) == ("OGG", codec.upper(), 1)
+    assert info.samplerate == expected_rate
+    assert abs(info.frames - expected_rate) <= expected_rate // 50
+    assert encoder.content_type == f"audio/ogg; codecs={codec}"
+    # Настройки кодирования входят в ключ кэша
+    assert encoder.name != AudioEncoder("opus" if codec == "vorbis" else "vorbis").name
+
+
+def test_audio_encoder_rejects_unknown_codec_and_opus_rate():
+    pytest.importorskip("torch")
+    from audio_encoder import AudioEncoder
+
+    with pytest.raises(ValueError, match="Unknown codec"):
+        AudioEncoder("mp3")
+    with pytest.raises(ValueError, match="22050"):
+        AudioEncoder("opus", output_sample_rate=22050)
+    assert AudioEncoder("vorbis", output_sample_rate=22050).output_sample_rate == 22050
+
+
+def test_vad_trims_silence_splits_on_long_pauses_and_rejects_silence():
+    import numpy as np
+
+    from vad import VoiceActivityDetector
+
+    rate = 16000
+    rng = np.random.default_rng(0)
+    silence = lambda seconds: rng.normal(0, 0.0005, int(seconds * rate)).astype(np.float32)
+    speech = lambda seconds: (0.3 * np.sin(np.arange(int(seconds * rate)) * 2 * np.pi * 220 / rate)).astype(np.float32)
+
+    vad = VoiceActivityDetector(padding_ms=100, split_pause_ms=800)
+    clip = np.concatenate([silence(1.0), speech(0.5), silence(0.3), speech(0.5), silence(1.5), speech(0.6), silence(1.0)])
+    segments = vad.segments(clip, rate)
+    assert len(segments) == 2
+    assert abs(segments[0][0] - int(0.9 * rate)) <= 320 and abs(segments[0][1] - int(2.4 * rate)) <= 320
+    assert abs(segments[1][0] - int(3.7 * rate)) <= 320 and abs(segments[1][1] - int(4.5 * rate)) <= 320
+
+    assert vad.segments(silence(2.0), rate) == []
+    assert vad.segments(np.zeros(rate, dtype=np.float32), rate) == []
+    assert vad.segments(speech(1.0), rate) == [(0, rate)]
+
+
+def test_e2e_compare_flags_regressions_beyond_tolerance():
+    from bench_e2e import compare, parse_server_timing
+
+    stages = parse_server_timing("decode;dur=12.5, stt;dur=300.0, total;dur=400.0")
+    assert stages == {"decode": 12.5, "stt": 300.0, "total": 400.0}
+
+    def results(stt_ms, clips_per_s, rss, text):
+        return {"stages": {"stt": {"p50": stt_ms}}, "throughput": [{"concurrency": 2, "clips_per_s": clips_per_s}],
+                "peak_rss_mb": rss, "clips": {"a.ogg": {"transcription": text}}}
+
+    baseline = results(300.0, 4.0, 1000, "покажи сборку 42")
+    assert compare(baseline, results(330.0, 3.5, 1100, "покажи сборку 42"), tolerance=0.2) == []
+    problems = compare(baseline, results(400.0, 3.0, 1300, "покажи сборку 43"), tolerance=0.2)
+    assert [problem.split(":")[0] for problem in problems] == ["stage stt", "throughput x2", "peak RSS", "a.ogg"]
+
+
+def test_jenkins_state_follows_events_and_poll_diff():
+    from jenkins_client import JOB_INFO_TREE, JenkinsClient
+    from jenkins_state import JenkinsState
+    from stub_jenkins import StubJenkins
+
+    stub = StubJenkins(jobs=0).serve()
+    stub.add_job("deploy", builds=3)
+    stub.add_job("tests", builds=1)
+    state = JenkinsState(JenkinsClient(stub.url, "admin", "token"), poll_interval=0)
+    stub.webhooks.append(state.apply_event)
+    changes = []
+    state.listeners.append(lambda: changes.append(state.job_names()))
+    try:
+        assert state.job_names() == ["deploy", "tests"]
+        assert state.last_build("deploy") == {"number": 3, "building": False, "result": "SUCCESS"}
+
+        # Повторные запросы отвечаются из памяти
+        assert state.get_job_info("deploy", tree=JOB_INFO_TREE)["lastBuild"]["number"] == 3
+        assert state.get_build_info("deploy", 2)["result"] == "SUCCESS"
+        stub.reset_stats()
+        state.get_job_info("deploy", tree=JOB_INFO_TREE)
+        state.get_build_info("deploy", 2)
+        assert sum(stub.stats.values()) == 0
+
+        # Событие сбрасывает ответы по задаче, но не завершённые сборки
+        stub.add_build("deploy", 4)
+        assert state.running_builds() == [("deploy", 4)]
+        assert state.get_job_info("deploy", tree=JOB_INFO_TREE)["lastBuild"]["number"] == 4
+        assert state.get_build_info("deploy", 4)["building"]
+        state.get_build_info("deploy", 2)
+        assert sum(stub.stats.values()) == 2
+
+        stub.finish_build("deploy", 4, "FAILURE")
+        assert state.running_builds() == []
+        assert state.last_build("deploy") == {"number": 4, "building": False, "result": "FAILURE"}
+        assert state.get_build_info("deploy", 4)["result"] == "FAILURE"
+
+        # Без уведомлений изменения находит сравнение снимков
+        stub.webhooks.clear()
+        stub.add_job("release", builds=0)
+        stub.add_build("tests", 2)
+        state.sync()
+        assert changes == [["deploy", "tests", "release"]]
+        assert state.running_builds() == [("tests", 2)]
+        assert state.get_job_info("tests", tree=JOB_INFO_TREE)["lastBuild"]["number"] == 2
+        assert state.stats()["events"] == 3
+    finally:
+        stub.shutdown()
+
+
+def test_jenkins_state_starts_once_and_poller_survives_errors():
+    import threading
+    from unittest import mock
+
+    from jenkins_client import JenkinsClient
+    from jenkins_state import JenkinsState
+    from stub_jenkins import StubJenkins
+
+    stub = StubJenkins(jobs=2, builds=1, latency=0.1).serve()
+    state = JenkinsState(JenkinsClient(stub.url, "admin", "token", pool_size=16), poll_interval=0.5)
+    try:
+        barrier = threading.Barrier(8)
+
+        def first_request():
+            barrier.wait()
+            state.job_names()
+
+        threads = [threading.Thread(target=first_request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert state.stats()["polls"] == 1
+        poller = state.poller
+        state.poll_interval = 0.05
+
+        # Неожиданная ошибка снимка не останавливает опрос
+        with mock.patch.object(state.client, "get_info", side_effect=RuntimeError("boom")):
+            time.sleep(0.7)
+        assert poller.is_alive() and state.poller is poller
+        polls = state.stats()["polls"]
+        time.sleep(0.4)
+        assert state.stats()["polls"] > polls
+    finally:
+        state.stop()
+        stub.shutdown()
+
+
+def test_jenkins_state_without_mirror_always_asks_jenkins():
+    from jenkins_client import JOB_INFO_TREE, JenkinsClient
+    from jenkins_state import JenkinsState
+    from stub_jenkins import StubJenkins
+
+    stub = StubJenkins(jobs=0).serve()
+    stub.add_job("deploy", builds=2)
+    state = JenkinsState(JenkinsClient(stub.url, "admin", "token"), poll_interval=0, max_age=0)
+    try:
+        assert state.job_names() == ["deploy"]
+        stub.reset_stats()
+        state.get_job_info("deploy", tree=JOB_INFO_TREE)
+        state.get_job_info("deploy", tree=JOB_INFO_TREE)
+        state.get_build_info("deploy", 1)
+        state.get_build_info("deploy", 1)
+        assert sum(stub.stats.values()) == 4
+
+        # Новая задача видна без уведомления и без ожидания опроса
+        stub.add_job("release", builds=0)
+        assert state.job_names() == ["deploy", "release"]
+    finally:
+        stub.shutdown()
+
+
+def test_singleflight_collapses_concurrent_identical_jenkins_calls():
+    import threading
+
+    from jenkins import NotFoundException
+
+    from jenkins_client import JOB_INFO_TREE, JenkinsClient
+    from stub_jenkins import StubJenkins
+
+    stub = StubJenkins(jobs=1, builds=5, latency=0.2).serve()
+    client = JenkinsClient(stub.url, "admin", "token", pool_size=32, coalesce_ttl=0.5)
+    try:
+        def concurrently(call, callers=16):
+            barrier, results = threading.Barrier(callers), [None] * callers
+
+            def run(i):
+                barrier.wait()
+                try:
+                    results[i] = call()
+                except NotFoundException as e:
+                    results[i] = e
+
+            threads = [threading.Thread(target=run, args=(i,)) for i in range(callers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return results
+
+        results = concurrently(lambda: client.get_job_info("job_0", tree=JOB_INFO_TREE))
+        assert stub.stats["GET /job/<name>/api/json"] == 1
+        assert all(result == results[0] for result in results)
+        assert client.flight.stats()["coalesced"] == 15
+
+        # В течение coalesce_ttl ответ отдаётся без запроса, другой ресурс запрашивается отдельно
+        client.get_job_info("job_0", tree=JOB_INFO_TREE)
+        client.get_build_info("job_0", 1)
+        assert stub.stats["GET /job/<name>/api/json"] == 1
+        assert stub.stats["GET /job/<name>/<number>/api/json"] == 1
+
+        # Ошибка тоже общая, но не сохраняется
+        errors = concurrently(lambda: client.get_job_info("missing"), callers=8)
+        assert all(isinstance(error, NotFoundException) for error in errors)
+        client.stop_build("job_0", 5)
+        assert client.get_job_info("job_0", tree=JOB_INFO_TREE)["lastCompletedBuild"]["number"] == 5
+        assert stub.stats["GET /job/<name>/api/json"] == 3
+        assert client.flight.stats()["reused"] == 1
+    finally:
+        stub.shutdown()
+
+
+def test_model_registry_rehashes_by_default_and_tolerates_read_only_registry(tmp_path):
+    from model_registry import VERIFIED, ModelRegistry, ModelRegistryError
+
+    registry = ModelRegistry(str(tmp_path))
+    directory = tmp_path / "tts" / "model"
+    directory.mkdir(parents=True)
+    (directory / "model.pt").write_bytes(b"weights")
+    registry.write_manifest("tts/model")
+    registry.verify("tts/model")
+    assert not (directory / VERIFIED).exists()
+
+    # Порча с тем же размером и временем изменения
+    stat = os.stat(directory / "model.pt")
+    (directory / "model.pt").write_bytes(b"WEIGHTS")
+    os.utime(directory / "model.pt", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    with pytest.raises(ModelRegistryError):
+        registry.verify("tts/model")
+
+    # Состояние проверки записать нельзя (как на смонтированном только для чтения реестре)
+    (directory / "model.pt").write_bytes(b"weights")
+    registry.write_manifest("tts/model")
+    (directory / VERIFIED).mkdir()
+    ModelRegistry(str(tmp_path), trust_stat=True).verify("tts/model")
+
+
+def test_jenkins_client_gather_keeps_request_id():
+    from jenkins_client import JenkinsClient
+    from metrics import current_request_id, request_id_var
+
+    client = JenkinsClient("http://127.0.0.1:1/", workers=2)
+    token = request_id_var.set("req-42")
+    try:
+        assert client.gather(current_request_id, current_request_id, current_request_id) == ["req-42"] * 3
+    finally:
+        request_id_var.reset(token)
+    assert client.gather(current_request_id) == ["-"]
+
+
+def test_singleflight_does_not_store_results_started_before_forget():
+    import threading
+
+    from singleflight import SingleFlight
+
+    flight = SingleFlight(ttl=60)
+    started, release = threading.Event(), threading.Event()
+    values = iter(["before", "after"])
+
+    def fetch():
+        started.set()
+        release.wait()
+        return next(values)
+
+    leader = threading.Thread(target=lambda: flight.do("job", fetch))
+    leader.start()
+    started.wait()
+    flight.forget(lambda key: key == "job")
+    release.set()
+    leader.join()
+
+    assert flight.do("job", fetch) == "after"
+    assert flight.do("job", fetch) == "after"
+    assert flight.stats()["executed"] == 2
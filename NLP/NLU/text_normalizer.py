@@ -0,0 +1,110 @@
+"""
+Подготовка текста ответа для TTS: латиница транслитерируется, числа
+записываются словами.
+
+Текст разбивается на токены одним скомпилированным регулярным выражением,
+а преобразования токенов кэшируются: в ответах и логах Jenkins одни и те же
+слова и числа повторяются постоянно. Большие тексты (вывод консоли)
+обрабатываются по частям, а limit_for_tts ограничивает то, что уходит в TTS.
+"""
+import os
+import re
+from functools import lru_cache
+
+from num2words import num2words
+from transliterate import translit
+
+from metrics import stage
+
+# Разделители . : , / - отдельные токены, всё остальное делится по пробелам
+TOKEN_PATTERN = re.compile(r"[.:,/]|[^\s.:,/]+")
+TOKEN_CACHE_SIZE = int(os.environ.get("TTS_TOKEN_CACHE_SIZE", 65536))
+
+# Строки консоли, которые стоит озвучить в режиме summary
+NOTABLE_LINE = re.compile(r"error|exception|fail|warn|ошибк|finished:|build (success|failure)", re.IGNORECASE)
+TRUNCATED_NOTE = "Вывод сокращён."
+
+
+def number_to_russian_words(number):
+    if isinstance(number, float):
+        integer_part, fractional_part = str(number).split('.')
+        integer_part = int(integer_part)
+        fractional_part = int(fractional_part)
+
+        russian_integer = num2words(integer_part, lang='ru')
+        russian_fractional = num2words(fractional_part, lang='ru')
+
+        return f"{russian_integer} точка {russian_fractional}"
+    else:
+        return num2words(number, lang='ru')
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def convert_token(token):
+    if token.isdigit():
+        return number_to_russian_words(int(token))
+    return translit(token, 'ru')
+
+
+def transliterate_tokens(text):
+    """transliterate_to_russian без замера - для имён задач и параметров, а не текста ответа."""
+    return " ".join(map(convert_token, TOKEN_PATTERN.findall(text.replace("'", ""))))
+
+
+def transliterate_to_russian(text):
+    with stage("transliteration"):
+        return transliterate_tokens(text)
+
+
+def iter_transliterated(chunks):
+    """
+    Потоковый вариант transliterate_to_russian для больших текстов: принимает
+    части текста (строки, куски ответа) и отдаёт преобразованные части.
+    " ".join(результатов) совпадает с transliterate_to_russian("".join(chunks)).
+    """
+    tail = ""
+    for chunk in chunks:
+        text = tail + chunk
+        # Токен не может содержать пробел, поэтому резать можно по последнему пробельному символу
+        cut = max(text.rfind(" "), text.rfind("\n"), text.rfind("\t"), text.rfind("\r"))
+        if cut < 0:
+            tail = text
+            continue
+        text, tail = text[:cut], text[cut + 1:]
+        converted = transliterate_to_russian(text)
+        if converted:
+            yield converted
+    converted = transliterate_to_russian(tail)
+    if converted:
+        yield converted
+
+
+def limit_for_tts(text, max_chars, mode="summary", tail_lines=10):
+    """
+    Ограничивает текст для озвучивания max_chars символами.
+
+    mode="head" - начало текста, "tail" - конец, "summary" - строки с ошибками
+    и предупреждениями плюс последние tail_lines строк. Обрезанный текст
+    начинается с пометки TRUNCATED_NOTE.
+    """
+    if len(text) <= max_chars:
+        return text
+    if mode == "head":
+        limited = text[:max_chars].rsplit("\n", 1)[0]
+    elif mode == "tail":
+        limited = text[-max_chars:].split("\n", 1)[-1]
+    elif mode == "summary":
+        lines = text.splitlines()
+        last = max(len(lines) - tail_lines, 0)
+        keep = [line for i, line in enumerate(lines) if i >= last or NOTABLE_LINE.search(line)]
+        # Если и так слишком длинно, приоритет у последних строк
+        limited, size = [], 0
+        for line in reversed(keep):
+            size += len(line) + 1
+            if size > max_chars:
+                break
+            limited.append(line)
+        limited = "\n".join(reversed(limited))
+    else:
+        raise ValueError(f"Unknown mode {mode!r}, expected head, tail or summary")
+    return f"{TRUNCATED_NOTE}\n{limited}"
@@ -1,42 +1,219 @@
 import base64
 import io
+import json
+import logging
+import os
+import threading
 import torch
 import wave
 import numpy as np
 #import soundfile as sf
 from pydub import AudioSegment
-from flask import Flask, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
+from audio_encoder import AudioEncoder
+from metrics import REGISTRY, in_context, instrument, preview, stage
+from model_registry import BackgroundLoader, ModelRegistry, tts_model_name
+from text_normalizer import transliterate_to_russian
+from tts_cache import AudioCache, cache_key
+
+
+class VoiceSwitch:
+    """
+    Свой голос Silero хранит в самой модели: voice_path загружается в неё при
+    каждом apply_tts. Синтез одним своим голосом может идти параллельно, а
+    переключение на другой ждёт, пока закончатся синтезы предыдущим, - иначе
+    голоса смешались бы. Встроенные голоса через переключатель не проходят.
+
+    Ограничение: запросы с разными своими голосами одновременно выполняются
+    по очереди. Без отдельной копии модели на каждый голос этого не избежать.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.current = None
+        self.active = 0
+
+    @contextmanager
+    def use(self, voice):
+        with self.condition:
+            self.condition.wait_for(lambda: self.active == 0 or self.current == voice)
+            self.current = voice
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                if self.active == 0:
+                    self.condition.notify_all()
+
 
 class SileroTTS:
-    def __init__(self, language='ru', model_id='v3_1_ru', device='cpu'):
+    def __init__(self, language='ru', model_id='v3_1_ru', device='cpu', cache=None, workers=None, encoder=None,
+                 registry=None, voices_dir=None, sentence_pause_ms=300, sentence_cache=None,
+                 report=lambda stage: None):
+        self.cache = cache if cache is not None else AudioCache()
+        # Несжатый PCM предложений - в своём небольшом LRU только в памяти, чтобы не вытеснять
+        # закодированные ответы и не писать сырое аудио на диск
+        self.sentence_cache = sentence_cache if sentence_cache is not None else AudioCache(max_bytes=16 * 1024 * 1024)
+        # Без encoder используется прежний путь через pydub/ffmpeg
+        self.encoder = encoder
+        self.audio_format = encoder.name if encoder is not None else 'ogg'
+        self.content_type = encoder.content_type if encoder is not None else 'audio/ogg; codecs=vorbis'
+        # Предложения синтезируются параллельно. Каждый apply_tts и так занимает весь пул потоков
+        # torch (torch.get_num_threads() - общий на процесс), поэтому потоков синтеза немного:
+        # N предложений одновременно - это N x torch-потоков на ядрах процесса
+        self.workers = workers or 2
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='tts')
         self.language = language
         self.model_id = model_id
         self.device = torch.device(device)
 
-        torch.hub.download_url_to_file('https://raw.githubusercontent.com/snakers4/silero-models/master/models.yml',
-                                       'latest_silero_models.yml',
-                                       progress=False)
-
-        self.model_tts, self.example_text = torch.hub.load(repo_or_dir='snakers4/silero-models',
-                                     model='silero_tts',
-                                     language=language,
-                                     speaker=model_id)
+        if registry is not None and registry.has(tts_model_name(model_id)):
+            # Локальная копия torch.package из реестра - без сети
+            report("verifying checksums")
+            path = os.path.join(registry.resolve(tts_model_name(model_id)), 'model.pt')
+            report("loading model")
+            self.model_tts = torch.package.PackageImporter(path).load_pickle('tts_models', 'model')
+            self.example_text = None
+        else:
+            report("loading model from torch hub")
+            self.model_tts, self.example_text = torch.hub.load(repo_or_dir='snakers4/silero-models',
+                                         model='silero_tts',
+                                         language=language,
+                                         speaker=model_id)
         self.model_tts.to(self.device)
         self.sample_rate = 48000
-
-    def text_to_sound_base64(self, text, speaker='eugene', put_accent=True, put_yo=True):
-        print(text)
-        audio = self.model_tts.apply_tts(text=text,
-                                         speaker=speaker,
-                                         sample_rate=self.sample_rate,
-                                         #voice_path='voices/drunk_panda',
-                                         put_accent=put_accent,
-                                         put_yo=put_yo)
-        print(audio)
-        return self.create_ogg_vorbis_base64(audio, self.sample_rate)
+        # Пауза между предложениями, синтезированными по отдельности (внутри одного <speak> её ставит модель)
+        self.sentence_pause = torch.zeros(int(self.sample_rate * sentence_pause_ms / 1000))
+
+        # Реестр голосов: встроенные голоса модели и свои (эмбеддинги из voices_dir), загруженные один раз
+        self.builtin_speakers = set(getattr(self.model_tts, 'speakers', None) or [])
+        self.voices = {}
+        self.voice_embeddings = {}
+        self.voice_switch = VoiceSwitch()
+        if voices_dir and os.path.isdir(voices_dir):
+            report("loading voices")
+            for name in sorted(os.listdir(voices_dir)):
+                path = os.path.join(voices_dir, name)
+                if not name.startswith('.') and os.path.isfile(path):
+                    self.load_voice(name, path)
+
+    def load_voice(self, name, path):
+        """
+        Свой голос - эмбеддинг говорящего, сохранённый torch.save (model.save_random_voice).
+        Файлы, которые не являются эмбеддингом, пропускаются; возвращает, загружен ли голос.
+
+        Ограничение: пакет Silero принимает свой голос только через
+        apply_tts(voice_path=...) и сам вызывает на нём torch.load - готовый
+        тензор ему не передать. Поэтому файл читается с диска один раз, а при
+        каждом синтезе модель заново разбирает его из памяти (эмбеддинг в
+        несколько сотен float - доли миллисекунды рядом с самим синтезом).
+        Разобранный здесь тензор хранится в voice_embeddings для проверки.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            embedding = torch.load(io.BytesIO(data), map_location='cpu')
+        except Exception as e:
+            logger.warning("skipping %s: not a voice file (%s)", path, e)
+            return False
+        if not isinstance(embedding, torch.Tensor):
+            logger.warning("skipping %s: expected a speaker embedding tensor, got %s", path, type(embedding).__name__)
+            return False
+        self.voices[name] = data
+        self.voice_embeddings[name] = embedding
+        logger.info("voice %s loaded: embedding %s", name, tuple(embedding.shape))
+        return True
+
+    def speakers(self):
+        return sorted(self.builtin_speakers | set(self.voices))
+
+    def has_speaker(self, speaker):
+        # Если модель не сообщает свои голоса, проверить встроенный голос нельзя - решит apply_tts
+        return speaker in self.voices or not self.builtin_speakers or speaker in self.builtin_speakers
+
+    def after_fork(self):
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='tts')
+        self.voice_switch = VoiceSwitch()
+
+    def text_to_sound_base64(self, text, speaker='eugene', put_accent=True, put_yo=True, parts=None):
+        ogg_data = self.text_to_ogg(text, speaker=speaker, put_accent=put_accent, put_yo=put_yo, parts=parts)
+        return base64.b64encode(ogg_data).decode('utf-8')
+
+    def text_to_ogg(self, text, speaker='eugene', put_accent=True, put_yo=True, parts=None):
+        """
+        text - SSML-документ целиком. Если переданы parts (тот же текст, разбитый
+        на отдельные SSML-документы по предложениям), части синтезируются
+        параллельно, каждая кэшируется отдельно, и они склеиваются через паузу
+        перед кодированием.
+        """
+        def create():
+            if parts and len(parts) > 1:
+                futures = [self.pool.submit(in_context(self.synthesize_cached), part, speaker, put_accent, put_yo)
+                           for part in parts]
+                audios = [future.result() for future in futures]
+                pieces = [audios[0]]
+                for audio in audios[1:]:
+                    pieces += [self.sentence_pause, audio]
+                audio = torch.cat(pieces)
+            else:
+                audio = self.synthesize(text, speaker=speaker, put_accent=put_accent, put_yo=put_yo)
+            return self.encode(audio)
+
+        # Одинаковые фразы (шаблоны ответов) синтезируются и кодируются только один раз
+        key = cache_key(text, speaker, self.sample_rate, self.audio_format)
+        return self.cache.get_or_create(key, create)
+
+    def iter_ogg(self, parts, speaker='eugene', put_accent=True, put_yo=True):
+        """
+        Синтезирует части параллельно и отдаёт закодированный ogg каждой части
+        по порядку, как только она и все предыдущие готовы. Каждая часть
+        кэшируется отдельно.
+        """
+        futures = [self.pool.submit(in_context(self.text_to_ogg), part, speaker, put_accent, put_yo) for part in parts]
+        for future in futures:
+            yield future.result()
+
+    def synthesize_cached(self, text, speaker='eugene', put_accent=True, put_yo=True):
+        """
+        synthesize() с кэшем: предложение, уже встречавшееся в другом ответе,
+        не синтезируется заново. В sentence_cache хранится PCM (int16), а не
+        ogg, чтобы части можно было склеить до кодирования.
+        """
+        def create():
+            audio = self.synthesize(text, speaker=speaker, put_accent=put_accent, put_yo=put_yo)
+            return (audio.cpu().numpy() * (2 ** 15 - 1)).astype(np.int16).tobytes()
+
+        data = self.sentence_cache.get_or_create(cache_key(text, speaker, self.sample_rate, 'pcm16'), create)
+        return torch.from_numpy(np.frombuffer(data, dtype=np.int16).astype(np.float32) / (2 ** 15 - 1))
+
+    def synthesize(self, text, speaker='eugene', put_accent=True, put_yo=True):
+        logger.debug("synthesizing: %s", preview(text))
+        if speaker in self.voices:
+            # Свой голос передаётся из памяти, без чтения файла на каждый вызов (см. load_voice)
+            voice, kwargs = speaker, {'speaker': 'random', 'voice_path': io.BytesIO(self.voices[speaker])}
+        else:
+            voice, kwargs = None, {'speaker': speaker}
+        with stage("synthesis"), (self.voice_switch.use(voice) if voice else nullcontext()):
+            audio = self.model_tts.apply_tts(text=text,
+                                             sample_rate=self.sample_rate,
+                                             put_accent=put_accent,
+                                             put_yo=put_yo,
+                                             **kwargs)
+        logger.debug("synthesized: %s", preview(audio))
+        return audio
     
+    def encode(self, audio):
+        with stage("encode"):
+            if self.encoder is not None:
+                return self.encoder.encode(audio, self.sample_rate)
+            return self.create_ogg_vorbis(audio, self.sample_rate)
+
     def create_wav_base64(self, audio, sample_rate):
         # Convert the tensor to NumPy array and scale it to int16
         audio_numpy = audio.cpu().numpy()
@@ -88,6 +265,10 @@ class SileroTTS:
     from pydub import AudioSegment
 
     def create_ogg_vorbis_base64(self, audio, sample_rate):
+        # Encode the bytes to URL-safe base64
+        return base64.b64encode(self.create_ogg_vorbis(audio, sample_rate)).decode('utf-8')
+
+    def create_ogg_vorbis(self, audio, sample_rate):
         # Convert the tensor to NumPy array and scale it to int16
         audio_numpy = audio.cpu().numpy()
         audio_int16 = (audio_numpy * (2 ** 15 - 1)).astype(np.int16)
@@ -104,53 +285,176 @@ class SileroTTS:
         ogg_buffer = io.BytesIO()
         audio_segment.export(ogg_buffer, format="ogg")
 
-        # Encode the bytes to URL-safe base64
-        base64_data = base64.b64encode(ogg_buffer.getvalue()).decode('utf-8')
-
-        return base64_data
+        return ogg_buffer.getvalue()
 
 
     
 app = Flask(__name__)
 CORS(app)
-silero_tts = SileroTTS()
+instrument(app, 'tts')
+logger = logging.getLogger('tts')
+tts_cache = AudioCache(max_bytes=int(os.environ.get('TTS_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+                       disk_dir=os.environ.get('TTS_CACHE_DIR') or None,
+                       disk_max_bytes=int(os.environ.get('TTS_CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024)))
+REGISTRY.register_stats('tts_cache', tts_cache.stats)
+# PCM отдельных предложений (около 96 КБ на секунду аудио) - только в памяти
+tts_sentence_cache = AudioCache(max_bytes=int(os.environ.get('TTS_SENTENCE_CACHE_MAX_BYTES', 16 * 1024 * 1024)))
+REGISTRY.register_stats('tts_sentence_cache', tts_sentence_cache.stats)
+# TTS_CODEC: vorbis | opus - кодирование в процессе через libsndfile, pydub - прежний путь через ffmpeg.
+# По умолчанию формат ответа прежний (Ogg/Vorbis, 48 кГц), меняется только кодировщик; Ogg/Opus
+# (TTS_CODEC=opus, TTS_OUTPUT_SAMPLE_RATE=24000) меньше и быстрее, но клиент должен уметь его играть
+tts_codec = os.environ.get('TTS_CODEC', 'vorbis')
+tts_encoder = None
+if tts_codec != 'pydub':
+    tts_encoder = AudioEncoder(codec=tts_codec,
+                               output_sample_rate=int(os.environ.get('TTS_OUTPUT_SAMPLE_RATE', 0)) or None,
+                               compression_level=float(os.environ['TTS_COMPRESSION_LEVEL']) if os.environ.get('TTS_COMPRESSION_LEVEL') else None)
+model_registry = ModelRegistry()
+# Голос по умолчанию; в запросе можно выбрать другой (поле speaker), включая свои голоса из TTS_VOICES_DIR
+TTS_SPEAKER = os.environ.get('TTS_SPEAKER', 'eugene')
+TTS_VOICES_DIR = os.environ.get('TTS_VOICES_DIR', 'voices')
+
+def load_tts(report):
+    tts = SileroTTS(cache=tts_cache, encoder=tts_encoder, registry=model_registry, voices_dir=TTS_VOICES_DIR,
+                    workers=int(os.environ.get('TTS_WORKERS', 2)),
+                    sentence_pause_ms=int(os.environ.get('TTS_SENTENCE_PAUSE_MS', 300)),
+                    sentence_cache=tts_sentence_cache, report=report)
+    report("warming cache")
+    warm_cache(tts, warm_phrases())
+    return tts
+
+# Модель грузится в фоне, сервис сразу отвечает на /ready
+tts_loader = BackgroundLoader('tts', load_tts)
 
 import re
 
-def convert_to_ssml(text):
-    # Заменяем знаки препинания на соответствующие теги SSML
-    text = re.sub(r'\. ', '.</s> <s>', text)
-    text = re.sub(r'\? ', '?</s> <s>', text)
-    text = re.sub(r'! ', '!</s> <s>', text)
-    
-    # Добавляем теги для начала и конца каждого предложения
-    text = '<s>' + text + '</s>'
-    
-    # Добавляем теги для начала и конца документа
-    ssml = '<speak>' + text + '</speak>'
-
-    return ssml
+SENTENCE_END = re.compile(r'(?<=[.?!]) ')
 
+def split_sentences(text):
+    # Предложение заканчивается на ". ", "? " или "! "
+    return SENTENCE_END.split(text)
 
+def convert_to_ssml(text):
+    # Каждое предложение оборачиваем в <s>, весь текст - в <speak>
+    return '<speak><s>' + '</s> <s>'.join(split_sentences(text)) + '</s></speak>'
+
+
+def clean_text(text):
+    return text.replace('Йенкинс', 'Дженкинс').replace(":", "")
+
+def prepare_text(text):
+    return convert_to_ssml(clean_text(text))
+
+def prepare_sentences(text):
+    # Отдельный SSML-документ на каждое предложение
+    return [convert_to_ssml(sentence) for sentence in split_sentences(clean_text(text))]
+
+# Частые ответы NLU-сервиса, которые имеет смысл синтезировать заранее
+WARM_PHRASES = [
+    "Простите, не понял ваш запрос",
+    "Для этой задачи не определены параметры.",
+    "Параметр с таким именем не найден.",
+]
+
+def warm_phrases():
+    # TTS_WARM_PHRASES - файл с фразами (по одной в строке) для прогрева кэша
+    phrases = list(WARM_PHRASES)
+    if os.environ.get('TTS_WARM_PHRASES'):
+        with open(os.environ['TTS_WARM_PHRASES'], encoding='utf-8') as f:
+            phrases += f.readlines()
+    return phrases
+
+def warm_cache(tts, phrases):
+    for phrase in phrases:
+        phrase = phrase.strip()
+        if phrase:
+            # Тем же путём, что и ответ NLU (for_tts = transliterate_to_russian(ответ)), иначе ключи не совпадут
+            for_tts = transliterate_to_russian(phrase)
+            tts.text_to_ogg(prepare_text(for_tts), speaker=TTS_SPEAKER, parts=prepare_sentences(for_tts))
+
+tts_loader.start(background=os.environ.get('TTS_LOAD_IN_BACKGROUND', '1') == '1')
+
+def after_fork():
+    # Вызывается в каждом воркере serve.py после fork
+    if tts_loader.ready:
+        tts_loader.get().after_fork()
+
+def not_ready():
+    return jsonify(tts_loader.status()), 503
+
+def unknown_speaker(silero_tts, speaker):
+    return jsonify({'error': f'Unknown speaker {speaker}', 'speakers': silero_tts.speakers()}), 400
+
+@app.route('/speakers', methods=['GET'])
+def speakers():
+    if not tts_loader.ready:
+        return not_ready()
+    return jsonify({'default': TTS_SPEAKER, 'speakers': tts_loader.get().speakers()})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    return jsonify(tts_loader.status()), 200 if tts_loader.ready else 503
 
 @app.route('/tts', methods=['POST'])
 def text_to_speech():
+    if not tts_loader.ready:
+        return not_ready()
+    silero_tts = tts_loader.get()
+
     text = request.json.get('text')
-    print(text)
+    logger.debug("text: %s", preview(text))
     if not text:
         return jsonify({'error': 'Text is required'}), 400
-    
-    text = text.replace('Йенкинс', 'Дженкинс').replace(":", "")
+    speaker = request.json.get('speaker') or TTS_SPEAKER
+    if not silero_tts.has_speaker(speaker):
+        return unknown_speaker(silero_tts, speaker)
 
-    
+    parts = prepare_sentences(text)
+    text = prepare_text(text)
+    logger.debug("ssml: %s", preview(text))
 
-    text = convert_to_ssml(text)
-    print(text)
+    # ?format=raw (или Accept: audio/ogg) - отдаём сами байты без base64 и JSON
+    if request.args.get('format') == 'raw' or request.accept_mimetypes.best == 'audio/ogg':
+        return Response(silero_tts.text_to_ogg(text, speaker=speaker, parts=parts), mimetype=silero_tts.content_type)
 
-    audio_base64 = silero_tts.text_to_sound_base64(text)
+    audio_base64 = silero_tts.text_to_sound_base64(text, speaker=speaker, parts=parts)
     return jsonify({'audio_base64': audio_base64})
 
-app.run(port=5001, debug=False)
+@app.route('/tts_stream', methods=['POST'])
+def text_to_speech_stream():
+    """
+    Потоковый вариант /tts: текст режется на предложения, они синтезируются
+    параллельно, а клиент получает NDJSON-строки {"index", "audio_base64"}
+    по порядку, не дожидаясь конца всего текста. Каждая строка - отдельный
+    ogg-файл.
+    """
+    if not tts_loader.ready:
+        return not_ready()
+    silero_tts = tts_loader.get()
+
+    text = request.json.get('text')
+    if not text:
+        return jsonify({'error': 'Text is required'}), 400
+    speaker = request.json.get('speaker') or TTS_SPEAKER
+    if not silero_tts.has_speaker(speaker):
+        return unknown_speaker(silero_tts, speaker)
+
+    parts = prepare_sentences(text)
+
+    def generate():
+        for index, ogg_data in enumerate(silero_tts.iter_ogg(parts, speaker=speaker)):
+            yield json.dumps({'index': index,
+                              'count': len(parts),
+                              'audio_base64': base64.b64encode(ogg_data).decode('utf-8')}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify(tts_cache.stats())
+
+if __name__ == '__main__':
+    app.run(port=5001, debug=False)
 
 
 # def save_audio_to_wav(audio_bytes, sample_rate, filename='test.wav'):
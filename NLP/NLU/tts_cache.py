@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("tts_cache")
+
+
+def normalize_ssml(text):
+    # Разные пробелы и переносы строк не должны давать разные ключи, как и пробел перед знаком
+    # препинания ("параметры ." - так знаки отделяет transliterate_to_russian)
+    return re.sub(r"\s+([,.?!;:])", r"\1", re.sub(r"\s+", " ", text)).strip()
+
+
+def cache_key(text, speaker, sample_rate, audio_format):
+    raw = "\x00".join([normalize_ssml(text), speaker, str(sample_rate), audio_format])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Кэш уже закодированного аудио, адресуемый по содержимому:
+    ключ - sha256 от (нормализованный SSML, спикер, частота, формат).
+
+    Первый уровень - LRU в памяти с ограничением по суммарному размеру в
+    байтах, второй (если задан disk_dir) - файлы на диске, которые переживают
+    перезапуск сервиса. На диске хранится не больше disk_max_bytes: при
+    превышении удаляются файлы, которые дольше всех не читались (по mtime).
+    Ошибки диска (нет места, нет прав) только пишутся в лог - аудио всё
+    равно отдаётся.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_size = 0
+        self.disk_evictions = 0
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self.disk_size = sum(size for _, _, size in self._disk_files())
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self.lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._put_memory(key, data)
+        return data
+
+    def put(self, key, data):
+        self._put_memory(key, data)
+        self._write_disk(key, data)
+
+    def get_or_create(self, key, create):
+        data = self.get(key)
+        if data is None:
+            data = create()
+            self.put(key, data)
+        return data
+
+    def _put_memory(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_files(self):
+        # (mtime, путь, размер) всех записей на диске; временные файлы недописанных записей пропускаются
+        files = []
+        for directory, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.startswith("tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, path, st.st_size))
+        return files
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning("TTS cache read failed: %s", e)
+            return None
+        try:
+            # Прочитанная запись - самая свежая для вытеснения
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write_disk(self, key, data):
+        if not self.disk_dir or len(data) > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Пишем во временный файл и переименовываем, чтобы не оставить обрезанную запись
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("TTS cache write failed: %s", e)
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+            return
+        with self.lock:
+            self.disk_size += len(data)
+            over = self.disk_size > self.disk_max_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        # Каталог могут делить несколько процессов (воркеры serve.py), поэтому размер пересчитывается по файлам
+        files = sorted(self._disk_files())
+        size = sum(file_size for _, _, file_size in files)
+        evicted = 0
+        for _, path, file_size in files:
+            if size <= self.disk_max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("TTS cache eviction failed: %s", e)
+                continue
+            size -= file_size
+            evicted += 1
+        with self.lock:
+            self.disk_size = size
+            self.disk_evictions += evicted
+
+    def stats(self):
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_bytes": self.disk_size,
+                "disk_evictions": self.disk_evictions,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,95 @@
+"""
+Энергетический детектор речи (VAD) перед распознаванием.
+
+Записи из браузера начинаются с нажатия кнопки и заканчиваются повторным
+нажатием, поэтому по краям почти всегда тишина. Детектор находит участки
+речи по энергии 20-мс кадров, обрезает тишину по краям, делит запись на
+части по длинным паузам и сообщает, что речи нет вовсе, - до запуска модели.
+"""
+import os
+
+import numpy as np
+
+FRAME_MS = 20
+
+
+class VoiceActivityDetector:
+    """
+    Кадр считается речью, если его энергия выше порога: уровень шума
+    (10-й перцентиль энергии кадров) + margin_db, но не ниже min_level_db
+    (dBFS). Если разброс энергии меньше margin_db, запись целиком либо речь,
+    либо тишина - решает абсолютный уровень.
+
+    Паузы короче split_pause_ms склеиваются внутри одного сегмента, по более
+    длинным запись делится. Сегменты короче min_speech_ms (щелчки)
+    отбрасываются, остальные расширяются на padding_ms с каждой стороны.
+    """
+
+    def __init__(self, margin_db=12.0, min_level_db=-45.0, min_speech_ms=120, split_pause_ms=1000,
+                 padding_ms=200):
+        self.margin_db = margin_db
+        self.min_level_db = min_level_db
+        self.min_speech_ms = min_speech_ms
+        self.split_pause_ms = split_pause_ms
+        self.padding_ms = padding_ms
+
+    @classmethod
+    def from_env(cls):
+        return cls(margin_db=float(os.environ.get("STT_VAD_MARGIN_DB", 12.0)),
+                   min_level_db=float(os.environ.get("STT_VAD_MIN_LEVEL_DB", -45.0)),
+                   split_pause_ms=float(os.environ.get("STT_VAD_SPLIT_PAUSE_MS", 1000)),
+                   padding_ms=float(os.environ.get("STT_VAD_PADDING_MS", 200)))
+
+    @staticmethod
+    def frame_energy_db(samples, frame):
+        count = len(samples) // frame
+        if count == 0:
+            return np.zeros(0, dtype=np.float32)
+        frames = samples[:count * frame].reshape(count, frame)
+        return 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+
+    def speech_frames(self, energy):
+        if energy.size == 0:
+            return np.zeros(0, dtype=bool)
+        noise = np.percentile(energy, 10)
+        peak = np.percentile(energy, 99)
+        if peak - noise < self.margin_db:
+            return np.full(energy.shape, peak >= self.min_level_db)
+        return energy > max(noise + self.margin_db, self.min_level_db)
+
+    def segments(self, waveform, sample_rate=16000):
+        """Список (начало, конец) в отсчётах; пустой, если речи нет."""
+        samples = np.asarray(waveform, dtype=np.float32).reshape(-1)
+        frame = max(1, int(sample_rate * FRAME_MS / 1000))
+        speech = self.speech_frames(self.frame_energy_db(samples, frame))
+
+        # Участки подряд идущих речевых кадров: [начало, конец) в кадрах
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], speech.astype(np.int8), [0]])))
+        runs = [[start, end] for start, end in zip(edges[::2], edges[1::2])]
+
+        # Короткие паузы внутри фразы не режут её
+        split_pause = self.split_pause_ms / FRAME_MS
+        merged = []
+        for run in runs:
+            if merged and run[0] - merged[-1][1] < split_pause:
+                merged[-1][1] = run[1]
+            else:
+                merged.append(run)
+
+        min_speech = self.min_speech_ms / FRAME_MS
+        padding = int(self.padding_ms * sample_rate / 1000)
+        result = []
+        for start, end in merged:
+            if end - start < min_speech:
+                continue
+            start = max(0, int(start) * frame - padding)
+            end = min(len(samples), int(end) * frame + padding)
+            if result and start <= result[-1][1]:
+                result[-1] = (result[-1][0], end)
+            else:
+                result.append((start, end))
+        return result
+
+    def split(self, waveform, sample_rate=16000):
+        """Части записи [1, N] с речью (срезы исходного тензора, без копирования)."""
+        return [waveform[..., start:end] for start, end in self.segments(waveform, sample_rate)]
@@ -0,0 +1,149 @@
+"""
+Голосовой запрос целиком в одном процессе: аудио -> STT -> NLU -> вызов
+Jenkins -> TTS -> аудио.
+
+Клиент отправляет запись один раз (сырые байты ogg/opus/wav в теле POST
+/voice) вместо трёх запросов к сервисам 5002, 5000 и 5001 с base64 в JSON.
+Ответ - multipart/form-data (в браузере читается через response.formData()):
+поля transcription, message, for_tts и файл audio (audio/ogg). С ?format=raw
+возвращается только audio/ogg, распознанный текст - в заголовке
+X-Transcription (percent-encoded). Время этапов - в заголовке Server-Timing.
+Голос ответа - ?speaker= (по умолчанию TTS_SPEAKER).
+
+    python voice_pipeline.py   # порт VOICE_PORT, по умолчанию 5003
+"""
+import os
+import time
+import uuid
+from urllib.parse import quote
+
+from flask import Flask, Response, jsonify, request
+from flask_cors import CORS
+
+from audio_decoder import UnsupportedAudioFormat
+from metrics import instrument
+
+import app as nlu_service
+import speech_to_text
+import text_to_speech
+from number_normalizer import replace_numbers_with_digits
+
+app = Flask(__name__)
+CORS(app, expose_headers=["Server-Timing", "X-Transcription", "X-Request-ID"])
+instrument(app, "voice")
+
+
+class StageTimer:
+    """Замеры этапов для заголовка Server-Timing."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self.last = self.started
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.stages.append((name, (now - self.last) * 1000))
+        self.last = now
+
+    def header(self):
+        stages = self.stages + [("total", (self.last - self.started) * 1000)]
+        return ", ".join(f"{name};dur={duration:.1f}" for name, duration in stages)
+
+
+def encode_multipart(fields, files):
+    """
+    multipart/form-data из текстовых полей {name: str} и файлов
+    {name: (filename, content_type, bytes)}; возвращает (тело, content-type).
+    """
+    boundary = uuid.uuid4().hex
+    body = []
+    for name, value in fields.items():
+        body.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n'
+                    f'Content-Type: text/plain; charset=utf-8\r\n\r\n'.encode())
+        body.append(value.encode("utf-8") + b"\r\n")
+    for name, (filename, content_type, data) in files.items():
+        body.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                    f'Content-Type: {content_type}\r\n\r\n'.encode())
+        body.append(data + b"\r\n")
+    body.append(f"--{boundary}--\r\n".encode())
+    return b"".join(body), f"multipart/form-data; boundary={boundary}"
+
+
+def loaders_status():
+    return {"stt": speech_to_text.stt_loader.status(), "tts": text_to_speech.tts_loader.status()}
+
+
+def models_ready():
+    return speech_to_text.stt_loader.ready and text_to_speech.tts_loader.ready
+
+
+def after_fork():
+    # Вызывается в каждом воркере serve.py после fork
+    speech_to_text.after_fork()
+    nlu_service.after_fork()
+    text_to_speech.after_fork()
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    return jsonify(loaders_status()), 200 if models_ready() else 503
+
+
+@app.route("/voice", methods=["POST"])
+def voice():
+    if not models_ready():
+        return jsonify(loaders_status()), 503
+
+    audio = request.get_data()
+    if not audio:
+        return jsonify({"error": "No audio data provided"}), 400
+    silero_tts = text_to_speech.tts_loader.get()
+    speaker = request.args.get("speaker") or text_to_speech.TTS_SPEAKER
+    if not silero_tts.has_speaker(speaker):
+        return text_to_speech.unknown_speaker(silero_tts, speaker)
+
+    timer = StageTimer()
+    try:
+        waveform, _ = speech_to_text.audio_decoder.decode(audio)
+    except UnsupportedAudioFormat as e:
+        return jsonify({"error": f"Unsupported audio: {e}"}), 415, {"Server-Timing": timer.header()}
+    timer.mark("decode")
+    transcription = speech_to_text.transcribe_waveform(waveform)
+    timer.mark("stt")
+    if transcription is None:
+        return jsonify({"error": "No speech detected"}), 422, {"Server-Timing": timer.header()}
+    transcription = replace_numbers_with_digits(transcription)
+    timer.mark("numbers")
+    if not transcription:
+        return jsonify({"error": "Speech not recognized"}), 422, {"Server-Timing": timer.header()}
+
+    try:
+        result = nlu_service.nlu_cache.parse(transcription)
+    except TimeoutError:
+        return jsonify({"transcription": transcription, "error": "NLU is busy, try again later"}), 503, \
+            {"Server-Timing": timer.header()}
+    timer.mark("nlu")
+    response = nlu_service.handle_parse_result(result)
+    timer.mark("dispatch")
+    if response is None:
+        return jsonify({"transcription": transcription, "error": "Intent not supported"}), 400, \
+            {"Server-Timing": timer.header()}
+
+    for_tts = response.get("for_tts") or response["message"]
+    ogg_data = silero_tts.text_to_ogg(text_to_speech.prepare_text(for_tts), speaker=speaker,
+                                      parts=text_to_speech.prepare_sentences(for_tts))
+    timer.mark("tts")
+
+    headers = {"Server-Timing": timer.header(), "X-Transcription": quote(transcription)}
+    if request.args.get("format") == "raw":
+        return Response(ogg_data, mimetype=silero_tts.content_type, headers=headers)
+
+    body, content_type = encode_multipart(
+        {"transcription": transcription, "message": response["message"], "for_tts": for_tts},
+        {"audio": ("response.ogg", silero_tts.content_type, ogg_data)})
+    return Response(body, content_type=content_type, headers=headers)
+
+
+if __name__ == "__main__":
+    app.run(port=int(os.environ.get("VOICE_PORT", 5003)), threaded=True)